@@ -0,0 +1,5 @@
+# first line: 207
+  @memory.cache
+  def recommend_reviewers_as_json(**kwargs) -> Response:
+    with db.session.begin():
+      return jsonify(recommend_reviewers.recommend(**kwargs))
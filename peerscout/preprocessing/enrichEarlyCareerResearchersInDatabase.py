@@ -19,7 +19,10 @@ from .convertUtils import unescape_and_strip_tags_if_not_none, flatten
 
 from .preprocessingUtils import get_data_path
 
-from ..shared.database import connect_managed_configured_database
+from ..shared.database import (
+  connect_managed_configured_database,
+  log_changed_manuscript_versions
+)
 from ..shared.app_config import get_app_config
 
 PERSON_ID = 'person_id'
@@ -283,6 +286,7 @@ def update_database_with_person_with_manuscripts_list(db, person_with_manuscript
     db.manuscript_version.create_list(new_manuscript_versions)
     db.manuscript_subject_area.create_list(new_manuscript_subject_areas)
     db.manuscript_author.create_list(new_manuscript_authors)
+    log_changed_manuscript_versions(db, [m['version_id'] for m in new_manuscript_versions])
     db.commit()
 
 def enrich_early_career_researchers(db, get_request_handler, max_workers=1):
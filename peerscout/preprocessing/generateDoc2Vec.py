@@ -11,6 +11,7 @@ from ..docvec_model import (
 )
 
 from ..shared.database import connect_managed_configured_database
+from ..shared.similarity_index import update_similarity_index
 
 NAME = 'generateDoc2Vec'
 
@@ -94,6 +95,9 @@ def process_article_abstracts(db, vec_size=100, n_epochs=10):
 
     db.commit()
 
+    # the similarity index is based on the docvecs of both models
+    update_similarity_index(db)
+
 def main():
   with connect_managed_configured_database() as db:
 
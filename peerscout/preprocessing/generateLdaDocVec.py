@@ -7,6 +7,7 @@ from ..docvec_model import SpacyTransformer, DocvecModelUtils
 from ..docvec_model.lda_utils import train_lda
 
 from ..shared.database import connect_managed_configured_database
+from ..shared.similarity_index import update_similarity_index
 
 NAME = 'generateLdaDocVec'
 
@@ -81,6 +82,9 @@ def process_article_abstracts(db, n_topics=10):
 
     db.commit()
 
+    # the similarity index is based on the docvecs of both models
+    update_similarity_index(db)
+
 N_TOPICS = 20
 
 def main():
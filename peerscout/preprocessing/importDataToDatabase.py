@@ -1,3 +1,4 @@
+import datetime
 import itertools
 from os.path import basename, splitext
 import re
@@ -20,7 +21,10 @@ from .preprocessingUtils import get_downloads_xml_path
 
 from .dataNormalisationUtils import normalise_subject_area
 
-from ..shared.database import connect_managed_configured_database
+from ..shared.database import (
+  connect_managed_configured_database,
+  log_changed_manuscript_versions
+)
 
 # The data version is similar to the schema version,
 # but rather means that the way the data should be interpreted has changed
@@ -704,8 +708,18 @@ def convert_zip_file(
     if len(df) > 0:
       insert_records(db, table_name, df)
 
+  version_ids = set()
+  for table_name in table_names:
+    df = frame_by_table_name[table_name]
+    if len(df) > 0 and 'version_id' in df.columns:
+      version_ids |= set(df['version_id'].values)
+  logger.debug('logging changed manuscript versions: %d', len(version_ids))
+  log_changed_manuscript_versions(db, version_ids)
+
   logger.debug('marking file as processed: %s (%d)', zip_filename, DATA_VERSION)
-  db.import_processed.update_or_create(import_processed_id=zip_filename, version=DATA_VERSION)
+  db.import_processed.update_or_create(
+    import_processed_id=zip_filename, version=DATA_VERSION, when=datetime.datetime.now()
+  )
 
   db.commit()
 
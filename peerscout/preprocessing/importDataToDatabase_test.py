@@ -100,6 +100,12 @@ class TestConvertZipFile:
         set([VERSION_ID1])
       )
 
+  def test_should_log_changed_manuscript_versions(self):
+    with empty_database_and_convert_files(['regular-00001.xml']) as db:
+      df = db.manuscript_version_change_log.read_frame()
+      assert list(df.index) == [VERSION_ID1]
+      assert db.import_processed.get('dummy.zip').when is not None
+
   def test_minimal(self, logger):
     with empty_database_and_convert_files(['minimal-00001.xml']) as db:
       df = db.manuscript_version.read_frame().reset_index()
@@ -1,18 +1,50 @@
 import logging
+import time
 
 import requests
 
 NAME = 'reloadServer'
 
-def main():
+RELOAD_URL = 'http://localhost:8080/control/reload'
+
+DEFAULT_POLL_INTERVAL_SEC = 5
+DEFAULT_TIMEOUT_SEC = 60 * 60
+
+class ReloadFailedError(RuntimeError):
+  pass
+
+def wait_for_reload(
+  poll_interval_sec=DEFAULT_POLL_INTERVAL_SEC, timeout_sec=DEFAULT_TIMEOUT_SEC):
+
+  # the server reloads in the background, poll its status until it is no longer reloading
+  logger = logging.getLogger(NAME)
+  start_time = time.monotonic()
+  while True:
+    response = requests.get(RELOAD_URL)
+    response.raise_for_status()
+    reload_status = response.json()
+    logger.debug("reload status: %s", reload_status)
+    if not reload_status.get('reloading'):
+      break
+    if time.monotonic() - start_time > timeout_sec:
+      raise ReloadFailedError('server still reloading after %s seconds' % timeout_sec)
+    time.sleep(poll_interval_sec)
+  if reload_status.get('last_error'):
+    logger.error("reload failed: %s", reload_status['last_error'])
+    raise ReloadFailedError('reload failed: %s' % reload_status['last_error'])
+  return reload_status
+
+def main(poll_interval_sec=DEFAULT_POLL_INTERVAL_SEC, timeout_sec=DEFAULT_TIMEOUT_SEC):
   logger = logging.getLogger(NAME)
   try:
-    response = requests.post('http://localhost:8080/control/reload')
+    response = requests.post(RELOAD_URL)
     response.raise_for_status()
     logger.debug("response: %s", response.text)
   except requests.exceptions.ConnectionError:
     logger.warning("server doesn't seem to be running")
-  logger.info("done")
+    return
+  reload_status = wait_for_reload(poll_interval_sec=poll_interval_sec, timeout_sec=timeout_sec)
+  logger.info("done (last successful reload: %s)", reload_status.get('last_successful_reload'))
 
 if __name__ == "__main__":
   from ..shared.logging_config import configure_logging
@@ -0,0 +1,47 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+import requests
+
+from . import reloadServer as reloadServer_module
+from .reloadServer import main, ReloadFailedError
+
+def _response(json_data=None):
+  response = MagicMock(name='response')
+  response.json.return_value = json_data
+  return response
+
+def _status(reloading=False, last_error=None):
+  return _response({'reloading': reloading, 'last_error': last_error})
+
+@pytest.fixture(name='requests_mock')
+def _requests_mock():
+  with patch.object(reloadServer_module, 'requests') as requests_mock:
+    requests_mock.exceptions = requests.exceptions
+    yield requests_mock
+
+class TestReloadServer:
+  def test_should_poll_reload_status_until_no_longer_reloading(self, requests_mock):
+    requests_mock.post.return_value = _response()
+    requests_mock.get.side_effect = [_status(reloading=True), _status(reloading=False)]
+    main(poll_interval_sec=0)
+    requests_mock.post.assert_called_with(reloadServer_module.RELOAD_URL)
+    assert requests_mock.get.call_count == 2
+
+  def test_should_raise_error_if_reload_failed(self, requests_mock):
+    requests_mock.post.return_value = _response()
+    requests_mock.get.side_effect = [_status(reloading=False, last_error='error1')]
+    with pytest.raises(ReloadFailedError):
+      main(poll_interval_sec=0)
+
+  def test_should_raise_error_if_still_reloading_after_timeout(self, requests_mock):
+    requests_mock.post.return_value = _response()
+    requests_mock.get.return_value = _status(reloading=True)
+    with pytest.raises(ReloadFailedError):
+      main(poll_interval_sec=0, timeout_sec=0)
+
+  def test_should_not_fail_if_server_is_not_running(self, requests_mock):
+    requests_mock.post.side_effect = requests.exceptions.ConnectionError()
+    main(poll_interval_sec=0)
+    requests_mock.get.assert_not_called()
@@ -1,24 +1,42 @@
-import os
+import base64
 import datetime
+import json
 import logging
+import os
+import threading
+import time
+import uuid
 from functools import partial
 
 import flask
 from flask import Blueprint, request, jsonify, url_for, Response
 from flask.json import JSONEncoder
 from flask_cors import CORS
-from joblib import Memory
-from werkzeug.exceptions import BadRequest, Forbidden
+from werkzeug.exceptions import BadRequest, Forbidden, Gone
 
+from peerscout.utils.cache import LruCache
 from peerscout.utils.collection import parse_list
+from peerscout.utils.json_fragments import dumps_with_cached_json
 
 from ..config.search_config import parse_search_config, DEFAULT_SEARCH_TYPE
 
 from ..services import (
+  DatabaseSnapshot,
   ManuscriptModel,
   load_similarity_model_from_database,
   RecommendReviewers
 )
+from ..services.database_snapshot import DEFAULT_PREFETCH_MAX_WORKERS
+from ..services.DocumentSimilarityModel import (
+  DEFAULT_SIMILARITY_AGGREGATION,
+  DEFAULT_ABSTRACT_DOCVECS_CACHE_SIZE
+)
+from ..services.RecommendReviewers import (
+  TABLE_NAMES as RECOMMEND_REVIEWERS_TABLE_NAMES,
+  ABSTRACT_OPTIONS,
+  POTENTIAL_REVIEWER_PROPS,
+  AbstractOptions
+)
 
 from ..auth.FlaskAuth0 import (
   FlaskAuth0,
@@ -38,18 +56,215 @@ from ...shared.logging_config import configure_logging
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_LIMIT = 100
+
+DEFAULT_RESULT_CACHE_MAX_SIZE_MB = 256
+DEFAULT_WARM_CACHE_RECENT_QUERY_COUNT = 100
+DEFAULT_WARM_CACHE_RECENT_MANUSCRIPT_COUNT = 50
+# the limit requested by the client, warm up queries need to match its queries
+DEFAULT_WARM_CACHE_LIMIT = 50
+
+SNAPSHOT_NAME = 'server-snapshot'
+
+# the request parameters defining a recommend reviewers query (besides the search type)
+RECOMMEND_QUERY_PARAMETER_NAMES = [
+  'manuscript_no', 'subject_area', 'keywords', 'abstract', 'limit',
+  'fields', 'exclude', 'abstracts'
+]
+
 class ReloadableRecommendReviewers:
-  def __init__(self, create_recommend_reviewer):
+  """Serves requests from the current recommender while a replacement is being built.
+
+  Reloads run in a background thread. Reload requests received while a reload is in progress
+  are coalesced into a single reload following the current one.
+  """
+
+  def __init__(
+    self, create_recommend_reviewer, prepare_recommend_reviewer=None, on_reloaded=None):
+
     self._create_recommend_reviewer = create_recommend_reviewer
-    self._recommend_reviewer = create_recommend_reviewer()
+    self._prepare_recommend_reviewer = prepare_recommend_reviewer
+    self._on_reloaded = on_reloaded
+    self._reload_lock = threading.Lock()
+    self._reload_thread = None
+    self._reload_requested = False
+    self._status = {
+      'progress': None,
+      'last_successful_reload': None,
+      'last_reload_duration_sec': None,
+      'last_error': None
+    }
+    # the recommender together with its data version (used as part of cache keys),
+    # replaced as a whole
+    self._current = (self._create_recommend_reviewer(), 0)
+    self._status['last_successful_reload'] = datetime.datetime.now().isoformat()
 
   def __getattr__(self, name):
-    return getattr(self._recommend_reviewer, name)
+    return getattr(self._current[0], name)
+
+  @property
+  def data_version(self):
+    return self._current[1]
+
+  def get_current(self):
+    return self._current
+
+  def set_reload_progress(self, progress):
+    LOGGER.info('reload progress: %s', progress)
+    self._status['progress'] = progress
 
   def reload(self):
-    self._recommend_reviewer = self._create_recommend_reviewer()
+    start_time = time.monotonic()
+    self.set_reload_progress('loading')
+    recommend_reviewer = self._create_recommend_reviewer()
+    data_version = self.data_version + 1
+    if self._prepare_recommend_reviewer:
+      self.set_reload_progress('preparing')
+      self._prepare_recommend_reviewer(recommend_reviewer, data_version)
+    self._current = (recommend_reviewer, data_version)
+    if self._on_reloaded:
+      self._on_reloaded(data_version)
+    self._status.update({
+      'progress': None,
+      'last_successful_reload': datetime.datetime.now().isoformat(),
+      'last_reload_duration_sec': time.monotonic() - start_time,
+      'last_error': None
+    })
+
+  def _reload_until_no_longer_requested(self):
+    while True:
+      try:
+        self.reload()
+      except Exception as e: # pylint: disable=W0703
+        LOGGER.exception('reload failed: %s', e)
+        self._status.update({'progress': None, 'last_error': str(e)})
+      with self._reload_lock:
+        if not self._reload_requested:
+          self._reload_thread = None
+          return
+        self._reload_requested = False
+
+  def reload_in_background(self):
+    with self._reload_lock:
+      if self._reload_thread is not None:
+        LOGGER.info('reload already in progress, reloading again afterwards')
+        self._reload_requested = True
+        return False
+      self._reload_thread = threading.Thread(
+        target=self._reload_until_no_longer_requested, name='reload', daemon=True
+      )
+      self._reload_thread.start()
+      return True
+
+  def wait_for_reload(self, timeout=None):
+    reload_thread = self._reload_thread
+    if reload_thread is not None:
+      reload_thread.join(timeout)
+
+  def get_reload_status(self):
+    with self._reload_lock:
+      return {
+        **self._status,
+        'reloading': self._reload_thread is not None,
+        'reload_requested': self._reload_requested
+      }
+
+def normalize_keywords(keywords):
+  return ','.join(sorted({keyword.lower() for keyword in parse_list(keywords)}))
+
+def get_search_params_recommend_kwargs(search_params):
+  return {
+    'role': search_params.get('filter_by_role'),
+    'recommend_relationship_types': search_params.get('recommend_relationship_types'),
+    'recommend_stage_names': search_params.get('recommend_stage_names')
+  }
+
+def get_result_fields_kwargs(args):
+  # only includes non-default values (default requests share the cache keys of warm up queries)
+  kwargs = {}
+  for key in ['fields', 'exclude']:
+    values = sorted(set(parse_list(args.get(key, ''))))
+    if values:
+      kwargs[key] = values
+  if set(kwargs.get('fields', [])) - set(POTENTIAL_REVIEWER_PROPS):
+    raise BadRequest('fields parameter must only contain: %s' % ', '.join(POTENTIAL_REVIEWER_PROPS))
+  abstracts = args.get('abstracts')
+  if abstracts and abstracts != AbstractOptions.FULL:
+    if abstracts not in ABSTRACT_OPTIONS:
+      raise BadRequest('abstracts parameter must be one of: %s' % ', '.join(ABSTRACT_OPTIONS))
+    kwargs['abstracts'] = abstracts
+  return kwargs
+
+def parse_recommend_query(args):
+  # empty parameters (as sent by the client) are treated like missing parameters,
+  # resulting in the same query (and cache key)
+  manuscript_no = args.get('manuscript_no') or None
+  keywords = args.get('keywords')
+  limit = args.get('limit')
+  if limit is None:
+    limit = DEFAULT_LIMIT
+  else:
+    try:
+      limit = int(limit)
+    except ValueError:
+      raise BadRequest('limit parameter must be an integer')
+  if not manuscript_no and keywords is None:
+    raise BadRequest('keywords parameter required')
+  if keywords is not None:
+    keywords = normalize_keywords(keywords) or None
+  return {
+    'manuscript_no': manuscript_no,
+    'subject_area': args.get('subject_area') or None,
+    'keywords': keywords,
+    'abstract': args.get('abstract') or None,
+    'limit': limit,
+    **get_result_fields_kwargs(args)
+  }
+
+def get_recommend_query_args(query):
+  # the request parameters, that parse_recommend_query would parse into the query
+  # (missing values are passed as empty parameters, e.g. keywords are required)
+  return {
+    key: (
+      ','.join(value) if isinstance(value, list)
+      else str(value) if value is not None
+      else ''
+    )
+    for key, value in query.items()
+    if key in RECOMMEND_QUERY_PARAMETER_NAMES
+  }
+
+def encode_cursor(cursor):
+  return base64.urlsafe_b64encode(
+    json.dumps(cursor, sort_keys=True).encode('utf-8')
+  ).decode('ascii')
+
+def decode_cursor(cursor_token):
+  try:
+    cursor = json.loads(base64.urlsafe_b64decode(cursor_token.encode('ascii')).decode('utf-8'))
+  except ValueError:
+    raise BadRequest('invalid cursor')
+  if (
+    not isinstance(cursor, dict) or
+    not isinstance(cursor.get('args'), dict) or
+    not isinstance(cursor.get('offset'), int) or
+    cursor['offset'] < 0
+  ):
+    raise BadRequest('invalid cursor')
+  return cursor
+
+def get_result_cache_key(data_version, **kwargs):
+  return (data_version, json.dumps(kwargs, sort_keys=True))
+
+def create_result_cache(config):
+  max_size_mb = config.getint(
+    'server', 'result_cache_max_size_mb', fallback=DEFAULT_RESULT_CACHE_MAX_SIZE_MB
+  )
+  ttl = config.getint('server', 'result_cache_ttl_sec', fallback=0)
+  LOGGER.debug('result cache max size: %d MB, ttl: %s', max_size_mb, ttl)
+  return LruCache(max_size=max_size_mb * 1024 * 1024, ttl=ttl or None)
 
-def get_recommend_reviewer_factory(db, config):
+def get_recommend_reviewer_factory(config):
   valid_decisions = parse_list(config.get(
     'model', 'valid_decisions', fallback=''))
   valid_manuscript_types = parse_list(config.get(
@@ -61,23 +276,68 @@ def get_recommend_reviewer_factory(db, config):
   filter_by_subject_area_enabled = config.getboolean(
     'model', 'filter_by_subject_area_enabled', fallback=False
   )
-
-  def load_recommender():
+  incremental_reload_enabled = config.getboolean(
+    'model', 'incremental_reload_enabled', fallback=False
+  )
+  snapshot_path = (
+    os.path.join(config.get('data', 'data_root', fallback='.data'), SNAPSHOT_NAME)
+    if config.getboolean('model', 'snapshot_enabled', fallback=False)
+    else None
+  )
+  load_max_workers = config.getint(
+    'model', 'load_max_workers', fallback=DEFAULT_PREFETCH_MAX_WORKERS
+  )
+  similarity_index_n_probe = config.getint('model', 'similarity_index_n_probe', fallback=0)
+  similarity_aggregation = config.get(
+    'model', 'similarity_version_aggregation', fallback=DEFAULT_SIMILARITY_AGGREGATION
+  )
+  abstract_docvecs_cache_size = config.getint(
+    'model', 'abstract_docvecs_cache_size', fallback=DEFAULT_ABSTRACT_DOCVECS_CACHE_SIZE
+  )
+  previous_snapshot_holder = {}
+
+  def create_snapshot(db):
+    previous_snapshot = previous_snapshot_holder.get('snapshot')
+    if previous_snapshot is not None:
+      return previous_snapshot.refreshed(db)
+    if snapshot_path and not previous_snapshot_holder.get('saved_snapshot_checked'):
+      # only on start, reloads will always consult the database
+      previous_snapshot_holder['saved_snapshot_checked'] = True
+      return DatabaseSnapshot.load_current_or_from_database(db, snapshot_path)
+    return DatabaseSnapshot.from_database(db)
+
+  def load_recommender(db):
     with db.session.begin():
+      snapshot = create_snapshot(db)
+      snapshot.prefetch(RECOMMEND_REVIEWERS_TABLE_NAMES, max_workers=load_max_workers)
       manuscript_model = ManuscriptModel(
-        db,
+        snapshot,
         valid_decisions=valid_decisions,
         valid_manuscript_types=valid_manuscript_types,
         published_decisions=published_decisions,
         published_manuscript_types=published_manuscript_types
       )
       similarity_model = load_similarity_model_from_database(
-        db, manuscript_model=manuscript_model
+        snapshot, manuscript_model=manuscript_model,
+        similarity_index_n_probe=similarity_index_n_probe,
+        similarity_aggregation=similarity_aggregation,
+        abstract_docvecs_cache_size=abstract_docvecs_cache_size
       )
-      return RecommendReviewers(
-        db, manuscript_model=manuscript_model, similarity_model=similarity_model,
+      recommend_reviewers = RecommendReviewers(
+        snapshot, manuscript_model=manuscript_model, similarity_model=similarity_model,
         filter_by_subject_area_enabled=filter_by_subject_area_enabled
       )
+      if snapshot_path and not snapshot.is_saved:
+        if not snapshot.is_data_version_current():
+          LOGGER.warning('data changed while loading, not saving snapshot')
+        else:
+          try:
+            snapshot.save(snapshot_path)
+          except OSError as e:
+            LOGGER.warning('failed to save snapshot to %s: %s', snapshot_path, e)
+      if incremental_reload_enabled:
+        previous_snapshot_holder['snapshot'] = snapshot
+      return recommend_reviewers
   return load_recommender
 
 class ApiAuth:
@@ -165,27 +425,135 @@ class ApiAuth:
 def create_api_blueprint(config):
   blueprint = Blueprint('api', __name__)
 
-  data_dir = os.path.abspath(config.get('data', 'data_root', fallback='.data'))
-  cache_dir = os.path.join(data_dir, 'server-cache')
-
   search_config = parse_search_config(config)
   client_config = dict(config['client']) if 'client' in config else {}
 
-  memory = Memory(cachedir=cache_dir, verbose=0)
-  LOGGER.debug("cache directory: %s", cache_dir)
-  memory.clear(warn=False)
+  result_cache = create_result_cache(config)
+  warm_cache_recent_query_count = config.getint(
+    'server', 'warm_cache_recent_query_count', fallback=DEFAULT_WARM_CACHE_RECENT_QUERY_COUNT
+  )
+  warm_cache_recent_manuscript_count = config.getint(
+    'server', 'warm_cache_recent_manuscript_count',
+    fallback=DEFAULT_WARM_CACHE_RECENT_MANUSCRIPT_COUNT
+  )
+  warm_cache_limit = config.getint(
+    'server', 'warm_cache_limit', fallback=DEFAULT_WARM_CACHE_LIMIT
+  )
+
+  # cursors are only valid for the data version of this process
+  instance_id = uuid.uuid4().hex
 
-  db = connect_configured_database(autocommit=True)
+  registered_app = {}
 
-  load_recommender = get_recommend_reviewer_factory(db, config)
+  @blueprint.record_once
+  def _on_registered(state):
+    # the (re)load thread needs the app context for the configured JSON encoder
+    registered_app['app'] = state.app
 
-  recommend_reviewers = ReloadableRecommendReviewers(load_recommender)
+  load_recommender_using_database = get_recommend_reviewer_factory(config)
+
+  def load_recommender():
+    # requests are served from memory, only (re)loads use the database
+    # (the database session isn't thread-safe, use a separate connection for every (re)load)
+    load_db = connect_configured_database(autocommit=True)
+    try:
+      return load_recommender_using_database(load_db)
+    finally:
+      load_db.close()
+      # don't keep idle pooled connections open between reloads (the engine reconnects if needed)
+      load_db.engine.dispose()
+
+  def get_cursor_data_version(data_version):
+    return '%s-%d' % (instance_id, data_version)
+
+  def get_recommend_kwargs(query):
+    return {
+      **{key: value for key, value in query.items() if key != 'search_type'},
+      **get_search_params_recommend_kwargs(search_config[query['search_type']])
+    }
+
+  def recommend_with_next_cursor(recommender, data_version, query):
+    result = recommender.recommend(**get_recommend_kwargs(query))
+    # the first page is ranked using the limit, the complete ranking is only cached by the
+    # recommender once a cursor is followed (and then only the page is populated)
+    potential_reviewer_count = result.get('potential_reviewer_count')
+    next_offset = query['offset'] + query['limit']
+    if potential_reviewer_count and query['limit'] > 0 and next_offset < potential_reviewer_count:
+      result = {
+        **result,
+        'next_cursor': encode_cursor({
+          'data_version': get_cursor_data_version(data_version),
+          'search_type': query['search_type'],
+          'args': get_recommend_query_args(query),
+          'offset': next_offset
+        })
+      }
+    return result
+
+  def get_recommend_reviewers_json_bytes(recommender, data_version, query):
+    cache_key = get_result_cache_key(data_version, **query)
+    json_bytes = result_cache.get(cache_key)
+    if json_bytes is None:
+      # persons and manuscripts are shared between results and only serialised once
+      json_bytes = dumps_with_cached_json(
+        recommend_with_next_cursor(recommender, data_version, query), dumps=flask.json.dumps
+      ).encode('utf-8')
+      result_cache.put(cache_key, json_bytes)
+    return json_bytes
+
+  def get_cached_queries():
+    return [json.loads(kwargs_json) for _, kwargs_json in result_cache.keys()]
+
+  def get_warm_up_queries(recommender, recent_queries):
+    recent_manuscript_ids = (
+      recommender.get_recently_active_manuscript_ids(warm_cache_recent_manuscript_count)
+      if warm_cache_recent_manuscript_count > 0
+      else []
+    )
+    return recent_queries[:warm_cache_recent_query_count] + [
+      {
+        'search_type': search_type,
+        **parse_recommend_query({'manuscript_no': manuscript_id, 'limit': warm_cache_limit}),
+        'offset': 0
+      }
+      for manuscript_id in recent_manuscript_ids
+      for search_type in search_config.keys()
+    ]
+
+  def warm_result_cache(recommender, data_version):
+    queries = get_warm_up_queries(recommender, get_cached_queries())
+    LOGGER.info('warming result cache, queries: %d', len(queries))
+    for i, query in enumerate(queries):
+      recommend_reviewers.set_reload_progress('warming result cache (%d/%d)' % (i, len(queries)))
+      try:
+        get_recommend_reviewers_json_bytes(recommender, data_version, query)
+      except Exception as e: # pylint: disable=W0703
+        LOGGER.warning('failed to warm result cache for %s (%s)', query, e)
+
+  def prepare_recommender(recommender, data_version):
+    if result_cache.max_size <= 0:
+      return
+    app = registered_app.get('app')
+    if app is None:
+      warm_result_cache(recommender, data_version)
+      return
+    with app.app_context():
+      warm_result_cache(recommender, data_version)
+
+  def on_recommender_reloaded(data_version):
+    result_cache.remove_if(lambda cache_key: cache_key[0] != data_version)
+    api_auth.reload()
+
+  recommend_reviewers = ReloadableRecommendReviewers(
+    load_recommender,
+    prepare_recommend_reviewer=prepare_recommender,
+    on_reloaded=on_recommender_reloaded
+  )
 
   get_search_type = lambda: request.args.get('search_type', DEFAULT_SEARCH_TYPE)
 
   def user_has_role_by_email(email, role) -> bool:
-    with db.session.begin():
-      return recommend_reviewers.user_has_role_by_email(email=email, role=role)
+    return recommend_reviewers.user_has_role_by_email(email=email, role=role)
 
   api_auth = ApiAuth(
     config, client_config, search_config=search_config,
@@ -204,54 +572,44 @@ def create_api_blueprint(config):
       }
     })
 
-  @memory.cache
-  def recommend_reviewers_as_json(**kwargs) -> Response:
-    with db.session.begin():
-      return jsonify(recommend_reviewers.recommend(**kwargs))
-
   @blueprint.route("/recommend-reviewers")
   @api_auth.wrap_search
   def _recommend_reviewers_api(email=None) -> Response:
-    manuscript_no = request.args.get('manuscript_no')
-    subject_area = request.args.get('subject_area')
-    keywords = request.args.get('keywords')
-    abstract = request.args.get('abstract')
-    limit = request.args.get('limit')
+    recommender, data_version = recommend_reviewers.get_current()
 
     search_type = get_search_type()
-    search_params = search_config.get(search_type)
-    if search_params is None:
+    if search_type not in search_config:
       raise BadRequest('unknown search type - %s' % search_type)
-    role = search_params.get('filter_by_role')
-    recommend_relationship_types = search_params.get('recommend_relationship_types')
-    recommend_stage_names = search_params.get('recommend_stage_names')
 
-    if limit is None:
-      limit = 100
+    cursor_token = request.args.get('cursor')
+    if cursor_token:
+      # the cursor replaces the other parameters, the search type is validated by the auth
+      cursor = decode_cursor(cursor_token)
+      if cursor.get('data_version') != get_cursor_data_version(data_version):
+        raise Gone('cursor expired, please repeat the search')
+      if cursor.get('search_type') != search_type:
+        raise BadRequest('cursor was created for a different search type')
+      args, offset = cursor['args'], cursor['offset']
     else:
-      limit = int(limit)
-    if not manuscript_no and keywords is None:
-      raise BadRequest('keywords parameter required')
-    return recommend_reviewers_as_json(
-      manuscript_no=manuscript_no,
-      subject_area=subject_area,
-      keywords=keywords,
-      abstract=abstract,
-      role=role,
-      recommend_relationship_types=recommend_relationship_types,
-      recommend_stage_names=recommend_stage_names,
-      limit=limit
+      args, offset = request.args, 0
+
+    query = {
+      'search_type': search_type,
+      **parse_recommend_query(args),
+      'offset': offset
+    }
+    return Response(
+      get_recommend_reviewers_json_bytes(recommender, data_version, query),
+      mimetype='application/json'
     )
 
   @blueprint.route("/subject-areas")
   def _subject_areas_api() -> Response:
-    with db.session.begin():
-      return jsonify(list(recommend_reviewers.get_all_subject_areas()))
+    return jsonify(list(recommend_reviewers.get_all_subject_areas()))
 
   @blueprint.route("/keywords")
   def _keywords_api() -> Response:
-    with db.session.begin():
-      return jsonify(list(recommend_reviewers.get_all_keywords()))
+    return jsonify(list(recommend_reviewers.get_all_keywords()))
 
   @blueprint.route("/config")
   def _config_api() -> Response:
@@ -260,33 +618,33 @@ def create_api_blueprint(config):
   @blueprint.route("/search-types")
   @api_auth
   def _search_types_api(email=None) -> Response:
-    with db.session.begin():
-      if email is None or api_auth.is_staff_email(email):
-        LOGGER.debug('email is None or staff email, not filtering search types')
-        allowed_search_config = search_config
-      else:
-        roles = set(recommend_reviewers.get_user_roles_by_email(email)) | {''}
-        allowed_search_config = {
-          search_type: search_params
-          for search_type, search_params in search_config.items()
-          if search_params.get('required_role', '') in roles
-        }
-        LOGGER.debug(
-          'roles, email=%s, roles=%s, filtered_search_types=%s',
-          email, roles, allowed_search_config.keys()
-        )
-      search_types_response = [
-        {
-          'search_type': search_type,
-          'title': search_config[search_type].get('title', search_type)
-        }
-        for search_type in sorted(allowed_search_config.keys())
-      ]
-      return jsonify(search_types_response)
-
-  def reload_api():
-    recommend_reviewers.reload()
-    recommend_reviewers_as_json.clear()
-    api_auth.reload()
+    if email is None or api_auth.is_staff_email(email):
+      LOGGER.debug('email is None or staff email, not filtering search types')
+      allowed_search_config = search_config
+    else:
+      roles = set(recommend_reviewers.get_user_roles_by_email(email)) | {''}
+      allowed_search_config = {
+        search_type: search_params
+        for search_type, search_params in search_config.items()
+        if search_params.get('required_role', '') in roles
+      }
+      LOGGER.debug(
+        'roles, email=%s, roles=%s, filtered_search_types=%s',
+        email, roles, allowed_search_config.keys()
+      )
+    search_types_response = [
+      {
+        'search_type': search_type,
+        'title': search_config[search_type].get('title', search_type)
+      }
+      for search_type in sorted(allowed_search_config.keys())
+    ]
+    return jsonify(search_types_response)
+
+  def reload_api(wait=False):
+    recommend_reviewers.reload_in_background()
+    if wait:
+      recommend_reviewers.wait_for_reload()
+    return recommend_reviewers.get_reload_status()
 
-  return blueprint, reload_api
+  return blueprint, reload_api, recommend_reviewers.get_reload_status
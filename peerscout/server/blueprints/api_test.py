@@ -4,6 +4,8 @@ from configparser import ConfigParser
 import logging
 import json
 from contextlib import contextmanager
+from functools import partial
+import threading
 from unittest.mock import patch, Mock, MagicMock
 from urllib.parse import urlencode
 
@@ -24,7 +26,7 @@ from peerscout.server.services.test_data import (
 )
 
 from . import api as api_module
-from .api import create_api_blueprint, ApiAuth
+from .api import create_api_blueprint, ApiAuth, ReloadableRecommendReviewers
 
 LOGGER = logging.getLogger(__name__)
 
@@ -57,16 +59,23 @@ def setup_module():
   logging.basicConfig(level='DEBUG')
 
 @contextmanager
-def _api_test_client(config, dataset):
+def _api_test_client_and_reload(config, dataset):
   m = api_module
   with populated_in_memory_database(dataset, autocommit=True) as db:
     with patch.object(m, 'connect_configured_database') as connect_configured_database_mock:
       connect_configured_database_mock.return_value = db
-      blueprint, reload_api = create_api_blueprint(config)
+      # disposing the connections would discard the in-memory database
+      db.engine.dispose = MagicMock(name='dispose')
+      blueprint, reload_api, get_reload_status = create_api_blueprint(config)
       app = Flask(__name__)
       app.register_blueprint(blueprint)
-      assert reload_api
-      yield app.test_client()
+      assert get_reload_status
+      yield app.test_client(), partial(reload_api, wait=True)
+
+@contextmanager
+def _api_test_client(config, dataset):
+  with _api_test_client_and_reload(config, dataset) as (test_client, _):
+    yield test_client
 
 def _get_json(response):
   return json.loads(response.data.decode('utf-8'))
@@ -94,11 +103,29 @@ def _setup_flask_auth0_mock_email(MockFlaskAuth0, **kwargs):
   _wrap_request_handler.side_effect = wrapper
   return MockFlaskAuth0
 
+class _BlockingRecommenderFactory:
+  def __init__(self):
+    self.recommenders = []
+    self.started = threading.Event()
+    self.release = threading.Event()
+
+  def __call__(self):
+    if self.recommenders:
+      self.started.set()
+      assert self.release.wait(5)
+    recommender = Mock(name='recommender%d' % len(self.recommenders))
+    self.recommenders.append(recommender)
+    return recommender
+
 @pytest.fixture(name='MockRecommendReviewers')
 def _mock_recommend_reviewers():
+  # also mocking the data and models, the in-memory database isn't shared with the reload thread
   with patch.object(api_module, 'RecommendReviewers') as MockRecommendReviewers:
-    MockRecommendReviewers.return_value.recommend.return_value = SOME_RESPONSE
-    yield MockRecommendReviewers
+    with patch.object(api_module, 'DatabaseSnapshot'):
+      with patch.object(api_module, 'ManuscriptModel'):
+        with patch.object(api_module, 'load_similarity_model_from_database'):
+          MockRecommendReviewers.return_value.recommend.return_value = SOME_RESPONSE
+          yield MockRecommendReviewers
 
 @pytest.fixture(name='MockFlaskAuth0')
 def _mock_flask_auth_0():
@@ -253,6 +280,56 @@ class TestApiBlueprint:
           limit=LIMIT_1
         )
 
+    def test_should_pass_sorted_fields_exclude_and_abstracts_to_recommend_method(
+      self, MockRecommendReviewers):
+
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1,
+          'fields': 'scores,person',
+          'exclude': 'authors',
+          'abstracts': 'none'
+        }))
+        _assert_partial_called_with(
+          MockRecommendReviewers.return_value.recommend,
+          fields=['person', 'scores'],
+          exclude=['authors'],
+          abstracts='none'
+        )
+
+    def test_should_not_pass_default_abstracts_option_to_recommend_method(
+      self, MockRecommendReviewers):
+
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1,
+          'abstracts': 'full'
+        }))
+        kwargs = MockRecommendReviewers.return_value.recommend.call_args[1]
+        assert 'abstracts' not in kwargs
+        assert 'fields' not in kwargs
+
+    def test_should_reject_unknown_abstracts_option(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1,
+          'abstracts': 'other'
+        }))
+        assert response.status_code == 400
+
+    def test_should_reject_unknown_fields(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1,
+          'fields': 'scroes'
+        }))
+        assert response.status_code == 400
+        MockRecommendReviewers.return_value.recommend.assert_not_called()
+
     def test_should_default_to_none_role(self, MockRecommendReviewers):
       config = dict_to_config({})
       with _api_test_client(config, {}) as test_client:
@@ -320,6 +397,220 @@ class TestApiBlueprint:
         }))
         assert MockRecommendReviewers.return_value.recommend.call_count == 2
 
+    def test_should_cache_regardless_of_keyword_order_and_case(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'keywords': ','.join([VALUE_1, VALUE_2])
+        }))
+        assert _get_ok_json(response) == SOME_RESPONSE
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'keywords': ','.join([VALUE_2.upper(), ' ' + VALUE_1])
+        }))
+        assert _get_ok_json(response) == SOME_RESPONSE
+        MockRecommendReviewers.return_value.recommend.assert_called_once()
+        _assert_partial_called_with(
+          MockRecommendReviewers.return_value.recommend,
+          keywords=','.join([VALUE_1, VALUE_2])
+        )
+
+    def test_should_close_database_connections_after_loading(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with populated_in_memory_database({}, autocommit=True) as db:
+        with patch.object(api_module, 'connect_configured_database') as connect_mock:
+          connect_mock.return_value = db
+          db.engine.dispose = MagicMock(name='dispose')
+          _, reload_api, _ = create_api_blueprint(config)
+          assert db.engine.dispose.call_count == 1
+          reload_api(wait=True)
+          assert db.engine.dispose.call_count == 2
+      MockRecommendReviewers.assert_called()
+
+    def test_should_not_use_cached_results_after_reload(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client_and_reload(config, {}) as (test_client, reload_api):
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1
+        }))
+        reload_api()
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1
+        }))
+        assert MockRecommendReviewers.return_value.recommend.call_count == 2
+
+    def test_should_warm_cache_with_previous_queries_after_reload(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client_and_reload(config, {}) as (test_client, reload_api):
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'keywords': VALUE_1
+        }))
+        reload_api()
+        assert MockRecommendReviewers.return_value.recommend.call_count == 2
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'keywords': VALUE_1
+        }))
+        assert MockRecommendReviewers.return_value.recommend.call_count == 2
+
+    def test_should_warm_cache_with_recently_active_manuscripts_for_all_search_types(
+      self, MockRecommendReviewers):
+
+      config = dict_to_config({
+        SEARCH_SECTION_PREFIX + SEARCH_TYPE_1: {'filter_by_role': VALUE_1},
+        SEARCH_SECTION_PREFIX + SEARCH_TYPE_2: {'filter_by_role': VALUE_2}
+      })
+      recommend_reviewers_mock = MockRecommendReviewers.return_value
+      recommend_reviewers_mock.get_recently_active_manuscript_ids.return_value = [
+        MANUSCRIPT_NO_1
+      ]
+      with _api_test_client_and_reload(config, {}) as (test_client, reload_api):
+        reload_api()
+        assert recommend_reviewers_mock.recommend.call_count == 2
+        for search_type in [SEARCH_TYPE_1, SEARCH_TYPE_2]:
+          response = test_client.get('/recommend-reviewers?' + urlencode({
+            'manuscript_no': MANUSCRIPT_NO_1,
+            'limit': api_module.DEFAULT_WARM_CACHE_LIMIT,
+            'search_type': search_type
+          }))
+          assert _get_ok_json(response) == SOME_RESPONSE
+        assert recommend_reviewers_mock.recommend.call_count == 2
+
+    def test_should_warm_cache_for_manuscript_queries_of_client(self, MockRecommendReviewers):
+      config = dict_to_config({
+        SEARCH_SECTION_PREFIX + SEARCH_TYPE_1: {'filter_by_role': VALUE_1}
+      })
+      recommend_reviewers_mock = MockRecommendReviewers.return_value
+      recommend_reviewers_mock.get_recently_active_manuscript_ids.return_value = [
+        MANUSCRIPT_NO_1
+      ]
+      with _api_test_client_and_reload(config, {}) as (test_client, reload_api):
+        reload_api()
+        assert recommend_reviewers_mock.recommend.call_count == 1
+        # the parameters as sent by the client
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1,
+          'subject_area': '',
+          'keywords': '',
+          'abstract': '',
+          'limit': '50',
+          'search_type': SEARCH_TYPE_1
+        }))
+        assert _get_ok_json(response) == SOME_RESPONSE
+        assert recommend_reviewers_mock.recommend.call_count == 1
+
+    def test_should_pass_empty_parameters_as_none(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': '',
+          'subject_area': VALUE_2,
+          'keywords': '',
+          'abstract': ''
+        }))
+        _assert_partial_called_with(
+          MockRecommendReviewers.return_value.recommend,
+          manuscript_no=None, subject_area=VALUE_2, keywords=None, abstract=None
+        )
+
+    def test_should_not_cache_if_result_cache_is_disabled(self, MockRecommendReviewers):
+      config = dict_to_config({'server': {'result_cache_max_size_mb': '0'}})
+      with _api_test_client(config, {}) as test_client:
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1
+        }))
+        test_client.get('/recommend-reviewers?' + urlencode({
+          'manuscript_no': MANUSCRIPT_NO_1
+        }))
+        assert MockRecommendReviewers.return_value.recommend.call_count == 2
+
+  class TestRecommendWithCursor:
+    def _get_first_page(self, test_client, **kwargs):
+      return _get_ok_json(test_client.get('/recommend-reviewers?' + urlencode({
+        'keywords': VALUE_1,
+        'limit': 2,
+        **kwargs
+      })))
+
+    def test_should_request_first_page_at_offset_zero(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        self._get_first_page(test_client)
+        _assert_partial_called_with(
+          MockRecommendReviewers.return_value.recommend,
+          offset=0, limit=2
+        )
+
+    def test_should_not_return_cursor_without_further_potential_reviewers(
+      self, MockRecommendReviewers):
+
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        MockRecommendReviewers.return_value.recommend.return_value = {
+          **SOME_RESPONSE, 'potential_reviewer_count': 2
+        }
+        assert 'next_cursor' not in self._get_first_page(test_client)
+
+    def test_should_request_next_page_using_cursor(self, MockRecommendReviewers):
+      config = dict_to_config({
+        SEARCH_SECTION_PREFIX + SEARCH_TYPE_1: {'filter_by_role': VALUE_1}
+      })
+      with _api_test_client(config, {}) as test_client:
+        recommend_mock = MockRecommendReviewers.return_value.recommend
+        recommend_mock.return_value = {**SOME_RESPONSE, 'potential_reviewer_count': 5}
+        first_page = self._get_first_page(
+          test_client, search_type=SEARCH_TYPE_1, fields='person'
+        )
+        second_page = _get_ok_json(test_client.get('/recommend-reviewers?' + urlencode({
+          'cursor': first_page['next_cursor'],
+          'search_type': SEARCH_TYPE_1
+        })))
+        _assert_partial_called_with(
+          recommend_mock,
+          keywords=VALUE_1, limit=2, offset=2, role=VALUE_1, fields=['person']
+        )
+        third_page = _get_ok_json(test_client.get('/recommend-reviewers?' + urlencode({
+          'cursor': second_page['next_cursor'],
+          'search_type': SEARCH_TYPE_1
+        })))
+        _assert_partial_called_with(recommend_mock, offset=4)
+        assert 'next_cursor' not in third_page
+
+    def test_should_reject_invalid_cursor(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client(config, {}) as test_client:
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'cursor': 'invalid'
+        }))
+        assert response.status_code == 400
+
+    def test_should_reject_cursor_of_other_search_type(self, MockRecommendReviewers):
+      config = dict_to_config({
+        SEARCH_SECTION_PREFIX + SEARCH_TYPE_1: {'filter_by_role': VALUE_1},
+        SEARCH_SECTION_PREFIX + SEARCH_TYPE_2: {'filter_by_role': VALUE_2}
+      })
+      with _api_test_client(config, {}) as test_client:
+        MockRecommendReviewers.return_value.recommend.return_value = {
+          **SOME_RESPONSE, 'potential_reviewer_count': 5
+        }
+        first_page = self._get_first_page(test_client, search_type=SEARCH_TYPE_1)
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'cursor': first_page['next_cursor'],
+          'search_type': SEARCH_TYPE_2
+        }))
+        assert response.status_code == 400
+
+    def test_should_reject_cursor_after_reload(self, MockRecommendReviewers):
+      config = ConfigParser()
+      with _api_test_client_and_reload(config, {}) as (test_client, reload_api):
+        MockRecommendReviewers.return_value.recommend.return_value = {
+          **SOME_RESPONSE, 'potential_reviewer_count': 5
+        }
+        first_page = self._get_first_page(test_client)
+        reload_api()
+        response = test_client.get('/recommend-reviewers?' + urlencode({
+          'cursor': first_page['next_cursor']
+        }))
+        assert response.status_code == 410
+
   class TestRecommendWithAuth:
     def test_should_allow_search_type_for_person_with_matching_role(
       self, MockRecommendReviewers, MockFlaskAuth0):
@@ -461,3 +752,51 @@ class TestApiAuth:
       wrapped_f = api_auth.wrap_search(f)
       assert wrapped_f != f
       assert wrapped_f() == f.return_value
+
+class TestReloadableRecommendReviewers:
+  def test_should_keep_using_previous_recommender_while_reloading(self):
+    factory = _BlockingRecommenderFactory()
+    reloadable = ReloadableRecommendReviewers(factory)
+    assert reloadable.reload_in_background()
+    assert factory.started.wait(5)
+    assert reloadable.get_current() == (factory.recommenders[0], 0)
+    assert reloadable.get_reload_status()['reloading']
+    factory.release.set()
+    reloadable.wait_for_reload(5)
+    assert reloadable.get_current() == (factory.recommenders[1], 1)
+    assert not reloadable.get_reload_status()['reloading']
+
+  def test_should_coalesce_reload_requests_received_while_reloading(self):
+    factory = _BlockingRecommenderFactory()
+    reloadable = ReloadableRecommendReviewers(factory)
+    assert reloadable.reload_in_background()
+    assert factory.started.wait(5)
+    assert not reloadable.reload_in_background()
+    assert not reloadable.reload_in_background()
+    assert reloadable.get_reload_status()['reload_requested']
+    factory.release.set()
+    reloadable.wait_for_reload(5)
+    assert len(factory.recommenders) == 3
+    assert reloadable.get_current() == (factory.recommenders[2], 2)
+
+  def test_should_prepare_recommender_before_using_it(self):
+    factory = _BlockingRecommenderFactory()
+    factory.release.set()
+    prepared = []
+    reloadable = ReloadableRecommendReviewers(
+      factory,
+      prepare_recommend_reviewer=lambda recommender, data_version: prepared.append(
+        (recommender, data_version, reloadable.data_version)
+      )
+    )
+    reloadable.reload()
+    assert prepared == [(factory.recommenders[1], 1, 0)]
+
+  def test_should_keep_previous_recommender_and_report_error_if_reload_failed(self):
+    factory = Mock(side_effect=[Mock(name='recommender0'), RuntimeError('failed')])
+    reloadable = ReloadableRecommendReviewers(factory)
+    recommender = reloadable.get_current()[0]
+    reloadable.reload_in_background()
+    reloadable.wait_for_reload(5)
+    assert reloadable.get_current() == (recommender, 0)
+    assert reloadable.get_reload_status()['last_error'] == 'failed'
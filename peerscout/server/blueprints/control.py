@@ -6,16 +6,24 @@ from ..auth.FlaskAuth0 import get_remote_ip
 
 LOGGER = logging.getLogger(__name__)
 
-def create_control_blueprint(reload_fn):
+def create_control_blueprint(reload_fn, get_reload_status_fn):
   blueprint = Blueprint('control', __name__)
 
-  @blueprint.route("/reload", methods=['POST'])
-  def _control_reload() -> Response:
+  @blueprint.before_request
+  def _check_remote_ip():
+    # the control endpoints (including the reload status with its error) are local only
     remote_ip = get_remote_ip()
     if remote_ip != '127.0.0.1':
       return jsonify({'ip': remote_ip}), 403
-    LOGGER.info("reloading...")
-    reload_fn()
-    return jsonify({'status': 'OK'})
+    return None
+
+  @blueprint.route("/reload", methods=['POST'])
+  def _control_reload() -> Response:
+    LOGGER.info("reloading in the background...")
+    return jsonify({'status': 'OK', 'reload': reload_fn()})
+
+  @blueprint.route("/reload", methods=['GET'])
+  def _control_reload_status() -> Response:
+    return jsonify(get_reload_status_fn())
 
   return blueprint
@@ -0,0 +1,49 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from flask import Flask
+
+from .control import create_control_blueprint
+
+LOCAL_IP = '127.0.0.1'
+REMOTE_IP = '10.0.0.1'
+
+RELOAD_STATUS = {'reloading': False, 'last_error': 'error1'}
+
+@pytest.fixture(name='reload_fn')
+def _reload_fn():
+  return MagicMock(name='reload_fn', return_value=True)
+
+@pytest.fixture(name='test_client')
+def _test_client(reload_fn):
+  app = Flask(__name__)
+  app.register_blueprint(create_control_blueprint(
+    reload_fn=reload_fn,
+    get_reload_status_fn=lambda: RELOAD_STATUS
+  ), url_prefix='/control')
+  return app.test_client()
+
+class TestControlBlueprint:
+  class TestReload:
+    def test_should_reload_if_requested_locally(self, test_client, reload_fn):
+      response = test_client.post('/control/reload', environ_base={'REMOTE_ADDR': LOCAL_IP})
+      assert response.status_code == 200
+      reload_fn.assert_called_with()
+
+    def test_should_reject_remote_reload_request(self, test_client, reload_fn):
+      response = test_client.post('/control/reload', environ_base={'REMOTE_ADDR': REMOTE_IP})
+      assert response.status_code == 403
+      reload_fn.assert_not_called()
+
+  class TestReloadStatus:
+    def test_should_return_reload_status_if_requested_locally(self, test_client):
+      response = test_client.get('/control/reload', environ_base={'REMOTE_ADDR': LOCAL_IP})
+      assert response.status_code == 200
+      assert json.loads(response.data.decode('utf-8')) == RELOAD_STATUS
+
+    def test_should_reject_remote_reload_status_request(self, test_client):
+      response = test_client.get('/control/reload', environ_base={'REMOTE_ADDR': REMOTE_IP})
+      assert response.status_code == 403
+      assert 'error1' not in response.data.decode('utf-8')
@@ -29,11 +29,12 @@ def create_app(config):
   app.json_encoder = CustomJSONEncoder
   CORS(app)
 
-  api, reload_api = create_api_blueprint(config)
+  api, reload_api, get_reload_status = create_api_blueprint(config)
   app.register_blueprint(api, url_prefix='/api')
 
   control = create_control_blueprint(
-    reload_fn=reload_api
+    reload_fn=reload_api,
+    get_reload_status_fn=get_reload_status
   )
   app.register_blueprint(control, url_prefix='/control')
 
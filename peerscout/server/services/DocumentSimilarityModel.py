@@ -1,108 +1,247 @@
+import hashlib
 import logging
 
 import pickle
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 
-from .utils import filter_by
+from peerscout.utils.cache import LruCache
+
+from ...shared.similarity_index import SimilarityIndex, normalize_vectors, combine_docvecs
+
+from .database_snapshot import DatabaseSnapshot, query_docvecs
 
 NAME = 'DocumentSimilarityModel'
 
-VERSION_ID = 'version_id'
+class SimilarityAggregations:
+  # how the similarity to multiple versions of a manuscript is combined
+  MAX = 'max'
+  MEAN = 'mean'
+  LATEST = 'latest'
+
+SIMILARITY_AGGREGATIONS = [
+  SimilarityAggregations.MAX, SimilarityAggregations.MEAN, SimilarityAggregations.LATEST
+]
 
-ABSTRACT_DOCVEC_COLUMN = 'abstract-docvec'
-SIMILARITY_COLUMN = 'similarity'
+DEFAULT_SIMILARITY_AGGREGATION = SimilarityAggregations.LATEST
 
-def load_docvecs(db, manuscript_model, column_name):
-  ml_manuscript_data_table = db['ml_manuscript_data']
-  docvec_column = getattr(ml_manuscript_data_table.table, column_name)
+# number of abstracts to keep the docvecs of (inferring them is the expensive part of a search)
+DEFAULT_ABSTRACT_DOCVECS_CACHE_SIZE = 1000
 
-  # Find out whether we need to update anything at all
-  abstract_docvecs_all_df = pd.DataFrame(db.session.query(
-    ml_manuscript_data_table.table.version_id,
-    docvec_column
-  ).filter(
-    docvec_column != None
-  ).all(), columns=[VERSION_ID, ABSTRACT_DOCVEC_COLUMN])
 
-  abstract_docvecs_df = filter_by(
-    abstract_docvecs_all_df,
-    VERSION_ID,
-    manuscript_model.get_valid_manuscript_version_ids()
+def load_docvecs(db, column_name):
+  version_ids, docvecs = (
+    db.read_docvecs(column_name) if isinstance(db, DatabaseSnapshot)
+    else query_docvecs(db, column_name)
   )
-  logging.getLogger(NAME).info("valid docvecs: %d", len(abstract_docvecs_df))
+  return pd.Index(version_ids), docvecs
+
+def normalize_abstract(abstract):
+  return ' '.join(abstract.split())
+
+def get_abstract_cache_key(normalized_abstract):
+  return hashlib.sha256(normalized_abstract.encode('utf-8')).hexdigest()
+
+def aggregate_similarities(similarities, aggregation):
+  # similarities has one column per query docvec, ordered by version (latest last)
+  if aggregation == SimilarityAggregations.MAX:
+    return similarities.max(axis=1)
+  if aggregation == SimilarityAggregations.MEAN:
+    return similarities.mean(axis=1)
+  return similarities[:, -1]
+
+class ManuscriptSimilarity:
+  """The similarity of the candidate manuscripts to a query, in the rows of the model.
+
+  Similar manuscripts are selected without sorting or materialising the similarity
+  of all of the candidates. When using the similarity index, the similarity of manuscripts
+  outside of the probed lists is nan (not considered by top_k), and only calculated
+  when requested via get_similarity_by_version_id.
+  """
+
+  def __init__(
+    self, version_ids, row_index_by_version_id, similarities, is_included, score_rows=None):
+
+    self._version_ids = version_ids
+    self._row_index_by_version_id = row_index_by_version_id
+    self._similarities = similarities
+    self._is_included = is_included
+    self._score_rows = score_rows
 
-  return abstract_docvecs_all_df, abstract_docvecs_df
+  @staticmethod
+  def empty():
+    return ManuscriptSimilarity(
+      np.array([], dtype=object), pd.Index([]), np.array([], dtype=np.float32),
+      np.array([], dtype=bool)
+    )
+
+  def __len__(self):
+    return int(np.count_nonzero(self._is_included & ~np.isnan(self._similarities)))
+
+  def _get_rows(self, version_ids):
+    rows = self._row_index_by_version_id.get_indexer(list(version_ids))
+    rows = rows[rows >= 0]
+    return rows[self._is_included[rows]]
+
+  def _get_scored_rows(self, rows):
+    return rows[~np.isnan(self._similarities[rows])]
+
+  def top_k(self, k=None, min_similarity=None, version_ids=None):
+    """Returns the version ids and similarities of the (up to) k most similar manuscripts.
+
+    Optionally only considers manuscripts with at least min_similarity, or of the version ids.
+    """
+
+    rows = self._get_scored_rows(
+      np.flatnonzero(self._is_included) if version_ids is None
+      else np.unique(self._get_rows(version_ids))
+    )
+    if min_similarity is not None:
+      rows = rows[self._similarities[rows] >= min_similarity]
+    if k is not None and len(rows) > k:
+      if k <= 0:
+        rows = rows[:0]
+      else:
+        rows = rows[np.argpartition(-self._similarities[rows], k - 1)[:k]]
+    rows = rows[np.argsort(-self._similarities[rows], kind='mergesort')]
+    return self._version_ids[rows], self._similarities[rows]
+
+  def get_similarity_by_version_id(self, version_ids):
+    rows = self._get_rows(version_ids)
+    unscored_rows = rows[np.isnan(self._similarities[rows])]
+    if len(unscored_rows) and self._score_rows is not None:
+      self._similarities[unscored_rows] = self._score_rows(unscored_rows)
+    rows = self._get_scored_rows(rows)
+    return dict(zip(self._version_ids[rows], self._similarities[rows].tolist()))
 
 class DocumentSimilarityModel(object):
   def __init__(
     self, db, manuscript_model,
-    lda_docvec_predict_model=None, doc2vec_docvec_predict_model=None):
+    lda_docvec_predict_model=None, doc2vec_docvec_predict_model=None,
+    similarity_index=None, similarity_index_n_probe=None,
+    similarity_aggregation=DEFAULT_SIMILARITY_AGGREGATION,
+    abstract_docvecs_cache_size=DEFAULT_ABSTRACT_DOCVECS_CACHE_SIZE):
 
+    logger = logging.getLogger(NAME)
+    if similarity_aggregation not in SIMILARITY_AGGREGATIONS:
+      raise ValueError('similarity aggregation must be one of: %s (was %s)' % (
+        ', '.join(SIMILARITY_AGGREGATIONS), similarity_aggregation
+      ))
+    self.similarity_aggregation = similarity_aggregation
+    # the LDA and Doc2Vec docvecs of recently searched abstracts
+    self._abstract_docvecs_cache = LruCache(
+      max_size=abstract_docvecs_cache_size, get_size=lambda _: 1
+    )
     self.lda_docvec_predict_model = lda_docvec_predict_model
     self.doc2vec_docvec_predict_model = doc2vec_docvec_predict_model
 
-    self.abstract_lda_docvecs_all_df, self.abstract_lda_docvecs_df = (
-      load_docvecs(db, manuscript_model, 'lda_docvec')
+    # the docvecs of all manuscript versions (e.g. for the manuscript being searched for)
+    self._lda_version_index, self._lda_docvecs = load_docvecs(db, 'lda_docvec')
+    self._doc2vec_version_index, self._doc2vec_docvecs = load_docvecs(db, 'doc2vec_docvec')
+
+    # the valid manuscript versions with both docvecs, that similar manuscripts are chosen from,
+    # with normalised docvecs in matching rows
+    is_candidate = (
+      self._lda_version_index.isin(list(manuscript_model.get_valid_manuscript_version_ids())) &
+      self._lda_version_index.isin(self._doc2vec_version_index)
     )
-    self.abstract_doc2vec_all_df, self.abstract_doc2vec_df = (
-      load_docvecs(db, manuscript_model, 'doc2vec_docvec')
+    self.version_ids = np.asarray(self._lda_version_index[is_candidate], dtype=object)
+    self._row_index_by_version_id = pd.Index(self.version_ids)
+    self._lda_matrix = normalize_vectors(self._lda_docvecs[np.flatnonzero(is_candidate)])
+    self._doc2vec_matrix = normalize_vectors(self._doc2vec_docvecs[
+      self._doc2vec_version_index.get_indexer(self.version_ids)
+    ])
+    logger.info("valid docvecs: %d", len(self.version_ids))
+
+    self._similarity_index = None
+    if similarity_index is not None and similarity_index_n_probe:
+      self._init_similarity_index(similarity_index, similarity_index_n_probe)
+
+  def _init_similarity_index(self, similarity_index, n_probe):
+    logger = logging.getLogger(NAME)
+    dimensions = self._lda_matrix.shape[1] + self._doc2vec_matrix.shape[1]
+    if similarity_index.centroids.shape[1] != dimensions:
+      logger.warning(
+        "similarity index doesn't match docvecs (%d != %d dimensions), using exact search",
+        similarity_index.centroids.shape[1], dimensions
+      )
+      return
+    # the index lists refer to the model rows, rows not in the index (e.g. not yet indexed)
+    # are always scored
+    rows_by_list = self._row_index_by_version_id.get_indexer(similarity_index.keys)
+    is_indexed = np.zeros(len(self.version_ids), dtype=bool)
+    is_indexed[rows_by_list[rows_by_list >= 0]] = True
+    self._similarity_index = similarity_index
+    self._similarity_index_n_probe = n_probe
+    self._similarity_index_rows_by_list = rows_by_list
+    self._unindexed_rows = np.flatnonzero(~is_indexed)
+    logger.info(
+      "using similarity index, lists: %d, n_probe: %d, unindexed docvecs: %d",
+      similarity_index.list_count, n_probe, len(self._unindexed_rows)
     )
 
+  def _get_candidate_rows(self, lda_docvecs, doc2vec_docvecs):
+    # returns None if all of the rows need to be considered (exact search)
+    if (
+      self._similarity_index is None or
+      self._similarity_index_n_probe >= self._similarity_index.list_count
+    ):
+      return None
+    list_offsets = self._similarity_index.list_offsets
+    # the lists close to any of the query docvecs
+    list_indices = np.unique(np.concatenate([
+      self._similarity_index.probe(combined_docvec, self._similarity_index_n_probe)
+      for combined_docvec in combine_docvecs(lda_docvecs, doc2vec_docvecs)
+    ]))
+    rows = np.concatenate([
+      self._similarity_index_rows_by_list[list_offsets[i]:list_offsets[i + 1]]
+      for i in list_indices
+    ] + [self._unindexed_rows])
+    return rows[rows >= 0]
+
   def __empty_similarity_result(self):
-    return pd.DataFrame({
-      VERSION_ID: [],
-      SIMILARITY_COLUMN: []
-    })
+    return ManuscriptSimilarity.empty()
 
   def __find_similar_manuscripts_to_docvecs(
     self, to_lda_docvecs, to_doc2vec, exclude_version_ids=None):
 
     logger = logging.getLogger(NAME)
-    if len(to_lda_docvecs) == 0 or len(to_doc2vec) != len(to_lda_docvecs):
+    if (
+      len(to_lda_docvecs) == 0 or len(to_doc2vec) != len(to_lda_docvecs) or
+      len(self.version_ids) == 0
+    ):
       return self.__empty_similarity_result()
-    version_ids = (
-      set(self.abstract_lda_docvecs_df[VERSION_ID].values) &
-      set(self.abstract_doc2vec_df[VERSION_ID].values)
+    # all of the query docvecs are scored in a single matrix product per embedding type
+    lda_docvecs = normalize_vectors(to_lda_docvecs)
+    doc2vec_docvecs = normalize_vectors(to_doc2vec)
+
+    def score_rows(rows=None):
+      lda_matrix = self._lda_matrix if rows is None else self._lda_matrix[rows]
+      doc2vec_matrix = self._doc2vec_matrix if rows is None else self._doc2vec_matrix[rows]
+      return aggregate_similarities(
+        (lda_matrix.dot(lda_docvecs.T) + doc2vec_matrix.dot(doc2vec_docvecs.T)) / 2,
+        self.similarity_aggregation
+      )
+
+    candidate_rows = self._get_candidate_rows(lda_docvecs, doc2vec_docvecs)
+    if candidate_rows is None:
+      combined_similarity = score_rows()
+    else:
+      combined_similarity = np.full(len(self.version_ids), np.nan, dtype=np.float32)
+      combined_similarity[candidate_rows] = score_rows(candidate_rows)
+    logger.debug(
+      "combined_similarity: %s (candidates: %s)",
+      combined_similarity.shape, 'all' if candidate_rows is None else len(candidate_rows)
     )
+    is_included = np.ones(len(self.version_ids), dtype=bool)
     if exclude_version_ids is not None:
-      version_ids = version_ids - set(exclude_version_ids)
-    version_ids = list(version_ids)
-    other_lda_docvecs = np.array(
-      self.abstract_lda_docvecs_df.set_index(VERSION_ID)[ABSTRACT_DOCVEC_COLUMN]
-      .loc[version_ids].values.tolist()
+      exclude_row_indices = self._row_index_by_version_id.get_indexer(list(exclude_version_ids))
+      is_included[exclude_row_indices[exclude_row_indices >= 0]] = False
+    return ManuscriptSimilarity(
+      self.version_ids, self._row_index_by_version_id, combined_similarity, is_included,
+      score_rows=score_rows
     )
-    other_doc2vec_docvecs = np.array(
-      self.abstract_doc2vec_df.set_index(VERSION_ID)[ABSTRACT_DOCVEC_COLUMN]
-      .loc[version_ids].values.tolist()
-    )
-    to_lda_docvecs = np.array(to_lda_docvecs)
-    to_doc2vec = np.array(to_doc2vec)
-    lda_similarity = cosine_similarity(
-      other_lda_docvecs,\
-      to_lda_docvecs
-    )[:, 0].reshape(-1)
-    doc2vec_similarity = cosine_similarity(
-      other_doc2vec_docvecs,\
-      to_doc2vec
-    )[:, 0].reshape(-1)
-    logger.debug("lda_similarity: %s", lda_similarity.shape)
-    logger.debug("doc2vec_similarity: %s", doc2vec_similarity.shape)
-    combined_similarity = (lda_similarity + doc2vec_similarity) / 2
-    logger.debug("combined_similarity: %s", combined_similarity.shape)
-    similarity = pd.DataFrame({
-      VERSION_ID: version_ids,
-      SIMILARITY_COLUMN: combined_similarity
-    })
-    if exclude_version_ids is not None:
-      similarity = similarity[
-        ~similarity[VERSION_ID].isin(
-          exclude_version_ids
-        )
-      ]
-    return similarity
 
   def is_incomplete_model(self):
     return (
@@ -113,41 +252,66 @@ class DocumentSimilarityModel(object):
   def find_similar_manuscripts_to_abstract(self, abstract):
     if self.is_incomplete_model():
       return self.__empty_similarity_result()
-    to_lda_docvecs = (
-      self.lda_docvec_predict_model.transform([abstract])
-      if self.lda_docvec_predict_model is not None
-      else []
-    )
-    to_doc2vec_docvecs = (
-      self.doc2vec_docvec_predict_model.transform([abstract])
-      if self.doc2vec_docvec_predict_model is not None
-      else []
-    )
+    to_lda_docvecs, to_doc2vec_docvecs = self._get_abstract_docvecs(abstract)
     logging.getLogger(NAME).debug("abstract docvec: %s, %s", to_lda_docvecs, abstract)
     return self.__find_similar_manuscripts_to_docvecs(to_lda_docvecs, to_doc2vec_docvecs)
 
-  def find_similar_manuscripts(self, version_ids):
+  def _get_abstract_docvecs(self, abstract):
+    normalized_abstract = normalize_abstract(abstract)
+    cache_key = get_abstract_cache_key(normalized_abstract)
+    abstract_docvecs = self._abstract_docvecs_cache.get(cache_key)
+    if abstract_docvecs is None:
+      abstract_docvecs = (
+        np.asarray(self.lda_docvec_predict_model.transform([normalized_abstract])),
+        np.asarray(self.doc2vec_docvec_predict_model.transform([normalized_abstract]))
+      )
+      self._abstract_docvecs_cache.put(cache_key, abstract_docvecs)
+    return abstract_docvecs
+
+  def find_similar_manuscripts(self, version_ids, exclude_version_ids=None):
+    """Finds manuscripts similar to the versions (e.g. all versions of a manuscript).
+
+    The similarity to the versions is combined using the similarity aggregation,
+    the version with the greatest version id is considered the latest.
+    Only the latest version is excluded from the result, unless exclude_version_ids is passed.
+    """
+
     if self.is_incomplete_model():
       return self.__empty_similarity_result()
-    to_lda_docvecs = self.abstract_lda_docvecs_all_df[
-      self.abstract_lda_docvecs_all_df[VERSION_ID].isin(
-        version_ids
-      )
-    ][ABSTRACT_DOCVEC_COLUMN].values
-    to_doc2vec_docvecs = self.abstract_doc2vec_all_df[
-      self.abstract_doc2vec_all_df[VERSION_ID].isin(
-        version_ids
-      )
-    ][ABSTRACT_DOCVEC_COLUMN].values
-    if len(to_lda_docvecs) == 0 or len(to_doc2vec_docvecs) == 0:
+    sorted_version_ids = sorted(set(version_ids))
+    if exclude_version_ids is None:
+      exclude_version_ids = sorted_version_ids[-1:]
+    query_version_ids = [
+      version_id for version_id in sorted_version_ids
+      if version_id in self._lda_version_index and version_id in self._doc2vec_version_index
+    ]
+    if self.similarity_aggregation == SimilarityAggregations.LATEST:
+      query_version_ids = query_version_ids[-1:]
+    to_lda_docvecs = self._lda_docvecs[
+      self._lda_version_index.get_indexer(query_version_ids)
+    ]
+    to_doc2vec_docvecs = self._doc2vec_docvecs[
+      self._doc2vec_version_index.get_indexer(query_version_ids)
+    ]
+    if not query_version_ids:
       logging.getLogger(NAME).debug("no docvecs for: %s", version_ids)
     return self.__find_similar_manuscripts_to_docvecs(
-      to_lda_docvecs.tolist(),
-      to_doc2vec_docvecs.tolist(),
-      exclude_version_ids=version_ids
+      to_lda_docvecs,
+      to_doc2vec_docvecs,
+      exclude_version_ids=exclude_version_ids
     )
 
-def load_similarity_model_from_database(db, manuscript_model):
+def load_similarity_index(model_data, model_id):
+  if model_id not in model_data.index:
+    logging.getLogger(NAME).warning("no similarity index found, using exact search")
+    return None
+  return SimilarityIndex.from_binary(model_data.loc[model_id]['data'])
+
+def load_similarity_model_from_database(
+  db, manuscript_model, similarity_index_n_probe=None,
+  similarity_aggregation=DEFAULT_SIMILARITY_AGGREGATION,
+  abstract_docvecs_cache_size=DEFAULT_ABSTRACT_DOCVECS_CACHE_SIZE):
+
   ml_model_data_table = db['ml_model_data']
 
   required_model_ids = set([
@@ -155,12 +319,8 @@ def load_similarity_model_from_database(db, manuscript_model):
     ml_model_data_table.table.DOC2VEC_MODEL_ID
   ])
 
-  model_data = pd.DataFrame(db.session.query(
-    ml_model_data_table.table.model_id,
-    ml_model_data_table.table.data
-  ).filter(
-    ml_model_data_table.table.model_id.in_(required_model_ids)
-  ).all(), columns=['model_id', 'data']).set_index('model_id')
+  all_model_data = ml_model_data_table.read_frame()
+  model_data = all_model_data[all_model_data.index.isin(required_model_ids)]
 
   if set(model_data.index.values) != required_model_ids:
     logging.getLogger(NAME).warning(
@@ -170,18 +330,28 @@ def load_similarity_model_from_database(db, manuscript_model):
     return DocumentSimilarityModel(
       db, manuscript_model=manuscript_model,
       lda_docvec_predict_model=None,
-      doc2vec_docvec_predict_model=None
+      doc2vec_docvec_predict_model=None,
+      similarity_aggregation=similarity_aggregation
     )
 
   lda_docvec_predict_model = pickle.loads(
-    model_data.ix[ml_model_data_table.table.LDA_MODEL_ID]['data']
+    model_data.loc[ml_model_data_table.table.LDA_MODEL_ID]['data']
   )
   doc2vec_docvec_predict_model = pickle.loads(
-    model_data.ix[ml_model_data_table.table.DOC2VEC_MODEL_ID]['data']
+    model_data.loc[ml_model_data_table.table.DOC2VEC_MODEL_ID]['data']
+  )
+  similarity_index = (
+    load_similarity_index(all_model_data, ml_model_data_table.table.SIMILARITY_INDEX_MODEL_ID)
+    if similarity_index_n_probe
+    else None
   )
   similarity_model = DocumentSimilarityModel(
     db, manuscript_model=manuscript_model,
     lda_docvec_predict_model=lda_docvec_predict_model,
-    doc2vec_docvec_predict_model=doc2vec_docvec_predict_model
+    doc2vec_docvec_predict_model=doc2vec_docvec_predict_model,
+    similarity_index=similarity_index,
+    similarity_index_n_probe=similarity_index_n_probe,
+    similarity_aggregation=similarity_aggregation,
+    abstract_docvecs_cache_size=abstract_docvecs_cache_size
   )
   return similarity_model
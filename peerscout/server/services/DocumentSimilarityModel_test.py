@@ -0,0 +1,325 @@
+from contextlib import contextmanager
+import pickle
+
+import numpy as np
+import pytest
+
+from ...shared.database import populated_in_memory_database
+from ...shared.database_schema import ML_ModelData
+from ...shared.similarity_index import SimilarityIndex, combine_docvecs
+
+from .ManuscriptModel import ManuscriptModel
+from .DocumentSimilarityModel import (
+  DocumentSimilarityModel,
+  SimilarityAggregations,
+  load_similarity_model_from_database
+)
+
+from .test_data import (
+  version_id,
+  MANUSCRIPT_ID1,
+  MANUSCRIPT_VERSION1,
+  MANUSCRIPT_ID_FIELDS1, MANUSCRIPT_ID_FIELDS2, MANUSCRIPT_ID_FIELDS3,
+  MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2, MANUSCRIPT_VERSION_ID3,
+  VALID_DECISIONS, VALID_MANUSCRIPT_TYPES,
+  PUBLISHED_DECISIONS, PUBLISHED_MANUSCRIPT_TYPES
+)
+
+VERSION_ID = 'version_id'
+
+LDA_DOCVEC_COLUMN = 'lda_docvec'
+DOC2VEC_DOCVEC_COLUMN = 'doc2vec_docvec'
+
+ABSTRACT1 = 'abstract1'
+
+DOCVEC1 = [1.0, 0.0]
+DOCVEC2 = [1.0, 1.0]
+DOCVEC3 = [0.0, 2.0]
+
+def _cosine_similarity(a, b):
+  return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+class _DocvecPredictModel:
+  def __init__(self, docvec):
+    self.docvec = docvec
+    self.transformed_texts = []
+
+  def transform(self, texts):
+    self.transformed_texts.extend(texts)
+    return np.array([self.docvec for _ in texts])
+
+def _manuscript_versions_with_docvecs(id_fields_list, docvecs_list):
+  return {
+    'manuscript_version': [
+      {**MANUSCRIPT_VERSION1, **id_fields} for id_fields in id_fields_list
+    ],
+    'ml_manuscript_data': [
+      {**id_fields, LDA_DOCVEC_COLUMN: docvec, DOC2VEC_DOCVEC_COLUMN: docvec}
+      for id_fields, docvec in zip(id_fields_list, docvecs_list)
+    ]
+  }
+
+DATASET = _manuscript_versions_with_docvecs(
+  [MANUSCRIPT_ID_FIELDS1, MANUSCRIPT_ID_FIELDS2, MANUSCRIPT_ID_FIELDS3],
+  [DOCVEC1, DOCVEC2, DOCVEC3]
+)
+
+DATASET_SIMILARITY_INDEX = SimilarityIndex.build(
+  [MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2, MANUSCRIPT_VERSION_ID3],
+  combine_docvecs([DOCVEC1, DOCVEC2, DOCVEC3], [DOCVEC1, DOCVEC2, DOCVEC3]),
+  n_lists=3
+)
+
+def _create_manuscript_model(db):
+  return ManuscriptModel(
+    db,
+    valid_decisions=VALID_DECISIONS,
+    valid_manuscript_types=VALID_MANUSCRIPT_TYPES,
+    published_decisions=PUBLISHED_DECISIONS,
+    published_manuscript_types=PUBLISHED_MANUSCRIPT_TYPES
+  )
+
+@contextmanager
+def _similarity_model_for_dataset(dataset, abstract_docvec=None, **kwargs):
+  with populated_in_memory_database(dataset) as db:
+    manuscript_model = _create_manuscript_model(db)
+    yield DocumentSimilarityModel(
+      db, manuscript_model=manuscript_model,
+      lda_docvec_predict_model=_DocvecPredictModel(abstract_docvec or DOCVEC1),
+      doc2vec_docvec_predict_model=_DocvecPredictModel(abstract_docvec or DOCVEC1),
+      **kwargs
+    )
+
+def _similarity_by_version_id(manuscript_similarity):
+  return dict(zip(*manuscript_similarity.top_k()))
+
+@pytest.mark.slow
+class TestDocumentSimilarityModel:
+  class TestFindSimilarManuscriptsToAbstract:
+    def test_should_return_cosine_similarity_of_all_manuscripts(self):
+      with _similarity_model_for_dataset(DATASET, abstract_docvec=DOCVEC2) as model:
+        similarity_by_version_id = _similarity_by_version_id(
+          model.find_similar_manuscripts_to_abstract(ABSTRACT1)
+        )
+      assert similarity_by_version_id.keys() == {
+        MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2, MANUSCRIPT_VERSION_ID3
+      }
+      for expected_version_id, docvec in [
+        (MANUSCRIPT_VERSION_ID1, DOCVEC1),
+        (MANUSCRIPT_VERSION_ID2, DOCVEC2),
+        (MANUSCRIPT_VERSION_ID3, DOCVEC3)]:
+
+        assert similarity_by_version_id[expected_version_id] == pytest.approx(
+          _cosine_similarity(docvec, DOCVEC2), abs=1e-6
+        )
+
+    def test_should_return_empty_result_without_predict_models(self):
+      with populated_in_memory_database(DATASET) as db:
+        manuscript_model = ManuscriptModel(
+          db, valid_decisions=VALID_DECISIONS, valid_manuscript_types=VALID_MANUSCRIPT_TYPES
+        )
+        model = DocumentSimilarityModel(db, manuscript_model=manuscript_model)
+        assert len(model.find_similar_manuscripts_to_abstract(ABSTRACT1)) == 0
+
+    def test_should_infer_docvecs_of_same_normalised_abstract_only_once(self):
+      with _similarity_model_for_dataset(DATASET) as model:
+        first_result = _similarity_by_version_id(
+          model.find_similar_manuscripts_to_abstract(ABSTRACT1 + ' text')
+        )
+        second_result = _similarity_by_version_id(
+          model.find_similar_manuscripts_to_abstract(' %s \n text ' % ABSTRACT1)
+        )
+      assert second_result == first_result
+      assert model.lda_docvec_predict_model.transformed_texts == [ABSTRACT1 + ' text']
+      assert model.doc2vec_docvec_predict_model.transformed_texts == [ABSTRACT1 + ' text']
+
+    def test_should_infer_docvecs_again_if_cache_is_disabled(self):
+      with _similarity_model_for_dataset(DATASET, abstract_docvecs_cache_size=0) as model:
+        model.find_similar_manuscripts_to_abstract(ABSTRACT1)
+        model.find_similar_manuscripts_to_abstract(ABSTRACT1)
+      assert len(model.lda_docvec_predict_model.transformed_texts) == 2
+
+  class TestFindSimilarManuscripts:
+    def test_should_return_similarity_of_other_manuscripts(self):
+      with _similarity_model_for_dataset(DATASET) as model:
+        similarity_by_version_id = _similarity_by_version_id(
+          model.find_similar_manuscripts([MANUSCRIPT_VERSION_ID1])
+        )
+      assert similarity_by_version_id.keys() == {MANUSCRIPT_VERSION_ID2, MANUSCRIPT_VERSION_ID3}
+      assert similarity_by_version_id[MANUSCRIPT_VERSION_ID2] == pytest.approx(
+        _cosine_similarity(DOCVEC1, DOCVEC2), abs=1e-6
+      )
+      assert similarity_by_version_id[MANUSCRIPT_VERSION_ID3] == pytest.approx(0.0, abs=1e-6)
+
+    def test_should_not_return_invalid_manuscripts(self):
+      dataset = {
+        **DATASET,
+        'manuscript_version': [
+          {**manuscript_version, 'decision': 'other'}
+          if manuscript_version[VERSION_ID] == MANUSCRIPT_VERSION_ID3
+          else manuscript_version
+          for manuscript_version in DATASET['manuscript_version']
+        ]
+      }
+      with _similarity_model_for_dataset(dataset) as model:
+        assert set(_similarity_by_version_id(
+          model.find_similar_manuscripts([MANUSCRIPT_VERSION_ID1])
+        ).keys()) == {MANUSCRIPT_VERSION_ID2}
+
+    def test_should_find_manuscripts_similar_to_invalid_manuscript(self):
+      dataset = {
+        **DATASET,
+        'manuscript_version': [
+          {**manuscript_version, 'decision': 'other'}
+          if manuscript_version[VERSION_ID] == MANUSCRIPT_VERSION_ID1
+          else manuscript_version
+          for manuscript_version in DATASET['manuscript_version']
+        ]
+      }
+      with _similarity_model_for_dataset(dataset) as model:
+        assert set(_similarity_by_version_id(
+          model.find_similar_manuscripts([MANUSCRIPT_VERSION_ID1])
+        ).keys()) == {MANUSCRIPT_VERSION_ID2, MANUSCRIPT_VERSION_ID3}
+
+    def test_should_return_empty_result_for_manuscript_without_docvecs(self):
+      with _similarity_model_for_dataset(DATASET) as model:
+        assert len(model.find_similar_manuscripts(['other'])) == 0
+
+  class TestManuscriptSimilarity:
+    def test_should_return_most_similar_manuscripts_in_descending_order(self):
+      with _similarity_model_for_dataset(DATASET, abstract_docvec=DOCVEC3) as model:
+        version_ids, similarities = model.find_similar_manuscripts_to_abstract(
+          ABSTRACT1
+        ).top_k(2)
+      assert list(version_ids) == [MANUSCRIPT_VERSION_ID3, MANUSCRIPT_VERSION_ID2]
+      assert list(similarities) == pytest.approx([
+        1.0, _cosine_similarity(DOCVEC2, DOCVEC3)
+      ], abs=1e-6)
+
+    def test_should_only_return_manuscripts_with_min_similarity(self):
+      with _similarity_model_for_dataset(DATASET, abstract_docvec=DOCVEC3) as model:
+        version_ids, _ = model.find_similar_manuscripts_to_abstract(
+          ABSTRACT1
+        ).top_k(10, min_similarity=0.5)
+      assert list(version_ids) == [MANUSCRIPT_VERSION_ID3, MANUSCRIPT_VERSION_ID2]
+
+    def test_should_only_return_manuscripts_of_passed_in_version_ids(self):
+      with _similarity_model_for_dataset(DATASET, abstract_docvec=DOCVEC3) as model:
+        version_ids, _ = model.find_similar_manuscripts_to_abstract(
+          ABSTRACT1
+        ).top_k(1, version_ids={MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2, 'other'})
+      assert list(version_ids) == [MANUSCRIPT_VERSION_ID2]
+
+    def test_should_return_similarity_of_requested_included_version_ids_only(self):
+      with _similarity_model_for_dataset(DATASET) as model:
+        similarity_by_version_id = model.find_similar_manuscripts(
+          [MANUSCRIPT_VERSION_ID1]
+        ).get_similarity_by_version_id([
+          MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2, 'other'
+        ])
+      assert similarity_by_version_id.keys() == {MANUSCRIPT_VERSION_ID2}
+      assert isinstance(similarity_by_version_id[MANUSCRIPT_VERSION_ID2], float)
+
+  class TestSimilarityIndex:
+    def test_should_only_consider_manuscripts_of_probed_list(self):
+      with _similarity_model_for_dataset(
+        DATASET, abstract_docvec=DOCVEC3,
+        similarity_index=DATASET_SIMILARITY_INDEX, similarity_index_n_probe=1) as model:
+
+        version_ids, _ = model.find_similar_manuscripts_to_abstract(ABSTRACT1).top_k(10)
+      assert list(version_ids) == [MANUSCRIPT_VERSION_ID3]
+
+    def test_should_calculate_similarity_of_requested_manuscripts_outside_probed_lists(self):
+      with _similarity_model_for_dataset(
+        DATASET, abstract_docvec=DOCVEC3,
+        similarity_index=DATASET_SIMILARITY_INDEX, similarity_index_n_probe=1) as model:
+
+        similarity_by_version_id = model.find_similar_manuscripts_to_abstract(
+          ABSTRACT1
+        ).get_similarity_by_version_id([MANUSCRIPT_VERSION_ID2])
+      assert similarity_by_version_id[MANUSCRIPT_VERSION_ID2] == pytest.approx(
+        _cosine_similarity(DOCVEC2, DOCVEC3), abs=1e-6
+      )
+
+    def test_should_return_exact_result_when_probing_all_lists(self):
+      with _similarity_model_for_dataset(
+        DATASET, abstract_docvec=DOCVEC3,
+        similarity_index=DATASET_SIMILARITY_INDEX, similarity_index_n_probe=3) as model:
+
+        assert len(model.find_similar_manuscripts_to_abstract(ABSTRACT1).top_k(10)[0]) == 3
+
+    def test_should_consider_manuscripts_not_in_index(self):
+      similarity_index = SimilarityIndex.build(
+        [MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2],
+        combine_docvecs([DOCVEC1, DOCVEC2], [DOCVEC1, DOCVEC2]),
+        n_lists=2
+      )
+      with _similarity_model_for_dataset(
+        DATASET, abstract_docvec=DOCVEC1,
+        similarity_index=similarity_index, similarity_index_n_probe=1) as model:
+
+        version_ids, _ = model.find_similar_manuscripts_to_abstract(ABSTRACT1).top_k(10)
+      assert set(version_ids) == {MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID3}
+
+    def test_should_load_similarity_index_from_database(self):
+      dataset = {
+        **DATASET,
+        'ml_model_data': [{
+          'model_id': model_id,
+          'data': pickle.dumps(_DocvecPredictModel(DOCVEC3))
+        } for model_id in [ML_ModelData.LDA_MODEL_ID, ML_ModelData.DOC2VEC_MODEL_ID]] + [{
+          'model_id': ML_ModelData.SIMILARITY_INDEX_MODEL_ID,
+          'data': DATASET_SIMILARITY_INDEX.to_binary()
+        }]
+      }
+      with populated_in_memory_database(dataset) as db:
+        model = load_similarity_model_from_database(
+          db, manuscript_model=_create_manuscript_model(db), similarity_index_n_probe=1
+        )
+        version_ids, _ = model.find_similar_manuscripts_to_abstract(ABSTRACT1).top_k(10)
+      assert list(version_ids) == [MANUSCRIPT_VERSION_ID3]
+
+  class TestSimilarityAggregation:
+    # two versions of the same manuscript, a later version with a different abstract
+    FIRST_VERSION_ID_FIELDS = {**MANUSCRIPT_ID_FIELDS1, VERSION_ID: version_id(MANUSCRIPT_ID1, 1)}
+    LATEST_VERSION_ID_FIELDS = {**MANUSCRIPT_ID_FIELDS1, VERSION_ID: version_id(MANUSCRIPT_ID1, 2)}
+    VERSION_IDS = [FIRST_VERSION_ID_FIELDS[VERSION_ID], LATEST_VERSION_ID_FIELDS[VERSION_ID]]
+
+    DATASET = _manuscript_versions_with_docvecs(
+      [FIRST_VERSION_ID_FIELDS, LATEST_VERSION_ID_FIELDS, MANUSCRIPT_ID_FIELDS2],
+      [DOCVEC1, DOCVEC3, DOCVEC1]
+    )
+
+    @pytest.mark.parametrize('similarity_aggregation, expected_similarity', [
+      (SimilarityAggregations.MAX, 1.0),
+      (SimilarityAggregations.MEAN, 0.5),
+      (SimilarityAggregations.LATEST, 0.0)
+    ])
+    def test_should_aggregate_similarity_to_all_versions(
+      self, similarity_aggregation, expected_similarity):
+
+      with _similarity_model_for_dataset(
+        self.DATASET, similarity_aggregation=similarity_aggregation) as model:
+
+        similarity_by_version_id = _similarity_by_version_id(
+          model.find_similar_manuscripts(
+            list(reversed(self.VERSION_IDS)), exclude_version_ids=self.VERSION_IDS
+          )
+        )
+      assert similarity_by_version_id == {
+        MANUSCRIPT_VERSION_ID2: pytest.approx(expected_similarity, abs=1e-6)
+      }
+
+    def test_should_only_exclude_latest_version_by_default(self):
+      with _similarity_model_for_dataset(self.DATASET) as model:
+        similarity_by_version_id = _similarity_by_version_id(
+          model.find_similar_manuscripts(list(reversed(self.VERSION_IDS)))
+        )
+      assert similarity_by_version_id.keys() == {
+        self.FIRST_VERSION_ID_FIELDS[VERSION_ID], MANUSCRIPT_VERSION_ID2
+      }
+
+    def test_should_reject_unknown_similarity_aggregation(self):
+      with pytest.raises(ValueError):
+        with _similarity_model_for_dataset(self.DATASET, similarity_aggregation='other'):
+          pass
@@ -1,4 +1,4 @@
-import sqlalchemy
+import numpy as np
 
 NAME = 'ManuscriptModel'
 
@@ -17,35 +17,26 @@ class ManuscriptModel(object):
     self.valid_version_ids = self._get_version_ids_by_decisions_and_types(
       self.valid_decisions, self.valid_manuscript_types
     )
+    self.published_version_ids = self._get_version_ids_by_decisions_and_types(
+      self.published_decisions, self.published_manuscript_types
+    )
 
   def _get_version_ids_by_decisions_and_types(self, decisions, manuscript_types):
-    manuscript_version_table = self.db['manuscript_version']
+    manuscript_version_df = self.db['manuscript_version'].read_frame()
 
-    conditions = [
-      sqlalchemy.or_(
-        manuscript_version_table.table.decision == None,
-        manuscript_version_table.table.decision.in_(
-          decisions
-        )
-      ) if decisions else None,
-      sqlalchemy.or_(
-        manuscript_version_table.table.manuscript_type == None,
-        manuscript_version_table.table.manuscript_type.in_(
-          manuscript_types
-        )
-       ) if manuscript_types else None
-    ]
-    conditions = [c for c in conditions if c is not None]
+    matches = np.ones(len(manuscript_version_df), dtype=bool)
+    if decisions:
+      matches &= (
+        manuscript_version_df['decision'].isnull() |
+        manuscript_version_df['decision'].isin(decisions)
+      ).values
+    if manuscript_types:
+      matches &= (
+        manuscript_version_df['manuscript_type'].isnull() |
+        manuscript_version_df['manuscript_type'].isin(manuscript_types)
+      ).values
 
-    version_ids_query = self.db.session.query(
-      manuscript_version_table.table.version_id
-    )
-    if len(conditions) > 0:
-      version_ids_query = version_ids_query.filter(
-        sqlalchemy.and_(*conditions)
-      )
-
-    return set(x[0] for x in version_ids_query.all())
+    return set(manuscript_version_df.index[matches])
 
   def _manuscript_matched_decisions_and_types(self, manuscript, decisions, manuscript_types):
     return (
@@ -72,3 +63,6 @@ class ManuscriptModel(object):
 
   def get_valid_manuscript_version_ids(self):
     return self.valid_version_ids
+
+  def get_published_manuscript_version_ids(self):
+    return self.published_version_ids
@@ -1,9 +1,12 @@
 from itertools import groupby
 import itertools
-from collections import Counter
+import heapq
+from collections import Counter, namedtuple
+import json
 import ast
 import logging
 
+import numpy as np
 import pandas as pd
 
 from peerscout.utils.collection import (
@@ -14,6 +17,9 @@ from peerscout.utils.pandas import (
   groupby_agg_droplevel
 )
 
+from peerscout.utils.cache import LruCache
+from peerscout.utils.json_fragments import CachedJsonDict
+
 from .utils import unescape_and_strip_tags, filter_by
 
 from  peerscout.utils.collection import (
@@ -51,6 +57,10 @@ from .person_keywords import (
 
 from .person_roles import PersonRoleService
 
+from .reviewer_scoring import ReviewerScoringEngine
+
+from .columnar_records import ColumnarRecords, GroupedValues, to_python_value
+
 
 NAME = 'RecommendReviewers'
 
@@ -129,7 +139,12 @@ RAW_MANUSCRIPT_ID_COLUMNS = []
 TEMP_MANUSCRIPT_ID_COLUMNS = [VERSION_ID]
 MANUSCRIPT_ID_COLUMNS = RAW_MANUSCRIPT_ID_COLUMNS + TEMP_MANUSCRIPT_ID_COLUMNS
 
-SIMILARITY_COLUMN = 'similarity'
+# number of materialised persons and manuscripts to keep (with their serialised json)
+PERSON_CACHE_SIZE = 10000
+MANUSCRIPT_CACHE_SIZE = 2000
+
+# number of complete rankings to keep, for paging through potential reviewers
+RANKING_CACHE_SIZE = 100
 
 PERSON_ID = 'person_id'
 
@@ -139,38 +154,80 @@ PERSON_COLUMNS = [
   'is_early_career_researcher'
 ]
 
+# the person properties used by sorted_potential_reviewers (other than the stats)
+PERSON_RANKING_COLUMNS = [PERSON_ID, 'first_name', 'last_name', 'is_early_career_researcher']
+
+# tables read when creating the recommender (including the manuscript and similarity model),
+# e.g. to read them upfront
+TABLE_NAMES = [
+  'manuscript',
+  'manuscript_version',
+  'manuscript_author',
+  'manuscript_editor',
+  'manuscript_senior_editor',
+  'manuscript_reviewer',
+  'manuscript_potential_editor',
+  'manuscript_potential_reviewer',
+  'manuscript_keyword',
+  'manuscript_subject_area',
+  'manuscript_stage',
+  'person',
+  'person_keyword',
+  'person_membership',
+  'person_role',
+  'person_subject_area',
+  'person_dates_not_available',
+  'person_review_stats_overall',
+  'person_review_stats_last12m',
+  'ml_model_data'
+]
+
 def unescape_if_string(s):
   if isinstance(s, str):
     return unescape_and_strip_tags(s)
   return s
 
-def stats_by_person_for_period(table):
+def get_review_duration_details(v):
+  if v['reviewed_count'] == 0:
+    return
+  return {
+    'min': v['reviewed_duration_min'],
+    'max': v['reviewed_duration_max'],
+    'mean': v['reviewed_duration_avg'],
+    'count': v['reviewed_count']
+  }
+
+def read_person_review_stats_records(table):
   df = table.read_frame()
   debugv("person stats frame (%s):\n%s", table.table.__tablename__, df)
-  if len(df) == 0:
-    return {}
+  return ColumnarRecords(df.reset_index(), PERSON_ID)
 
-  def get_review_duration_details(v):
-    if v['reviewed_count'] == 0:
-      return
-    return {
-      'min': v['reviewed_duration_min'],
-      'max': v['reviewed_duration_max'],
-      'mean': v['reviewed_duration_avg'],
-      'count': v['reviewed_count']
-    }
+def get_person_review_stats(person_review_stats_records, person_id):
+  v = person_review_stats_records.get(person_id)
+  if v is None:
+    return None
+  return {
+    'review_duration': get_review_duration_details(v),
+    'reviews_in_progress': v['awaiting_review_count'],
+    'waiting_to_be_accepted': v['awaiting_accept_count'],
+    'declined': v['declined_count']
+  }
 
-  m = clean_result({
-    k: {
-      'review_duration': get_review_duration_details(v),
-      'reviews_in_progress': v['awaiting_review_count'],
-      'waiting_to_be_accepted': v['awaiting_accept_count'],
-      'declined': v['declined_count']
-    }
-    for k, v in df.to_dict(orient='index').items()
-  })
-  debugv("person stats map:\n%s", m)
-  return m
+def get_review_duration_means(person_review_stats_records, person_ids):
+  # the mean review duration by person (None if not reviewed), see get_review_duration_details
+  means = np.full(len(person_ids), None, dtype=object)
+  stats_indices = person_review_stats_records.indices_of(person_ids)
+  has_stats = stats_indices >= 0
+  if np.any(has_stats):
+    stats_indices = stats_indices[has_stats]
+    is_reviewed = person_review_stats_records.get_values('reviewed_count')[stats_indices] != 0
+    means[np.flatnonzero(has_stats)[is_reviewed]] = [
+      to_python_value(mean)
+      for mean in person_review_stats_records.get_values('reviewed_duration_avg')[
+        stats_indices[is_reviewed]
+      ]
+    ]
+  return means
 
 def select_dict_keys(d, keys):
   return {k: d[k] for k in keys}
@@ -190,11 +247,84 @@ HIDDEN_MANUSCRIPT_PROPS = set(['editors', 'reviewers'])
 def is_visible_manuscript_prop(key):
   return key not in HIDDEN_MANUSCRIPT_PROPS
 
-def clean_manuscript(m):
-  return filter_dict_keys(m, is_visible_manuscript_prop)
+class AbstractOptions:
+  NONE = 'none'
+  TRUNCATED = 'truncated'
+  FULL = 'full'
+
+ABSTRACT_OPTIONS = [AbstractOptions.NONE, AbstractOptions.TRUNCATED, AbstractOptions.FULL]
 
-def clean_manuscripts(manuscripts):
-  return [clean_manuscript(m) for m in manuscripts]
+TRUNCATED_ABSTRACT_LENGTH = 200
+
+POTENTIAL_REVIEWER_PROPS = ['person', 'author_of_manuscripts', 'scores']
+
+def truncate_text(text, max_length):
+  if not isinstance(text, str) or len(text) <= max_length:
+    return text
+  return text[:max_length].rstrip() + '...'
+
+class ResultFields:
+  """Selects the properties to include in the result.
+
+  fields: the properties of potential reviewers to include (all if not specified)
+  exclude: the properties of potential reviewers or manuscripts to exclude
+  abstracts: one of ABSTRACT_OPTIONS, whether to include manuscript abstracts
+  """
+
+  def __init__(self, fields=None, exclude=None, abstracts=None):
+    if abstracts is None:
+      abstracts = AbstractOptions.FULL
+    if abstracts not in ABSTRACT_OPTIONS:
+      raise ValueError('invalid abstracts option: %s (expected one of %s)' % (
+        abstracts, ABSTRACT_OPTIONS
+      ))
+    unknown_fields = set(fields or []) - set(POTENTIAL_REVIEWER_PROPS)
+    if unknown_fields:
+      raise ValueError('invalid fields: %s (expected any of %s)' % (
+        sorted(unknown_fields), POTENTIAL_REVIEWER_PROPS
+      ))
+    self.fields = set(fields) if fields else None
+    self.exclude = set(exclude or [])
+    self.abstracts = abstracts
+    if abstracts == AbstractOptions.NONE:
+      self.exclude.add('abstract')
+
+  def includes_potential_reviewer_prop(self, key):
+    return (self.fields is None or key in self.fields) and key not in self.exclude
+
+  def includes_manuscript_prop(self, key):
+    return key not in self.exclude
+
+DEFAULT_RESULT_FIELDS = ResultFields()
+
+def _select_manuscript_props(m, is_included_prop, result_fields):
+  m = filter_dict_keys(m, is_included_prop)
+  if result_fields.abstracts == AbstractOptions.TRUNCATED and 'abstract' in m:
+    m['abstract'] = truncate_text(m['abstract'], TRUNCATED_ABSTRACT_LENGTH)
+  if 'alternatives' in m:
+    m['alternatives'] = [
+      _select_manuscript_props(alternative, result_fields.includes_manuscript_prop, result_fields)
+      for alternative in m['alternatives']
+    ]
+  return m
+
+def clean_manuscript(m, result_fields=DEFAULT_RESULT_FIELDS):
+  if result_fields is DEFAULT_RESULT_FIELDS:
+    return filter_dict_keys(m, is_visible_manuscript_prop)
+  return _select_manuscript_props(
+    m,
+    lambda key: is_visible_manuscript_prop(key) and result_fields.includes_manuscript_prop(key),
+    result_fields
+  )
+
+def clean_manuscripts(manuscripts, result_fields=DEFAULT_RESULT_FIELDS):
+  return [clean_manuscript(m, result_fields) for m in manuscripts]
+
+def select_visible_manuscripts_props(visible_manuscripts, result_fields=DEFAULT_RESULT_FIELDS):
+  # by default the visible manuscripts are included as they are (retaining their cached json)
+  if result_fields is DEFAULT_RESULT_FIELDS:
+    return list(visible_manuscripts)
+  return clean_manuscripts(visible_manuscripts, result_fields)
 
 def calculate_combined_score(keyword, similarity):
   return min(1.0, keyword + (similarity or 0) * 0.5)
@@ -207,7 +337,7 @@ def score_by_manuscript(manuscript, keyword, similarity):
     'combined': calculate_combined_score(keyword, similarity)
   }
 
-def sorted_potential_reviewers(potential_reviewers):
+def sorted_potential_reviewers(potential_reviewers, limit=None):
   potential_reviewers = list(potential_reviewers)
   review_duration_mean_keys = ['person', 'stats', 'overall', 'review-duration', 'mean']
   available_potential_reviewer_mean_durations = filter_none(deep_get_list(
@@ -219,33 +349,45 @@ def sorted_potential_reviewers(potential_reviewers):
     else None
   )
 
-  potential_reviewers = sorted(
-    potential_reviewers,
-    key=lambda potential_reviewer: (
-      -(potential_reviewer['scores'].get('combined') or 0),
-      -(potential_reviewer['scores'].get('keyword') or 0),
-      -(potential_reviewer['scores'].get('similarity') or 0),
-      deep_get(potential_reviewer, review_duration_mean_keys, potential_reviewer_mean_duration),
-      potential_reviewer['person']['first_name'],
-      potential_reviewer['person']['last_name']
-    )
+  sort_key = lambda potential_reviewer: (
+    -(potential_reviewer['scores'].get('combined') or 0),
+    -(potential_reviewer['scores'].get('keyword') or 0),
+    -(potential_reviewer['scores'].get('similarity') or 0),
+    deep_get(potential_reviewer, review_duration_mean_keys, potential_reviewer_mean_duration),
+    potential_reviewer['person']['first_name'],
+    potential_reviewer['person']['last_name'],
+    # ensures a stable order (and offsets) when the ranking needs to be calculated again
+    potential_reviewer['person'][PERSON_ID]
   )
 
+  if limit is not None and limit > 0:
+    # we will never need more than limit items of either stream
+    # (nsmallest is equivalent to sorted(...)[:limit], including ties)
+    sorted_stream = lambda stream: heapq.nsmallest(limit, stream, key=sort_key)
+  else:
+    sorted_stream = lambda stream: sorted(stream, key=sort_key)
+
+  is_ecr = lambda pr: pr['person'].get('is_early_career_researcher')
+
   # create a list with interleaving normal reviewer, ecr, ...
   potential_reviewers = [x for x in itertools.chain.from_iterable(itertools.zip_longest(
-    (pr for pr in potential_reviewers if not pr['person'].get('is_early_career_researcher')),
-    (pr for pr in potential_reviewers if pr['person'].get('is_early_career_researcher'))
+    sorted_stream(pr for pr in potential_reviewers if not is_ecr(pr)),
+    sorted_stream(pr for pr in potential_reviewers if is_ecr(pr))
   )) if x]
+  if limit is not None and limit > 0:
+    potential_reviewers = potential_reviewers[:limit]
   return potential_reviewers
 
 def sorted_manuscript_scores_descending(manuscript_scores_list):
+  # a missing similarity is considered lower than any similarity (rather than failing)
   return list(reversed(sorted(manuscript_scores_list, key=lambda score: (
     score['combined'],
     score['keyword'],
-    score['similarity']
+    score['similarity'] if score['similarity'] is not None else float('-inf')
   ))))
 
 def get_reviewer_score(person_keyword_score, best_manuscript_score):
+  # reference implementation for a single person, see ReviewerScoringEngine
   keyword_score = max(
     person_keyword_score or 0,
     best_manuscript_score.get('keyword', 0)
@@ -258,6 +400,16 @@ def get_reviewer_score(person_keyword_score, best_manuscript_score):
     'combined': combined_score
   }
 
+# the ranked (but not yet populated) potential reviewers of a search,
+# potential_reviewer_count is the number of all potential reviewers (even if limited)
+RankedPotentialReviewers = namedtuple('RankedPotentialReviewers', [
+  'scored_potential_reviewers', 'version_ids_by_person_id', 'manuscript_score_by_id',
+  'potential_reviewer_count'
+])
+
+def get_ranking_cache_key(**kwargs):
+  return json.dumps(kwargs, sort_keys=True, default=sorted)
+
 def get_person_ids_for_manuscript_list(manuscript_list, person_list_key):
   return set(
     p[PERSON_ID] for p in iter_flatten(
@@ -279,6 +431,18 @@ class RecommendReviewers(object):
 
     self.manuscript_versions_all_df = db.manuscript_version.read_frame().reset_index()
 
+    logger.debug('building latest version by manuscript id map')
+    self.latest_version_id_by_manuscript_id_map = (
+      self.manuscript_versions_all_df[[MANUSCRIPT_ID, VERSION_ID]]
+      .dropna()
+      .groupby(MANUSCRIPT_ID)[VERSION_ID].max()
+      .to_dict()
+    )
+    self.version_ids_by_manuscript_id_map = groupby_column_to_dict(
+      self.manuscript_versions_all_df[[MANUSCRIPT_ID, VERSION_ID]].dropna(),
+      MANUSCRIPT_ID, VERSION_ID
+    )
+
     valid_version_ids = manuscript_model.get_valid_manuscript_version_ids()
 
     self.manuscript_versions_df = filter_by(
@@ -298,10 +462,9 @@ class RecommendReviewers(object):
     )
 
     logger.debug('loading ManuscriptPersonRelationshipService')
-    self.manuscript_person_relationship_service = ManuscriptPersonRelationshipService(db)
-
-    logger.debug('loading ManuscriptPersonStageService')
-    self.manuscript_person_stage_service = ManuscriptPersonStageService(db)
+    self.manuscript_person_relationship_service = (
+      ManuscriptPersonRelationshipService.from_database(db)
+    )
 
     logger.debug('loading PersonKeywordService')
     self.person_keyword_service = PersonKeywordService.from_database(db)
@@ -324,6 +487,11 @@ class RecommendReviewers(object):
       db.manuscript_stage.read_frame().reset_index()
     )
 
+    logger.debug('loading ManuscriptPersonStageService')
+    self.manuscript_person_stage_service = ManuscriptPersonStageService(
+      self.manuscript_history_all_df
+    )
+
     self.manuscript_history_df = filter_by(
       self.manuscript_history_all_df,
       VERSION_ID,
@@ -350,57 +518,86 @@ class RecommendReviewers(object):
 
     self.assigned_reviewers_df = db.manuscript_potential_reviewer.read_frame().reset_index()
 
-    temp_memberships_map = groupby_column_to_dict(memberships_df, PERSON_ID)
+    memberships_map = groupby_column_to_dict(memberships_df, PERSON_ID)
     dates_not_available_map = groupby_column_to_dict(dates_not_available_df, PERSON_ID)
-    # early_career_researchers_person_ids = set(early_career_researchers_df[PERSON_ID].values)
 
     logger.debug("gathering stats")
-    overall_stats_map = stats_by_person_for_period(db.person_review_stats_overall)
-    last12m_stats_map = stats_by_person_for_period(db.person_review_stats_last12m)
-
-    logger.debug("building person map")
-    self.persons_map = {
-      person[PERSON_ID]: {
-        **person,
-        'memberships': temp_memberships_map.get(person[PERSON_ID], []),
-        'dates_not_available': dates_not_available_map.get(person[PERSON_ID], []),
-        'stats': {
-          'overall': overall_stats_map.get(person[PERSON_ID], None),
-          'last_12m': last12m_stats_map.get(person[PERSON_ID], None)
-        }
-      } for person in clean_result(self.persons_df[PERSON_COLUMNS].to_dict(orient='records'))
-    }
-
-    debugv("self.persons_df: %s", self.persons_df)
-    debugv("persons_map: %s", self.persons_map)
-
-    logger.debug("building temp author etc. maps")
-    temp_authors_map = groupby_column_to_dict(
-      self.authors_all_df,
-      VERSION_ID,
-      lambda author: {
-        **self.persons_map.get(author[PERSON_ID], None),
-        'is_corresponding_author': author['is_corresponding_author']
-      },
-      sort_by=[VERSION_ID, 'seq']
+    self._overall_review_stats_records = read_person_review_stats_records(
+      db.person_review_stats_overall
+    )
+    self._last12m_review_stats_records = read_person_review_stats_records(
+      db.person_review_stats_last12m
     )
 
-    temp_editors_map = groupby_columns_to_dict(
-      self.editors_all_df[VERSION_ID].values,
-      self.editors_all_df[PERSON_ID].values,
-      lambda person_id: self.persons_map.get(person_id, None)
+    # persons and manuscripts are stored column-wise, referring to persons by index,
+    # and only materialised as dicts when needed for the response
+    logger.debug("building person records")
+    self.person_records = ColumnarRecords(self.persons_df[PERSON_COLUMNS], PERSON_ID)
+    self._memberships_by_person_id = memberships_map
+    self._dates_not_available_by_person_id = dates_not_available_map
+    self._person_cache = LruCache(max_size=PERSON_CACHE_SIZE, get_size=lambda _: 1)
+    self._manuscript_cache = LruCache(max_size=MANUSCRIPT_CACHE_SIZE, get_size=lambda _: 1)
+    self._visible_manuscript_cache = LruCache(
+      max_size=MANUSCRIPT_CACHE_SIZE, get_size=lambda _: 1
+    )
+    self._published_manuscripts_of_author_cache = LruCache(
+      max_size=PERSON_CACHE_SIZE, get_size=lambda _: 1
     )
+    self._ranking_cache = LruCache(max_size=RANKING_CACHE_SIZE, get_size=lambda _: 1)
 
-    temp_senior_editors_map = groupby_columns_to_dict(
-      self.senior_editors_all_df[VERSION_ID].values,
-      self.senior_editors_all_df[PERSON_ID].values,
-      lambda person_id: self.persons_map.get(person_id, None)
+    # potential reviewers are ranked without materialising the persons
+    self._person_ranking_values = {
+      column: self.person_records.get_values(column) for column in PERSON_RANKING_COLUMNS
+    }
+    self._person_review_duration_means = get_review_duration_means(
+      self._overall_review_stats_records, self.person_records.keys
     )
 
-    temp_reviewers_map = groupby_columns_to_dict(
-      self.manuscript_history_review_received_df[VERSION_ID].values,
-      self.manuscript_history_review_received_df[PERSON_ID].values,
-      lambda person_id: self.persons_map.get(person_id, None)
+    logger.debug("building manuscript records")
+    self.manuscript_records = ColumnarRecords(
+      self.manuscript_versions_all_df[
+        MANUSCRIPT_ID_COLUMNS +
+        [MANUSCRIPT_ID] +
+        ['title', 'decision', 'manuscript_type', 'abstract', 'decision_timestamp']
+      ],
+      VERSION_ID
+    )
+    all_version_ids = pd.Series(self.manuscript_versions_all_df[VERSION_ID].values)
+    manuscript_count = len(all_version_ids)
+
+    doi_by_manuscript_id = dict(zip(
+      manuscripts_df[MANUSCRIPT_ID].values, manuscripts_df['doi'].values
+    ))
+    self._manuscript_dois = np.empty(manuscript_count, dtype=object)
+    self._manuscript_dois[:] = [
+      to_python_value(doi_by_manuscript_id.get(manuscript_id))
+      for manuscript_id in self.manuscript_versions_all_df[MANUSCRIPT_ID].values
+    ]
+    self._is_published_manuscript = all_version_ids.isin(
+      manuscript_model.get_published_manuscript_version_ids()
+    ).values
+    is_valid_manuscript = all_version_ids.isin(valid_version_ids).values
+
+    logger.debug("building persons by manuscript")
+    sorted_authors_df = self.authors_all_df.sort_values([VERSION_ID, 'seq'])
+    author_manuscript_indices = self.manuscript_records.indices_of(
+      sorted_authors_df[VERSION_ID].values
+    )
+    author_person_indices = self.person_records.indices_of(sorted_authors_df[PERSON_ID].values)
+    author_manuscript_indices[author_person_indices < 0] = -1
+    self._authors_by_manuscript = GroupedValues(
+      author_manuscript_indices, manuscript_count,
+      person_index=author_person_indices,
+      is_corresponding_author=sorted_authors_df['is_corresponding_author'].values
+    )
+    self._editors_by_manuscript = self._group_person_indices_by_manuscript(
+      self.editors_all_df
+    )
+    self._senior_editors_by_manuscript = self._group_person_indices_by_manuscript(
+      self.senior_editors_all_df
+    )
+    self._reviewers_by_manuscript = self._group_person_indices_by_manuscript(
+      self.manuscript_history_review_received_df
     )
 
     logger.debug("building person roles")
@@ -417,18 +614,6 @@ class RecommendReviewers(object):
       }
     )
 
-    debugv(
-      "self.manuscript_history_review_received_df: %s", self.manuscript_history_review_received_df
-    )
-    debugv("temp_authors_map: %s", temp_authors_map)
-    debugv("temp_reviewers_map: %s", temp_reviewers_map)
-
-    logger.debug("building doi by manuscript map")
-    temp_doi_by_manuscript_no_map = groupby_column_to_dict(
-      manuscripts_df,
-      MANUSCRIPT_ID,
-      'doi')
-
     logger.debug("getting all subject areas")
     self.all_subject_areas = sorted(self.manuscript_subject_area_service.get_all_subject_areas())
 
@@ -438,102 +623,178 @@ class RecommendReviewers(object):
       self.person_keyword_service.get_all_keywords()
     )
 
-    logger.debug("building manuscript list")
-    manuscripts_all_list = clean_result(
-      self.manuscript_versions_all_df[
-        MANUSCRIPT_ID_COLUMNS +
-        [MANUSCRIPT_ID] +
-        ['title', 'decision', 'manuscript_type', 'abstract', 'decision_timestamp']
-      ].rename(columns={'decision-date': 'published-date'})
-      .to_dict(orient='records')
-    )
-    manuscripts_all_list = [
-      {
-        **manuscript,
-        'doi': get_first(temp_doi_by_manuscript_no_map.get(manuscript[MANUSCRIPT_ID], [])),
-        'authors': temp_authors_map.get(manuscript[VERSION_ID], []),
-        'editors': temp_editors_map.get(manuscript[VERSION_ID], []),
-        'senior_editors': temp_senior_editors_map.get(manuscript[VERSION_ID], []),
-        'reviewers': temp_reviewers_map.get(manuscript[VERSION_ID], []),
-        'subject_areas': (
-          self.manuscript_subject_area_service.get_subject_areas_by_id(
-            manuscript[VERSION_ID]
-          )
-        ),
-        'is_published': manuscript_model.is_manuscript_published(manuscript)
-      } for manuscript in manuscripts_all_list
-    ]
-    self.manuscripts_by_version_id_map = {
-      m[VERSION_ID]: m for m in manuscripts_all_list
-    }
-    debugv("manuscripts_by_version_id_map: %s", self.manuscripts_by_version_id_map)
-
-    self.manuscripts_by_author_map = {}
-    self.manuscripts_by_reviewer_map = {}
-    for m in manuscripts_all_list:
-      if manuscript_model.is_manuscript_valid(m):
-        debugv("manuscript: %s", m)
-        # only consider published manuscripts for authors
-        if m['is_published']:
-          for author in m['authors']:
-            self.manuscripts_by_author_map.setdefault(author[PERSON_ID], [])\
-            .append(m)
-        # also consider not published manuscripts (but valid ones) for reviewers
-        for reviewer in m['reviewers']:
-          self.manuscripts_by_reviewer_map.setdefault(reviewer[PERSON_ID], [])\
-          .append(m)
-      else:
-        debugv("ignoring manuscript: %s", m)
+    logger.debug("building reviewer scoring engine")
+    self.reviewer_scoring_engine = ReviewerScoringEngine(all_version_ids.values)
 
-    remove_duplicate_titles_and_sort_by_date = lambda manuscripts: (
-      sort_manuscripts_by_date(duplicate_manuscript_titles_as_alternatives(manuscripts))
+    logger.debug("building published manuscripts by author")
+    # only consider valid published manuscripts for authors, ordered like the manuscripts
+    is_published_author_manuscript = (author_manuscript_indices >= 0) & (
+      is_valid_manuscript & self._is_published_manuscript
+    )[author_manuscript_indices]
+    published_author_manuscript_indices = author_manuscript_indices[
+      is_published_author_manuscript
+    ]
+    published_author_person_indices = author_person_indices[is_published_author_manuscript]
+    manuscript_order = np.argsort(published_author_manuscript_indices, kind='mergesort')
+    self._published_manuscripts_by_author = GroupedValues(
+      published_author_person_indices[manuscript_order], len(self.person_records),
+      manuscript_index=published_author_manuscript_indices[manuscript_order]
     )
 
-    self.manuscripts_by_author_map = applymap_dict(
-      self.manuscripts_by_author_map, remove_duplicate_titles_and_sort_by_date
-    )
+    self.all_early_career_researcher_person_ids = set(self.persons_df[
+      self.persons_df['is_early_career_researcher'].astype(bool)
+    ][PERSON_ID].values)
 
-    self.manuscripts_by_reviewer_map = applymap_dict(
-      self.manuscripts_by_reviewer_map, remove_duplicate_titles_and_sort_by_date
+    person_subject_areas_df = db.person_subject_area.read_frame()
+    early_career_researcher_subject_areas_df = person_subject_areas_df[
+      person_subject_areas_df[PERSON_ID].isin(self.all_early_career_researcher_person_ids)
+    ]
+    self.early_career_researcher_ids_by_subject_area = groupby_columns_to_dict(
+      [
+        subject_area.lower()
+        for subject_area in early_career_researcher_subject_areas_df['subject_area'].values
+      ],
+      early_career_researcher_subject_areas_df[PERSON_ID].values
+    )
+    debugv(
+      "early career researcher subject area keys: %s",
+      self.early_career_researcher_ids_by_subject_area.keys()
     )
 
-    debugv("manuscripts_by_author_map: %s", self.manuscripts_by_author_map)
-    debugv("manuscripts_by_reviewer_map: %s", self.manuscripts_by_reviewer_map)
-
-    early_career_researcher_person_id_query = db.session.query(
-      db.person.table.person_id
-    ).filter(
-      db.person.table.is_early_career_researcher == True # pylint: disable=C0121
+  def _group_person_indices_by_manuscript(self, df):
+    return GroupedValues(
+      self.manuscript_records.indices_of(df[VERSION_ID].values), len(self.manuscript_records),
+      person_index=self.person_records.indices_of(df[PERSON_ID].values)
     )
 
-    self.all_early_career_researcher_person_ids = {
-      row[0] for row in early_career_researcher_person_id_query.distinct()
-    }
+  def _get_person_by_index(self, person_index):
+    # the returned dicts are shared and must not be modified
+    person = self._person_cache.get(person_index)
+    if person is None:
+      person = self._create_person_by_index(person_index)
+      self._person_cache.put(person_index, person)
+    return person
+
+  def _create_person_by_index(self, person_index):
+    person = clean_result(self.person_records.get_by_index(person_index))
+    person_id = person[PERSON_ID]
+    return CachedJsonDict({
+      **person,
+      'memberships': self._memberships_by_person_id.get(person_id, []),
+      'dates_not_available': self._dates_not_available_by_person_id.get(person_id, []),
+      'stats': {
+        'overall': get_person_review_stats(self._overall_review_stats_records, person_id),
+        'last_12m': get_person_review_stats(self._last12m_review_stats_records, person_id)
+      }
+    })
+
+  def _get_ranking_person_by_index(self, person_index):
+    # the subset of the person (see _create_person_by_index) used to sort potential reviewers
+    person = remove_none({
+      column: to_python_value(values[person_index])
+      for column, values in self._person_ranking_values.items()
+    })
+    review_duration_mean = self._person_review_duration_means[person_index]
+    if review_duration_mean is not None:
+      person['stats'] = {'overall': {'review_duration': {'mean': review_duration_mean}}}
+    return person
+
+  def _get_person(self, person_id):
+    person_index = self.person_records.index_of(person_id)
+    return self._get_person_by_index(person_index) if person_index >= 0 else None
+
+  def _get_persons_by_indices(self, person_indices):
+    return [
+      self._get_person_by_index(person_index) if person_index >= 0 else None
+      for person_index in person_indices
+    ]
 
-    self.early_career_researcher_ids_by_subject_area = groupby_to_dict(
-      db.session.query(
-        db.person_subject_area.table.subject_area,
-        db.person_subject_area.table.person_id
-      ).filter(
-        db.person_subject_area.table.person_id.in_(
-          early_career_researcher_person_id_query
+  def _get_manuscript_by_index(self, manuscript_index):
+    # the returned dicts are shared and must not be modified
+    manuscript = self._manuscript_cache.get(manuscript_index)
+    if manuscript is None:
+      manuscript = self._create_manuscript_by_index(manuscript_index)
+      self._manuscript_cache.put(manuscript_index, manuscript)
+    return manuscript
+
+  def _create_manuscript_by_index(self, manuscript_index):
+    manuscript = clean_result(self.manuscript_records.get_by_index(manuscript_index))
+    authors = self._authors_by_manuscript
+    return CachedJsonDict({
+      **manuscript,
+      'doi': self._manuscript_dois[manuscript_index],
+      'authors': [
+        CachedJsonDict({
+          **self._get_person_by_index(person_index),
+          'is_corresponding_author': to_python_value(is_corresponding_author)
+        })
+        for person_index, is_corresponding_author in zip(
+          authors.get(manuscript_index, 'person_index'),
+          authors.get(manuscript_index, 'is_corresponding_author')
         )
-      ).all(),
-      lambda row: row[0].lower(),
-      lambda row: row[1]
-    )
-    debugv(
-      "early career researcher subject area keys: %s",
-      self.early_career_researcher_ids_by_subject_area.keys()
+      ],
+      'editors': self._get_persons_by_indices(
+        self._editors_by_manuscript.get(manuscript_index, 'person_index')
+      ),
+      'senior_editors': self._get_persons_by_indices(
+        self._senior_editors_by_manuscript.get(manuscript_index, 'person_index')
+      ),
+      'reviewers': self._get_persons_by_indices(
+        self._reviewers_by_manuscript.get(manuscript_index, 'person_index')
+      ),
+      'subject_areas': (
+        self.manuscript_subject_area_service.get_subject_areas_by_id(manuscript[VERSION_ID])
+      ),
+      'is_published': bool(self._is_published_manuscript[manuscript_index])
+    })
+
+  def _get_manuscript(self, version_id):
+    manuscript_index = self.manuscript_records.index_of(version_id)
+    return self._get_manuscript_by_index(manuscript_index) if manuscript_index >= 0 else None
+
+  def _get_visible_manuscript_by_index(self, manuscript_index):
+    # the manuscript without hidden props, as included in the result (shared, like above)
+    manuscript = self._visible_manuscript_cache.get(manuscript_index)
+    if manuscript is None:
+      manuscript = CachedJsonDict(
+        clean_manuscript(self._get_manuscript_by_index(manuscript_index))
+      )
+      self._visible_manuscript_cache.put(manuscript_index, manuscript)
+    return manuscript
+
+  def _get_visible_manuscript(self, version_id):
+    manuscript_index = self.manuscript_records.index_of(version_id)
+    return (
+      self._get_visible_manuscript_by_index(manuscript_index) if manuscript_index >= 0
+      else None
     )
 
-  def __find_manuscripts_by_key(self, manuscript_no):
-    return self.manuscript_versions_all_df[
-      self.manuscript_versions_all_df[MANUSCRIPT_ID] == manuscript_no
-    ].sort_values(VERSION_ID).groupby(MANUSCRIPT_ID).last()
+  def _get_published_manuscripts_of_author(self, person_id):
+    # the returned list and manuscripts are shared and must not be modified
+    person_index = self.person_records.index_of(person_id)
+    if person_index < 0:
+      return []
+    manuscripts = self._published_manuscripts_of_author_cache.get(person_index)
+    if manuscripts is None:
+      manuscripts = sort_manuscripts_by_date([
+        # manuscripts with alternatives are new dicts (the alternatives are cached)
+        m if isinstance(m, CachedJsonDict) else CachedJsonDict(m)
+        for m in duplicate_manuscript_titles_as_alternatives([
+          self._get_visible_manuscript_by_index(manuscript_index)
+          for manuscript_index in self._published_manuscripts_by_author.get(
+            person_index, 'manuscript_index'
+          )
+        ])
+      ])
+      self._published_manuscripts_of_author_cache.put(person_index, manuscripts)
+    return manuscripts
 
-  def _empty_manuscripts(self):
-    return self.__find_manuscripts_by_key(None)
+  def __find_manuscript_version_ids_by_key(self, manuscript_no):
+    latest_version_id = self.latest_version_id_by_manuscript_id_map.get(manuscript_no)
+    return [latest_version_id] if latest_version_id is not None else []
+
+  def __find_all_manuscript_version_ids_by_key(self, manuscript_no):
+    return self.version_ids_by_manuscript_id_map.get(manuscript_no, [])
 
   def __parse_keywords(self, keywords):
     keywords = (keywords or '').strip()
@@ -541,13 +802,6 @@ class RecommendReviewers(object):
       return []
     return [keyword.strip() for keyword in keywords.split(',')]
 
-  def _filter_manuscripts_by_subject_areas(self, manuscripts_df, subject_areas):
-    return manuscripts_df[
-      manuscripts_df[VERSION_ID].isin(
-        self.manuscript_subject_area_service.get_ids_by_subject_areas(subject_areas)
-      )
-    ]
-
   def _get_early_career_reviewer_ids_by_subject_areas(self, subject_areas):
     if len(subject_areas) == 0:
       result = self.all_early_career_researcher_person_ids
@@ -564,6 +818,15 @@ class RecommendReviewers(object):
   def get_all_subject_areas(self):
     return self.all_subject_areas
 
+  def get_recently_active_manuscript_ids(self, limit):
+    latest_stage_timestamp_by_manuscript_id = (
+      self.manuscript_history_all_df[[VERSION_ID, 'stage_timestamp']]
+      .merge(self.manuscript_versions_all_df[[VERSION_ID, MANUSCRIPT_ID]], on=VERSION_ID)
+      .groupby(MANUSCRIPT_ID)['stage_timestamp'].max()
+      .sort_values(ascending=False)
+    )
+    return list(latest_stage_timestamp_by_manuscript_id.index[:limit])
+
   def get_all_keywords(self):
     return self.all_keywords
 
@@ -575,8 +838,20 @@ class RecommendReviewers(object):
 
   def recommend(
     self, manuscript_no=None, subject_area=None, keywords=None, abstract=None,
+    fields=None, exclude=None, abstracts=None, offset=None,
     **kwargs):
 
+    if offset is not None:
+      kwargs['offset'] = offset
+    if offset:
+      # following pages: the complete ranking is cached and only the requested page populated
+      kwargs['ranking_key'] = get_ranking_cache_key(
+        manuscript_no=manuscript_no, subject_area=subject_area, keywords=keywords,
+        abstract=abstract,
+        **{k: v for k, v in kwargs.items() if k not in {'limit', 'offset'}}
+      )
+    if fields or exclude or abstracts:
+      kwargs['result_fields'] = ResultFields(fields=fields, exclude=exclude, abstracts=abstracts)
     if manuscript_no:
       return self._recommend_using_manuscript_no(
         manuscript_no=manuscript_no,
@@ -595,19 +870,19 @@ class RecommendReviewers(object):
       'potential_reviewers': []
     }
 
-  def _recommend_using_manuscript_no(self, manuscript_no=None, **kwargs):
-    matching_manuscripts = self.__find_manuscripts_by_key(manuscript_no)
-    if len(matching_manuscripts) == 0:
+  def _recommend_using_manuscript_no(
+    self, manuscript_no=None, result_fields=DEFAULT_RESULT_FIELDS, **kwargs):
+
+    matching_version_ids = self.__find_manuscript_version_ids_by_key(manuscript_no)
+    if len(matching_version_ids) == 0:
       return self._no_manuscripts_found_response(manuscript_no)
     else:
-      matching_version_ids = matching_manuscripts[VERSION_ID]
       keyword_list = sorted(self.manuscript_keyword_service.get_keywords_by_ids(
         matching_version_ids
       ))
-      matching_manuscripts_dicts = map_to_dict(
-        matching_version_ids,
-        self.manuscripts_by_version_id_map
-      )
+      matching_manuscripts_dicts = [
+        self._get_manuscript(version_id) for version_id in matching_version_ids
+      ]
       manuscript_subject_areas = set(iter_flatten(
         self.manuscript_subject_area_service.get_subject_areas_by_id(version_id)
         for version_id in matching_version_ids
@@ -623,7 +898,7 @@ class RecommendReviewers(object):
       assigned_reviewers_by_person_id = groupby_to_dict(
         iter_flatten(
           self.assigned_reviewers_by_manuscript_id_map.get(manuscript_id, [])
-          for manuscript_id in matching_manuscripts[VERSION_ID].values
+          for manuscript_id in matching_version_ids
         ),
         lambda item: item[PERSON_ID],
         lambda item: filter_dict_keys(item, lambda key: key != PERSON_ID)
@@ -642,13 +917,16 @@ class RecommendReviewers(object):
           include_person_ids=assigned_reviewers_by_person_id.keys(),
           exclude_person_ids=exclude_person_ids,
           ecr_subject_areas=ecr_subject_areas,
-          manuscript_version_ids=matching_manuscripts[VERSION_ID].values,
+          # the similarity model considers all of the versions (of the manuscript),
+          # only excluding the latest version from the similar manuscripts
+          manuscript_version_ids=self.__find_all_manuscript_version_ids_by_key(manuscript_no),
+          result_fields=result_fields,
           **kwargs
         ),
-        'matching_manuscripts': clean_manuscripts(map_to_dict(
-          matching_manuscripts[VERSION_ID],
-          self.manuscripts_by_version_id_map
-        ))
+        'matching_manuscripts': select_visible_manuscripts_props(
+          [self._get_visible_manuscript(version_id) for version_id in matching_version_ids],
+          result_fields
+        )
       }
 
   def _recommend_using_user_search_criteria(
@@ -672,66 +950,92 @@ class RecommendReviewers(object):
       })
     }
 
-  def _populate_potential_reviewer(
-    self, person_id,
-    version_ids,
-    keyword_score_by_person_id,
-    manuscript_score_by_id):
-
-    scores_by_manuscript = sorted_manuscript_scores_descending(
-      score for score in (
-        manuscript_score_by_id.get(version_id)
-        for version_id in version_ids
-      ) if score
-    )
-
-    best_score = get_first(scores_by_manuscript, {})
-    reviewer_score = get_reviewer_score(
-      person_keyword_score=keyword_score_by_person_id.get(person_id),
-      best_manuscript_score=best_score
-    )
-
-    author_of_manuscripts = self.manuscripts_by_author_map.get(person_id, [])
-    author_of_manuscript_ids = set(m[VERSION_ID] for m in author_of_manuscripts)
-
-    potential_reviewer = {
-      'person': self.persons_map.get(person_id, None),
-      'author_of_manuscripts': clean_manuscripts(author_of_manuscripts),
-      'scores': {
-        **reviewer_score,
-        'by_manuscript': [
-          m
-          for m in scores_by_manuscript
-          if m[VERSION_ID] in author_of_manuscript_ids
-        ]
-      }
-    }
-    if potential_reviewer.get('person') is None:
-      self.logger.warning('person id not found: %s', person_id)
-      debugv('valid persons: %s', self.persons_map.keys())
-    return potential_reviewer
-
-  def _populate_potential_reviewers(
+  def _score_potential_reviewers(
     self, person_ids, person_ids_by_version_id,
     keyword_score_by_person_id,
     keyword_score_by_version_id, similarity_by_manuscript_version_id):
 
-    manuscript_score_by_id = self._combine_manuscript_scores_by_id(
+    # only what is required for ranking, see _populate_potential_reviewer
+    person_ids = list(person_ids)
+    person_indices = self.person_records.indices_of(person_ids)
+    reviewer_scores = self.reviewer_scoring_engine.score_reviewers(
+      person_ids,
+      person_ids_by_version_id=person_ids_by_version_id,
+      keyword_score_by_person_id=keyword_score_by_person_id,
       keyword_score_by_version_id=keyword_score_by_version_id,
-      similarity_by_manuscript_version_id=similarity_by_manuscript_version_id
+      similarity_by_version_id=similarity_by_manuscript_version_id
     )
+    scored_potential_reviewers = []
+    for person_id, person_index, reviewer_score in zip(
+      person_ids, person_indices, reviewer_scores):
+
+      if person_index < 0:
+        self.logger.warning('person id not found: %s', person_id)
+        debugv('valid persons: %s', self.person_records.keys)
+      scored_potential_reviewers.append({
+        PERSON_ID: person_id,
+        'person_index': person_index,
+        'person': (
+          self._get_ranking_person_by_index(person_index) if person_index >= 0 else None
+        ),
+        'scores': reviewer_score
+      })
+    return scored_potential_reviewers
 
-    version_ids_by_person_id = invert_set_dict(person_ids_by_version_id)
+  def _populate_potential_reviewer(
+    self, scored_potential_reviewer,
+    version_ids,
+    manuscript_score_by_id,
+    result_fields=DEFAULT_RESULT_FIELDS):
+
+    # excluded properties are not populated at all
+    potential_reviewer = {}
+    if result_fields.includes_potential_reviewer_prop('person'):
+      person_index = scored_potential_reviewer['person_index']
+      potential_reviewer['person'] = (
+        self._get_person_by_index(person_index) if person_index >= 0 else None
+      )
+    include_author_of_manuscripts = result_fields.includes_potential_reviewer_prop(
+      'author_of_manuscripts'
+    )
+    include_scores = result_fields.includes_potential_reviewer_prop('scores')
+    if not include_author_of_manuscripts and not include_scores:
+      return potential_reviewer
 
-    return (
+    person_id = scored_potential_reviewer[PERSON_ID]
+    author_of_manuscripts = self._get_published_manuscripts_of_author(person_id)
+
+    if include_author_of_manuscripts:
+      potential_reviewer['author_of_manuscripts'] = select_visible_manuscripts_props(
+        author_of_manuscripts, result_fields
+      )
+    if include_scores:
+      author_of_manuscript_ids = set(m[VERSION_ID] for m in author_of_manuscripts)
+      potential_reviewer['scores'] = {
+        **scored_potential_reviewer['scores'],
+        'by_manuscript': sorted_manuscript_scores_descending(
+          score for score in (
+            manuscript_score_by_id.get(version_id)
+            for version_id in version_ids
+            if version_id in author_of_manuscript_ids
+          ) if score
+        )
+      }
+    return potential_reviewer
+
+  def _populate_potential_reviewers(
+    self, scored_potential_reviewers, version_ids_by_person_id,
+    manuscript_score_by_id, result_fields=DEFAULT_RESULT_FIELDS):
+
+    return [
       self._populate_potential_reviewer(
-        person_id,
-        version_ids=version_ids_by_person_id.get(person_id, set()),
-        keyword_score_by_person_id=keyword_score_by_person_id,
-        manuscript_score_by_id=manuscript_score_by_id
+        scored_potential_reviewer,
+        version_ids=version_ids_by_person_id.get(scored_potential_reviewer[PERSON_ID], set()),
+        manuscript_score_by_id=manuscript_score_by_id,
+        result_fields=result_fields
       )
-      for person_id in person_ids
-    )
+      for scored_potential_reviewer in scored_potential_reviewers
+    ]
 
   def _find_manuscript_ids_by_subject_areas_and_keywords_with_keyword_scores(
     self, subject_areas, keyword_list):
@@ -758,39 +1062,29 @@ class RecommendReviewers(object):
     similarity_threshold=0.5, max_similarity_count=50):
 
     if abstract is not None and len(abstract.strip()) > 0:
-      all_similar_manuscripts = self.similarity_model.find_similar_manuscripts_to_abstract(
+      manuscript_similarity = self.similarity_model.find_similar_manuscripts_to_abstract(
         abstract
       )
     else:
-      all_similar_manuscripts = self.similarity_model.find_similar_manuscripts(
+      manuscript_similarity = self.similarity_model.find_similar_manuscripts(
         manuscript_version_ids or set()
       )
-    self.logger.debug("all_similar_manuscripts: %d", len(all_similar_manuscripts))
-    similar_manuscripts = all_similar_manuscripts
-    if subject_areas:
-      similar_manuscripts = self._filter_manuscripts_by_subject_areas(
-        similar_manuscripts, subject_areas
+    self.logger.debug("all_similar_manuscripts: %d", len(manuscript_similarity))
+    most_similar_manuscript_ids, _ = manuscript_similarity.top_k(
+      max_similarity_count,
+      min_similarity=similarity_threshold,
+      version_ids=(
+        self.manuscript_subject_area_service.get_ids_by_subject_areas(subject_areas)
+        if subject_areas
+        else None
       )
-    most_similar_manuscripts = similar_manuscripts[
-      similar_manuscripts[SIMILARITY_COLUMN] >= similarity_threshold
-    ]
+    )
     self.logger.debug(
-      "found %d/%d similar manuscripts beyond threshold %f",
-      len(most_similar_manuscripts),
-      len(similar_manuscripts),
+      "found %d most similar manuscripts beyond threshold %f",
+      len(most_similar_manuscript_ids),
       similarity_threshold
     )
-    if len(most_similar_manuscripts) > max_similarity_count:
-      most_similar_manuscripts = most_similar_manuscripts\
-      .sort_values(SIMILARITY_COLUMN, ascending=False)[:max_similarity_count]
-
-    # Here we are including all manuscripts we calculated the similarity for in case they
-    # are included due to their better keyword match
-    similarity_by_manuscript_version_id = (
-      all_similar_manuscripts.set_index(VERSION_ID)[SIMILARITY_COLUMN].to_dict()
-    )
-
-    return most_similar_manuscripts[VERSION_ID].values, similarity_by_manuscript_version_id
+    return most_similar_manuscript_ids, manuscript_similarity
 
   def _find_matching_manuscript_ids_with_scores(
     self, subject_areas=None, keyword_list=None, abstract=None,
@@ -802,7 +1096,7 @@ class RecommendReviewers(object):
       )
     )
 
-    most_similar_manuscript_ids, similarity_by_manuscript_version_id = (
+    most_similar_manuscript_ids, manuscript_similarity = (
       self._find_most_similar_manuscript_ids_with_scores(
         subject_areas=subject_areas,
         abstract=abstract,
@@ -812,6 +1106,13 @@ class RecommendReviewers(object):
 
     matching_manuscript_ids = set(keyword_matching_manuscript_ids) | set(most_similar_manuscript_ids)
 
+    # Here we are including the similarity of all matching manuscripts in case they
+    # are included due to their better keyword match (the similarity of other manuscripts
+    # isn't used)
+    similarity_by_manuscript_version_id = manuscript_similarity.get_similarity_by_version_id(
+      matching_manuscript_ids
+    )
+
     return (
       matching_manuscript_ids,
       keyword_score_by_version_id,
@@ -819,7 +1120,7 @@ class RecommendReviewers(object):
     )
 
   def _combine_manuscript_scores_by_id(
-    self, keyword_score_by_version_id, similarity_by_manuscript_version_id):
+    self, version_ids, keyword_score_by_version_id, similarity_by_manuscript_version_id):
 
     return {
       version_id: score_by_manuscript(
@@ -827,13 +1128,20 @@ class RecommendReviewers(object):
         keyword=keyword_score_by_version_id.get(version_id, 0),
         similarity=similarity_by_manuscript_version_id.get(version_id, None)
       )
-      for version_id in keyword_score_by_version_id.keys() | similarity_by_manuscript_version_id.keys()
+      for version_id in version_ids
+      if (
+        version_id in keyword_score_by_version_id or
+        version_id in similarity_by_manuscript_version_id
+      )
     }
 
   def _filter_published_version_ids(self, version_ids):
+    version_ids = list(version_ids)
+    manuscript_indices = self.manuscript_records.indices_of(version_ids)
     return {
-      version_id for version_id in version_ids
-      if self.manuscripts_by_version_id_map.get(version_id, {}).get('is_published')
+      version_id
+      for version_id, manuscript_index in zip(version_ids, manuscript_indices)
+      if manuscript_index >= 0 and self._is_published_manuscript[manuscript_index]
     }
 
   def _potential_reviewer_ids_by_matching_manuscript_ids(
@@ -889,7 +1197,7 @@ class RecommendReviewers(object):
       role=role
     )
 
-  def _recommend_using_criteria(
+  def _rank_potential_reviewers(
     self, subject_areas=None, keyword_list=None, abstract=None,
     include_person_ids=None, exclude_person_ids=None, ecr_subject_areas=None,
     manuscript_version_ids=None,
@@ -932,20 +1240,69 @@ class RecommendReviewers(object):
       role=role
     )
 
-    potential_reviewers = sorted_potential_reviewers(
-      self._populate_potential_reviewers(
+    # rank using the scores only, potential reviewers are populated separately
+    scored_potential_reviewers = sorted_potential_reviewers(
+      self._score_potential_reviewers(
         potential_reviewers_ids,
         person_ids_by_version_id=person_ids_by_version_id,
         keyword_score_by_person_id=person_keyword_scores,
         keyword_score_by_version_id=keyword_score_by_version_id,
         similarity_by_manuscript_version_id=similarity_by_manuscript_version_id
-      )
+      ),
+      limit=limit
     )
 
-    if limit is not None and limit > 0:
-      potential_reviewers = potential_reviewers[:limit]
+    version_ids_by_person_id = invert_set_dict(person_ids_by_version_id)
+
+    manuscript_score_by_id = self._combine_manuscript_scores_by_id(
+      set(iter_flatten(
+        version_ids_by_person_id.get(scored_potential_reviewer[PERSON_ID], set())
+        for scored_potential_reviewer in scored_potential_reviewers
+      )),
+      keyword_score_by_version_id=keyword_score_by_version_id,
+      similarity_by_manuscript_version_id=similarity_by_manuscript_version_id
+    )
+
+    return RankedPotentialReviewers(
+      scored_potential_reviewers=scored_potential_reviewers,
+      version_ids_by_person_id=version_ids_by_person_id,
+      manuscript_score_by_id=manuscript_score_by_id,
+      potential_reviewer_count=len(potential_reviewers_ids)
+    )
+
+  def _get_cached_ranking(self, ranking_key, **kwargs):
+    ranking = self._ranking_cache.get(ranking_key) if ranking_key is not None else None
+    if ranking is None:
+      ranking = self._rank_potential_reviewers(**kwargs)
+      if ranking_key is not None:
+        self._ranking_cache.put(ranking_key, ranking)
+    else:
+      self.logger.debug('using cached ranking')
+    return ranking
+
+  def _recommend_using_criteria(
+    self, limit=None, offset=None, ranking_key=None, result_fields=DEFAULT_RESULT_FIELDS,
+    **kwargs):
+
+    if not offset:
+      # only the first limit potential reviewers are required (also for the first page)
+      ranking = self._rank_potential_reviewers(limit=limit, **kwargs)
+      start = 0
+    else:
+      ranking = self._get_cached_ranking(ranking_key, **kwargs)
+      start = offset
+    end = start + limit if limit is not None and limit > 0 else None
+
+    potential_reviewers = self._populate_potential_reviewers(
+      ranking.scored_potential_reviewers[start:end],
+      version_ids_by_person_id=ranking.version_ids_by_person_id,
+      manuscript_score_by_id=ranking.manuscript_score_by_id,
+      result_fields=result_fields
+    )
 
     result = {
       'potential_reviewers': potential_reviewers
     }
+    if offset is not None:
+      result['potential_reviewer_count'] = ranking.potential_reviewer_count
     return result
@@ -1,16 +1,28 @@
+import json
 import pprint
 import logging
 from contextlib import contextmanager
+from functools import partial
+from unittest.mock import patch
 
 import pytest
 import pandas as pd
 
-from ...shared.database import populated_in_memory_database
+from peerscout.utils.json_fragments import dumps_with_cached_json
+
+from ...shared.database import populated_in_memory_database, log_changed_manuscript_versions
 
 from .ManuscriptModel import ManuscriptModel
+from .database_snapshot import DatabaseSnapshot
 from .DocumentSimilarityModel import DocumentSimilarityModel
 from .manuscript_person_relationship_service import RelationshipTypes
-from .RecommendReviewers import RecommendReviewers, set_debugv_enabled
+from .RecommendReviewers import (
+  AbstractOptions,
+  TRUNCATED_ABSTRACT_LENGTH,
+  RecommendReviewers,
+  set_debugv_enabled,
+  sorted_potential_reviewers
+)
 
 from .test_data import (
   PERSON_ID,
@@ -18,6 +30,7 @@ from .test_data import (
   PERSON1, PERSON2, PERSON3,
   MANUSCRIPT_VERSION1,
   MANUSCRIPT_ID1, MANUSCRIPT_ID2,
+  MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2,
   MANUSCRIPT_ID_FIELDS1, MANUSCRIPT_ID_FIELDS2, MANUSCRIPT_ID_FIELDS3,
   MANUSCRIPT_ID_FIELDS4, MANUSCRIPT_ID_FIELDS5,
   MANUSCRIPT_TITLE1, MANUSCRIPT_TITLE2, MANUSCRIPT_TITLE3,
@@ -32,8 +45,6 @@ from .test_data import (
 MANUSCRIPT_ID = 'manuscript_id'
 VERSION_ID = 'version_id'
 
-PERSON_ID = 'person_id'
-
 MANUSCRIPT_ID_COLUMNS = [VERSION_ID]
 PERSON_ID_COLUMNS = [PERSON_ID]
 
@@ -224,6 +235,24 @@ def setup_module():
 def get_logger():
   return logging.getLogger('test')
 
+def _create_recommend_reviewers_for_database(db, filter_by_subject_area_enabled=False):
+
+  manuscript_model = ManuscriptModel(
+    db,
+    valid_decisions=VALID_DECISIONS,
+    valid_manuscript_types=VALID_MANUSCRIPT_TYPES,
+    published_decisions=PUBLISHED_DECISIONS,
+    published_manuscript_types=PUBLISHED_MANUSCRIPT_TYPES
+  )
+  similarity_model = DocumentSimilarityModel(
+    db,
+    manuscript_model=manuscript_model
+  )
+  return RecommendReviewers(
+    db, manuscript_model=manuscript_model, similarity_model=similarity_model,
+    filter_by_subject_area_enabled=filter_by_subject_area_enabled
+  )
+
 @contextmanager
 def create_recommend_reviewers(dataset, filter_by_subject_area_enabled=False):
   logger = get_logger()
@@ -233,20 +262,8 @@ def create_recommend_reviewers(dataset, filter_by_subject_area_enabled=False):
     logger.debug("view person_review_stats_overall:\n%s",
       db.person_review_stats_overall.read_frame())
 
-    manuscript_model = ManuscriptModel(
-      db,
-      valid_decisions=VALID_DECISIONS,
-      valid_manuscript_types=VALID_MANUSCRIPT_TYPES,
-      published_decisions=PUBLISHED_DECISIONS,
-      published_manuscript_types=PUBLISHED_MANUSCRIPT_TYPES
-    )
-    similarity_model = DocumentSimilarityModel(
-      db,
-      manuscript_model=manuscript_model
-    )
-    yield RecommendReviewers(
-      db, manuscript_model=manuscript_model, similarity_model=similarity_model,
-      filter_by_subject_area_enabled=filter_by_subject_area_enabled
+    yield _create_recommend_reviewers_for_database(
+      db, filter_by_subject_area_enabled=filter_by_subject_area_enabled
     )
 
 def recommend_for_dataset(dataset, filter_by_subject_area_enabled=False, **kwargs):
@@ -335,6 +352,38 @@ class TestRecommendReviewers:
         }]
       }
 
+    def test_matching_manuscript_should_return_latest_version(self):
+      latest_version_id = '%s-2' % MANUSCRIPT_ID1
+      dataset = {
+        'person' : [PERSON1],
+        'manuscript_version': [
+          MANUSCRIPT_VERSION1,
+          {**MANUSCRIPT_VERSION1, VERSION_ID: latest_version_id}
+        ]
+      }
+      result = recommend_for_dataset(dataset, keywords='', manuscript_no=MANUSCRIPT_ID1)
+      assert [m[VERSION_ID] for m in result['matching_manuscripts']] == [latest_version_id]
+
+    def test_should_find_manuscripts_similar_to_all_versions(self):
+      latest_version_id = '%s-2' % MANUSCRIPT_ID1
+      dataset = {
+        'person' : [PERSON1],
+        'manuscript_version': [
+          MANUSCRIPT_VERSION1,
+          {**MANUSCRIPT_VERSION1, VERSION_ID: latest_version_id}
+        ]
+      }
+      with create_recommend_reviewers(dataset) as recommend_reviewers:
+        similarity_model = recommend_reviewers.similarity_model
+        with patch.object(
+          similarity_model, 'find_similar_manuscripts',
+          wraps=similarity_model.find_similar_manuscripts) as find_similar_manuscripts_mock:
+
+          recommend_reviewers.recommend(keywords='', manuscript_no=MANUSCRIPT_ID1)
+          assert set(find_similar_manuscripts_mock.call_args[0][0]) == {
+            MANUSCRIPT_VERSION_ID1, latest_version_id
+          }
+
     def test_matching_manuscript_should_include_subject_areas(self):
       dataset = {
         'person' : [PERSON1],
@@ -1001,6 +1050,280 @@ class TestRecommendReviewers:
       with create_recommend_reviewers(dataset) as recommend_reviewers:
         assert recommend_reviewers.get_all_keywords() == [KEYWORD1]
 
+  class TestUsingDatabaseSnapshot:
+    def test_should_recommend_using_changed_manuscripts_of_refreshed_snapshot(self):
+      dataset = {
+        'person': [PERSON1, PERSON2],
+        'manuscript_version': [
+          MANUSCRIPT_VERSION1, {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS2}
+        ],
+        'manuscript_author': [
+          AUTHOR1, {**AUTHOR1, **MANUSCRIPT_ID_FIELDS2, PERSON_ID: PERSON_ID2}
+        ],
+        'manuscript_keyword': [MANUSCRIPT_KEYWORD1],
+        'manuscript_version_change_log': [{
+          **MANUSCRIPT_ID_FIELDS1, 'changed_timestamp': pd.Timestamp('2017-01-01')
+        }]
+      }
+      with populated_in_memory_database(dataset) as db:
+        snapshot = DatabaseSnapshot.from_database(db)
+        result = _create_recommend_reviewers_for_database(snapshot).recommend(
+          keywords=KEYWORD1, manuscript_no=''
+        )
+        assert _potential_reviewers_person_ids(result['potential_reviewers']) == [PERSON_ID1]
+
+        db.manuscript_keyword.delete_all()
+        db.manuscript_keyword.create_list([{**MANUSCRIPT_ID_FIELDS2, 'keyword': KEYWORD1}])
+        log_changed_manuscript_versions(
+          db, [MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2],
+          changed_timestamp=pd.Timestamp('2017-01-02')
+        )
+        db.commit()
+
+        result = _create_recommend_reviewers_for_database(snapshot.refreshed(db)).recommend(
+          keywords=KEYWORD1, manuscript_no=''
+        )
+        assert _potential_reviewers_person_ids(result['potential_reviewers']) == [PERSON_ID2]
+
+    def test_should_recommend_using_saved_snapshot(self, tmpdir):
+      dataset = {
+        'person': [PERSON1],
+        'manuscript_version': [MANUSCRIPT_VERSION1],
+        'manuscript_author': [AUTHOR1],
+        'manuscript_keyword': [MANUSCRIPT_KEYWORD1]
+      }
+      path = str(tmpdir.join('snapshot'))
+      with populated_in_memory_database(dataset) as db:
+        snapshot = DatabaseSnapshot.from_database(db)
+        expected_result = _create_recommend_reviewers_for_database(snapshot).recommend(
+          keywords=KEYWORD1, manuscript_no=''
+        )
+        snapshot.save(path)
+
+        loaded_snapshot = DatabaseSnapshot.load_current_or_from_database(db, path)
+        assert loaded_snapshot.is_saved
+        result = _create_recommend_reviewers_for_database(loaded_snapshot).recommend(
+          keywords=KEYWORD1, manuscript_no=''
+        )
+        assert result == expected_result
+
+  class TestResultFields:
+    DATASET = {
+      'person': [PERSON1],
+      'manuscript_version': [
+        {**MANUSCRIPT_VERSION1, 'title': MANUSCRIPT_TITLE1, 'abstract': 'x' * 500},
+        {**MANUSCRIPT_VERSION2, 'title': MANUSCRIPT_TITLE1, 'abstract': MANUSCRIPT_ABSTRACT1}
+      ],
+      'manuscript_author': [AUTHOR1, {**AUTHOR1, **MANUSCRIPT_ID_FIELDS2}],
+      'manuscript_keyword': [MANUSCRIPT_KEYWORD1]
+    }
+
+    def _recommend(self, **kwargs):
+      return recommend_for_dataset(self.DATASET, keywords=KEYWORD1, manuscript_no='', **kwargs)
+
+    def test_should_only_include_selected_potential_reviewer_fields(self):
+      result = self._recommend(fields=['person'])
+      assert set(result['potential_reviewers'][0].keys()) == {'person'}
+
+    def test_should_exclude_potential_reviewer_fields(self):
+      result = self._recommend(exclude=['author_of_manuscripts'])
+      assert set(result['potential_reviewers'][0].keys()) == {'person', 'scores'}
+
+    def test_should_exclude_manuscript_fields_including_alternatives(self):
+      result = self._recommend(exclude=['authors'])
+      manuscript = result['potential_reviewers'][0]['author_of_manuscripts'][0]
+      assert 'authors' not in manuscript
+      assert 'authors' not in manuscript['alternatives'][0]
+
+    def test_should_not_include_abstracts(self):
+      result = self._recommend(abstracts=AbstractOptions.NONE)
+      manuscript = result['potential_reviewers'][0]['author_of_manuscripts'][0]
+      assert 'abstract' not in manuscript
+      assert 'abstract' not in manuscript['alternatives'][0]
+
+    def test_should_truncate_abstracts(self):
+      result = self._recommend(abstracts=AbstractOptions.TRUNCATED)
+      manuscript = result['potential_reviewers'][0]['author_of_manuscripts'][0]
+      abstracts = {manuscript['abstract'], manuscript['alternatives'][0]['abstract']}
+      assert abstracts == {
+        MANUSCRIPT_ABSTRACT1, 'x' * TRUNCATED_ABSTRACT_LENGTH + '...'
+      }
+
+    def test_should_reject_invalid_abstracts_option(self):
+      with pytest.raises(ValueError):
+        self._recommend(abstracts='other')
+
+    def test_should_reject_unknown_potential_reviewer_fields(self):
+      with pytest.raises(ValueError):
+        self._recommend(fields=['scroes'])
+
+  class TestSerialisingResult:
+    def test_should_serialise_result_with_cached_json_like_regular_json(self):
+      dataset = {
+        'person': [PERSON1, PERSON2],
+        'manuscript_version': [
+          MANUSCRIPT_VERSION1, {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS2}
+        ],
+        'manuscript_author': [
+          AUTHOR1, {**AUTHOR1, **MANUSCRIPT_ID_FIELDS2, PERSON_ID: PERSON_ID2}
+        ],
+        'manuscript_keyword': [
+          MANUSCRIPT_KEYWORD1, {**MANUSCRIPT_KEYWORD1, **MANUSCRIPT_ID_FIELDS2}
+        ]
+      }
+      dumps = partial(json.dumps, sort_keys=True, default=str)
+      with create_recommend_reviewers(dataset) as recommend_reviewers:
+        for _ in range(2):
+          result = recommend_reviewers.recommend(keywords=KEYWORD1, manuscript_no='')
+          assert len(result['potential_reviewers']) == 2
+          assert dumps_with_cached_json(result, dumps=dumps) == dumps(result)
+
+    def test_should_serialise_each_manuscript_only_once_across_results(self):
+      dataset = {
+        'person': [PERSON1],
+        'manuscript_version': [
+          MANUSCRIPT_VERSION1, {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS2}
+        ],
+        'manuscript_author': [AUTHOR1, {**AUTHOR1, **MANUSCRIPT_ID_FIELDS2}],
+        'manuscript_keyword': [
+          MANUSCRIPT_KEYWORD1, {**MANUSCRIPT_KEYWORD1, **MANUSCRIPT_ID_FIELDS2}
+        ]
+      }
+      serialised_manuscripts = []
+
+      def dumps(obj):
+        if isinstance(obj, dict) and 'title' in obj:
+          serialised_manuscripts.append(obj[VERSION_ID])
+        return json.dumps(obj, sort_keys=True, default=str)
+
+      with create_recommend_reviewers(dataset) as recommend_reviewers:
+        for _ in range(2):
+          result = recommend_reviewers.recommend(keywords=KEYWORD1, manuscript_no='')
+          author_of_manuscripts = result['potential_reviewers'][0]['author_of_manuscripts']
+          # the manuscripts with the same title are combined as alternatives
+          assert len(author_of_manuscripts) == 1
+          assert len(author_of_manuscripts[0]['alternatives']) == 1
+          dumps_with_cached_json(result, dumps=dumps)
+      assert sorted(serialised_manuscripts) == sorted([
+        MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2
+      ])
+
+    def test_should_only_materialise_returned_persons(self):
+      dataset = {
+        'person': [PERSON1, PERSON2],
+        'manuscript_version': [
+          MANUSCRIPT_VERSION1, {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS2}
+        ],
+        'manuscript_author': [
+          AUTHOR1, {**AUTHOR1, **MANUSCRIPT_ID_FIELDS2, PERSON_ID: PERSON_ID2}
+        ],
+        'manuscript_keyword': [
+          MANUSCRIPT_KEYWORD1, {**MANUSCRIPT_KEYWORD1, **MANUSCRIPT_ID_FIELDS2}
+        ]
+      }
+      with create_recommend_reviewers(dataset) as recommend_reviewers:
+        with patch.object(
+          recommend_reviewers, '_create_person_by_index',
+          wraps=recommend_reviewers._create_person_by_index) as create_person_mock:
+
+          result = recommend_reviewers.recommend(keywords=KEYWORD1, manuscript_no='', limit=1)
+        person_ids = _potential_reviewers_person_ids(result['potential_reviewers'])
+        assert len(person_ids) == 1
+        assert [
+          recommend_reviewers.person_records.keys[call[0][0]]
+          for call in create_person_mock.call_args_list
+        ] == person_ids
+
+  class TestPaging:
+    DATASET = {
+      'person': [PERSON1, PERSON2, PERSON3],
+      'manuscript_version': [
+        MANUSCRIPT_VERSION1,
+        {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS2},
+        {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS3}
+      ],
+      'manuscript_author': [
+        AUTHOR1,
+        {**AUTHOR1, **MANUSCRIPT_ID_FIELDS2, PERSON_ID: PERSON_ID2},
+        {**AUTHOR1, **MANUSCRIPT_ID_FIELDS3, PERSON_ID: PERSON_ID3}
+      ],
+      'manuscript_keyword': [
+        MANUSCRIPT_KEYWORD1,
+        {**MANUSCRIPT_KEYWORD1, **MANUSCRIPT_ID_FIELDS2},
+        {**MANUSCRIPT_KEYWORD1, **MANUSCRIPT_ID_FIELDS3}
+      ]
+    }
+
+    def test_should_return_pages_consistent_with_complete_result(self):
+      with create_recommend_reviewers(self.DATASET) as recommend_reviewers:
+        all_person_ids = _potential_reviewers_person_ids(recommend_reviewers.recommend(
+          keywords=KEYWORD1, manuscript_no=''
+        )['potential_reviewers'])
+        assert len(all_person_ids) == 3
+        pages = [
+          recommend_reviewers.recommend(
+            keywords=KEYWORD1, manuscript_no='', offset=offset, limit=2
+          )
+          for offset in [0, 2]
+        ]
+        assert [page['potential_reviewer_count'] for page in pages] == [3, 3]
+        assert [
+          _potential_reviewers_person_ids(page['potential_reviewers']) for page in pages
+        ] == [all_person_ids[:2], all_person_ids[2:]]
+
+    def test_should_only_rank_first_limit_potential_reviewers_for_first_page(self):
+      with create_recommend_reviewers(self.DATASET) as recommend_reviewers:
+        with patch(
+          '%s.sorted_potential_reviewers' % sorted_potential_reviewers.__module__,
+          wraps=sorted_potential_reviewers) as sorted_potential_reviewers_mock:
+
+          result = recommend_reviewers.recommend(
+            keywords=KEYWORD1, manuscript_no='', offset=0, limit=2
+          )
+          assert sorted_potential_reviewers_mock.call_args[1]['limit'] == 2
+        assert len(result['potential_reviewers']) == 2
+        assert result['potential_reviewer_count'] == 3
+
+    def test_should_reuse_ranking_for_subsequent_pages(self):
+      with create_recommend_reviewers(self.DATASET) as recommend_reviewers:
+        recommend_reviewers.recommend(keywords=KEYWORD1, manuscript_no='', offset=1, limit=1)
+        with patch.object(recommend_reviewers, '_rank_potential_reviewers') as rank_mock:
+          result = recommend_reviewers.recommend(
+            keywords=KEYWORD1, manuscript_no='', offset=2, limit=2
+          )
+          rank_mock.assert_not_called()
+        assert len(result['potential_reviewers']) == 1
+
+    def test_should_not_include_count_without_offset(self):
+      result = recommend_for_dataset(self.DATASET, keywords=KEYWORD1, manuscript_no='')
+      assert 'potential_reviewer_count' not in result
+
+  class TestGetRecentlyActiveManuscriptIds:
+    def test_should_return_manuscript_ids_by_latest_stage_activity(self):
+      dataset = {
+        'person': [PERSON1],
+        'manuscript_version': [
+          MANUSCRIPT_VERSION1, {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS2}
+        ],
+        'manuscript_stage': [{
+          **MANUSCRIPT_HISTORY_REVIEW_COMPLETE1,
+          'stage_timestamp': pd.Timestamp('2017-01-03')
+        }, {
+          **MANUSCRIPT_HISTORY_REVIEW_COMPLETE1,
+          **MANUSCRIPT_ID_FIELDS2,
+          'stage_timestamp': pd.Timestamp('2017-01-02')
+        }, {
+          **MANUSCRIPT_HISTORY_REVIEW_COMPLETE1,
+          **MANUSCRIPT_ID_FIELDS2,
+          'stage_timestamp': pd.Timestamp('2017-01-04')
+        }]
+      }
+      with create_recommend_reviewers(dataset) as recommend_reviewers:
+        assert recommend_reviewers.get_recently_active_manuscript_ids(10) == [
+          MANUSCRIPT_ID2, MANUSCRIPT_ID1
+        ]
+        assert recommend_reviewers.get_recently_active_manuscript_ids(1) == [MANUSCRIPT_ID2]
+
   class TestUserHasRoleByEmail:
     def test_should_return_wether_user_has_role(self):
       dataset = {
@@ -1020,3 +1343,24 @@ class TestRecommendReviewers:
       }
       with create_recommend_reviewers(dataset) as recommend_reviewers:
         assert recommend_reviewers.get_user_roles_by_email(email=EMAIL_1) == {ROLE_1}
+
+def _sortable_potential_reviewer(i, combined, is_early_career_researcher=False):
+  return {
+    'person': {
+      PERSON_ID: 'person%d' % i,
+      'first_name': 'first%d' % i,
+      'last_name': 'last',
+      'is_early_career_researcher': is_early_career_researcher
+    },
+    'scores': {'combined': combined, 'keyword': combined}
+  }
+
+class TestSortedPotentialReviewers:
+  def test_should_return_same_order_with_limit_as_without(self):
+    potential_reviewers = [
+      _sortable_potential_reviewer(i, (i % 4) / 4, is_early_career_researcher=(i % 3 == 0))
+      for i in range(20)
+    ]
+    all_sorted = sorted_potential_reviewers(potential_reviewers)
+    for limit in [1, 2, 5, 19, 20, 30]:
+      assert sorted_potential_reviewers(potential_reviewers, limit=limit) == all_sorted[:limit]
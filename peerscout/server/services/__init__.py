@@ -1,3 +1,4 @@
+from .database_snapshot import DatabaseSnapshot
 from .DocumentSimilarityModel import DocumentSimilarityModel, load_similarity_model_from_database
 from .ManuscriptModel import ManuscriptModel
 from .RecommendReviewers import RecommendReviewers
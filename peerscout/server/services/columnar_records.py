@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+def _column_values(series):
+  if series.dtype.kind == 'M':
+    # consistent with DataFrame.to_dict, datetime values are returned as Timestamp
+    return series.astype(object).values
+  return series.values
+
+def _compact_column(series):
+  # repeated strings are stored once (as categories), with an integer code per record
+  if series.dtype == object and len(series) > 0:
+    try:
+      categorical = pd.Categorical(series.values)
+    except TypeError:
+      # e.g. unhashable values
+      return series.values
+    if len(categorical.categories) <= len(series) // 2:
+      return categorical
+  return _column_values(series)
+
+def to_python_value(value):
+  # consistent with DataFrame.to_dict, numpy scalars are converted to python values
+  if isinstance(value, np.generic):
+    return value.item()
+  return value
+
+class ColumnarRecords:
+  """Read-only records stored column by column and addressed by integer index.
+
+  Records are only materialised as dicts when requested.
+  """
+
+  def __init__(self, df, key_column):
+    self._key_index = pd.Index(df[key_column].values)
+    self._columns = [(column, _compact_column(df[column])) for column in df.columns]
+
+  @property
+  def keys(self):
+    return self._key_index
+
+  def __len__(self):
+    return len(self._key_index)
+
+  def index_of(self, key):
+    # returns -1 if there is no record with the key
+    try:
+      return self._key_index.get_loc(key)
+    except KeyError:
+      return -1
+
+  def indices_of(self, keys):
+    return self._key_index.get_indexer(list(keys))
+
+  def get_values(self, column):
+    # all values of the column, by record index
+    return np.asarray(dict(self._columns)[column])
+
+  def get_by_index(self, index):
+    return {
+      column: to_python_value(values[index])
+      for column, values in self._columns
+    }
+
+  def get(self, key, default_value=None):
+    index = self.index_of(key)
+    return self.get_by_index(index) if index >= 0 else default_value
+
+class GroupedValues:
+  """Lists of values (e.g. record indices) by group index (e.g. the index of another record).
+
+  Stored as one flat array per column, ordered by group, with the offsets of each group.
+  Values with a negative group index are ignored. The order within a group is retained.
+  """
+
+  def __init__(self, group_indices, group_count, **columns):
+    group_indices = np.asarray(group_indices, dtype=np.int64)
+    mask = group_indices >= 0
+    group_indices = group_indices[mask]
+    order = np.argsort(group_indices, kind='mergesort')
+    self._columns = {
+      name: np.asarray(values)[mask][order]
+      for name, values in columns.items()
+    }
+    self._offsets = np.concatenate([
+      [0], np.cumsum(np.bincount(group_indices, minlength=group_count))
+    ])
+
+  def get(self, group_index, column_name):
+    return self._columns[column_name][
+      self._offsets[group_index]:self._offsets[group_index + 1]
+    ]
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from .columnar_records import ColumnarRecords, GroupedValues
+
+ID = 'id'
+
+ID1 = 'id1'
+ID2 = 'id2'
+ID3 = 'id3'
+
+class TestColumnarRecords:
+  def test_should_return_record_by_key(self):
+    records = ColumnarRecords(pd.DataFrame({ID: [ID1, ID2], 'value': [1, 2]}), ID)
+    assert records.get(ID2) == {ID: ID2, 'value': 2}
+    assert records.index_of(ID2) == 1
+
+  def test_should_return_default_value_for_unknown_key(self):
+    records = ColumnarRecords(pd.DataFrame({ID: [ID1], 'value': [1]}), ID)
+    assert records.get(ID2) is None
+    assert records.index_of(ID2) == -1
+
+  def test_should_return_indices_of_keys(self):
+    records = ColumnarRecords(pd.DataFrame({ID: [ID1, ID2], 'value': [1, 2]}), ID)
+    assert list(records.indices_of([ID2, ID3, ID1])) == [1, -1, 0]
+
+  def test_should_return_python_values(self):
+    records = ColumnarRecords(pd.DataFrame({
+      ID: [ID1], 'int_value': [1], 'float_value': [1.5], 'bool_value': [True]
+    }), ID)
+    record = records.get(ID1)
+    assert [type(record[k]) for k in ['int_value', 'float_value', 'bool_value']] == [
+      int, float, bool
+    ]
+
+  def test_should_return_timestamps(self):
+    timestamp = pd.Timestamp('2017-01-01')
+    records = ColumnarRecords(pd.DataFrame({ID: [ID1, ID2], 'value': [timestamp, pd.NaT]}), ID)
+    assert records.get(ID1)['value'] == timestamp
+    assert records.get(ID2)['value'] is pd.NaT
+
+  def test_should_return_repeated_strings(self):
+    records = ColumnarRecords(pd.DataFrame({
+      ID: [ID1, ID2, ID3], 'value': ['same', 'same', 'same']
+    }), ID)
+    assert [records.get(key)['value'] for key in [ID1, ID2, ID3]] == ['same'] * 3
+
+  def test_should_return_values_of_column(self):
+    records = ColumnarRecords(pd.DataFrame({
+      ID: [ID1, ID2, ID3], 'value': ['same', 'same', 'other']
+    }), ID)
+    assert list(records.get_values('value')) == ['same', 'same', 'other']
+
+class TestGroupedValues:
+  def test_should_return_values_of_group_in_original_order(self):
+    grouped_values = GroupedValues([1, 0, 1], 3, value=[10, 20, 30])
+    assert list(grouped_values.get(0, 'value')) == [20]
+    assert list(grouped_values.get(1, 'value')) == [10, 30]
+    assert list(grouped_values.get(2, 'value')) == []
+
+  def test_should_ignore_values_without_group(self):
+    grouped_values = GroupedValues([-1, 0], 1, value=[10, 20], other=['a', 'b'])
+    assert list(grouped_values.get(0, 'value')) == [20]
+    assert list(grouped_values.get(0, 'other')) == ['b']
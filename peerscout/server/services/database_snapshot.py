@@ -0,0 +1,382 @@
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+from ...shared.database import get_data_generation
+
+LOGGER = logging.getLogger(__name__)
+
+VERSION_ID = 'version_id'
+
+# to be incremented whenever the saved snapshot layout changes
+SNAPSHOT_FORMAT_VERSION = 1
+
+SNAPSHOT_META_FILENAME = 'snapshot.json'
+
+DEFAULT_PREFETCH_MAX_WORKERS = 8
+
+# tables only modified by importers logging the changed manuscript versions
+# (see log_changed_manuscript_versions)
+INCREMENTAL_TABLE_NAMES = [
+  'manuscript_version',
+  'manuscript_author',
+  'manuscript_editor',
+  'manuscript_senior_editor',
+  'manuscript_reviewer',
+  'manuscript_potential_editor',
+  'manuscript_potential_reviewer',
+  'manuscript_keyword',
+  'manuscript_subject_area',
+  'manuscript_stage'
+]
+
+def _get_latest_change_log_timestamp(db):
+  change_log_table = db.manuscript_version_change_log.table
+  return db.session.query(sqlalchemy.func.max(change_log_table.changed_timestamp)).scalar()
+
+def _get_changed_version_ids_since(db, timestamp):
+  change_log_table = db.manuscript_version_change_log.table
+  return {
+    row[0]
+    for row in db.session.query(change_log_table.version_id).filter(
+      change_log_table.changed_timestamp > timestamp
+    ).all()
+  }
+
+def _supports_concurrent_connections(engine):
+  # e.g. in-memory sqlite databases are only available to a single connection
+  return not isinstance(engine.pool, (SingletonThreadPool, StaticPool))
+
+def _read_frame_using_new_connection(db, table_name):
+  with db.engine.connect() as connection:
+    return db[table_name].read_frame(connection=connection)
+
+def _format_timestamp(timestamp):
+  return timestamp.isoformat() if timestamp is not None else None
+
+def _parse_timestamp(timestamp_str):
+  return pd.Timestamp(timestamp_str).to_pydatetime() if timestamp_str else None
+
+def _get_data_version(db, change_log_timestamp):
+  # the data generation detects any committed changes, including in-place updates
+  # (row counts detect changes by importers not logging the changed manuscript versions)
+  return {
+    'data_generation': get_data_generation(db),
+    'change_log_timestamp': _format_timestamp(change_log_timestamp),
+    'row_count_by_table_name': {
+      table_name: db[table_name].count()
+      for table_name in db.sorted_table_names()
+    }
+  }
+
+def query_docvecs(db, column_name):
+  ml_manuscript_data_table = db['ml_manuscript_data'].table
+  docvec_column = getattr(ml_manuscript_data_table, column_name)
+  rows = db.session.query(
+    ml_manuscript_data_table.version_id,
+    docvec_column
+  ).filter(
+    docvec_column != None # noqa: E711
+  ).all()
+  version_ids = np.array([row[0] for row in rows], dtype=object)
+  if not rows:
+    return version_ids, np.zeros((0, 0))
+  return version_ids, np.array([row[1] for row in rows], dtype=np.float64)
+
+def _harmonize_dtypes(df, like_df):
+  for column in df.columns:
+    if column in like_df.columns and df[column].dtype != like_df[column].dtype:
+      try:
+        df[column] = df[column].astype(like_df[column].dtype)
+      except (TypeError, ValueError):
+        pass
+  return df
+
+def _replace_rows(df, changed_df, column_name, values):
+  column_values = df.index if df.index.name == column_name else df[column_name]
+  unchanged_df = df[~pd.Series(column_values).isin(values).values]
+  if len(changed_df) == 0:
+    return unchanged_df
+  # same columns in the same order, so that concat doesn't need to align (or sort) them
+  changed_df = _harmonize_dtypes(changed_df.reindex(columns=df.columns), df)
+  return pd.concat([unchanged_df, changed_df])
+
+class _SnapshotTable:
+  def __init__(self, snapshot, table_name, table):
+    self._snapshot = snapshot
+    self._table_name = table_name
+    self.table = table
+
+  def read_frame(self):
+    return self._snapshot.read_frame(self._table_name)
+
+def _save_array(path, values):
+  np.save(path, values, allow_pickle=values.dtype == object)
+
+def _load_array(path, mmap_mode=None):
+  try:
+    return np.load(path, mmap_mode=mmap_mode)
+  except ValueError:
+    # object arrays can't be memory mapped
+    return np.load(path, allow_pickle=True)
+
+def _save_frame(path, df):
+  os.makedirs(path)
+  index_name = df.index.name
+  if index_name is not None:
+    _save_array(os.path.join(path, 'index.npy'), df.index.values)
+  for i, column in enumerate(df.columns):
+    _save_array(os.path.join(path, '%d.npy' % i), df[column].values)
+  return {'index_name': index_name, 'columns': list(df.columns)}
+
+def _load_frame(path, frame_meta):
+  index_name = frame_meta['index_name']
+  df = pd.DataFrame({
+    column: _load_array(os.path.join(path, '%d.npy' % i))
+    for i, column in enumerate(frame_meta['columns'])
+  }, columns=frame_meta['columns'])
+  if index_name is not None:
+    df.index = pd.Index(_load_array(os.path.join(path, 'index.npy')), name=index_name)
+  return df
+
+def _replace_directory(path, new_path):
+  old_path = path + '.old'
+  if os.path.exists(old_path):
+    shutil.rmtree(old_path)
+  if os.path.exists(path):
+    os.rename(path, old_path)
+  os.rename(new_path, path)
+  if os.path.exists(old_path):
+    shutil.rmtree(old_path)
+
+class DatabaseSnapshot:
+  """In-memory copy of database tables, providing the read_frame method of the database tables.
+
+  Tables are read on first use, the returned frames are shared and must not be modified.
+  Snapshots can be saved to a directory and loaded again (with the docvecs memory mapped),
+  e.g. to avoid reading the whole database on server start.
+  """
+
+  def __init__(
+    self, db, frame_by_table_name=None, change_log_timestamp=None, data_version=None,
+    docvecs_by_column_name=None):
+
+    self._db = db
+    self._frame_by_table_name = dict(frame_by_table_name or {})
+    self._docvecs_by_column_name = dict(docvecs_by_column_name or {})
+    self._future_by_table_name = {}
+    self.change_log_timestamp = change_log_timestamp
+    self.data_version = data_version
+    self.is_saved = False
+
+  @staticmethod
+  def from_database(db):
+    # the data version is retrieved first, changes made while reading will be re-read
+    change_log_timestamp = _get_latest_change_log_timestamp(db)
+    return DatabaseSnapshot(
+      db, change_log_timestamp=change_log_timestamp,
+      data_version=_get_data_version(db, change_log_timestamp)
+    )
+
+  @staticmethod
+  def load(db, path):
+    """Returns the snapshot previously saved to path, or None if there isn't a usable one."""
+
+    meta_path = os.path.join(path, SNAPSHOT_META_FILENAME)
+    if not os.path.exists(meta_path):
+      LOGGER.info('no saved snapshot found: %s', path)
+      return None
+    with open(meta_path, 'r') as f:
+      meta = json.load(f)
+    if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+      LOGGER.info(
+        'ignoring saved snapshot with format version %s (expected: %s)',
+        meta.get('format_version'), SNAPSHOT_FORMAT_VERSION
+      )
+      return None
+    snapshot = DatabaseSnapshot(
+      db,
+      frame_by_table_name={
+        table_name: _load_frame(os.path.join(path, 'tables', table_name), frame_meta)
+        for table_name, frame_meta in meta['tables'].items()
+      },
+      docvecs_by_column_name={
+        column_name: (
+          _load_array(os.path.join(path, 'docvecs', column_name + '-version_ids.npy')),
+          _load_array(os.path.join(path, 'docvecs', column_name + '.npy'), mmap_mode='r')
+        )
+        for column_name in meta['docvecs']
+      },
+      change_log_timestamp=_parse_timestamp(meta['change_log_timestamp']),
+      data_version=meta['data_version']
+    )
+    snapshot.is_saved = True
+    return snapshot
+
+  @staticmethod
+  def load_current_or_from_database(db, path):
+    """Returns the saved snapshot if it matches the data version of the database,
+    otherwise a new snapshot reading from the database."""
+
+    snapshot = DatabaseSnapshot.from_database(db)
+    saved_snapshot = DatabaseSnapshot.load(db, path)
+    if saved_snapshot is None:
+      return snapshot
+    if saved_snapshot.data_version != snapshot.data_version:
+      LOGGER.info('saved snapshot is outdated, reading from database')
+      return snapshot
+    LOGGER.info('using saved snapshot: %s', path)
+    return saved_snapshot
+
+  def save(self, path):
+    """Saves the tables and docvecs read so far to path (replacing any previous snapshot)."""
+
+    LOGGER.info('saving snapshot: %s', path)
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+      shutil.rmtree(temp_path)
+    os.makedirs(os.path.join(temp_path, 'docvecs'))
+    meta = {
+      'format_version': SNAPSHOT_FORMAT_VERSION,
+      'data_version': self.data_version,
+      'change_log_timestamp': _format_timestamp(self.change_log_timestamp),
+      'tables': {
+        table_name: _save_frame(os.path.join(temp_path, 'tables', table_name), df)
+        for table_name, df in self._frame_by_table_name.items()
+      },
+      'docvecs': sorted(self._docvecs_by_column_name.keys())
+    }
+    for column_name, (version_ids, docvecs) in self._docvecs_by_column_name.items():
+      _save_array(os.path.join(temp_path, 'docvecs', column_name + '-version_ids.npy'), version_ids)
+      _save_array(os.path.join(temp_path, 'docvecs', column_name + '.npy'), docvecs)
+    with open(os.path.join(temp_path, SNAPSHOT_META_FILENAME), 'w') as f:
+      json.dump(meta, f)
+    _replace_directory(path, temp_path)
+    self.is_saved = True
+
+  def prefetch(self, table_names, max_workers=DEFAULT_PREFETCH_MAX_WORKERS):
+    """Starts reading the tables in the background, concurrently using one connection per table.
+
+    read_frame will wait for the table if it is still being read.
+    Does nothing if the database doesn't support concurrent connections.
+    The tables are read outside of the transaction the data version was retrieved in,
+    see is_data_version_current.
+    """
+
+    table_names = [
+      table_name for table_name in table_names
+      if table_name not in self._frame_by_table_name and
+      table_name not in self._future_by_table_name
+    ]
+    if not table_names or max_workers <= 1:
+      return
+    if not _supports_concurrent_connections(self._db.engine):
+      LOGGER.debug('database does not support concurrent connections, not prefetching tables')
+      return
+    LOGGER.debug('prefetching tables: %s', table_names)
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(table_names)))
+    for table_name in table_names:
+      self._future_by_table_name[table_name] = executor.submit(
+        _read_frame_using_new_connection, self._db, table_name
+      )
+    executor.shutdown(wait=False)
+
+  def read_frame(self, table_name):
+    df = self._frame_by_table_name.get(table_name)
+    if df is None:
+      future = self._future_by_table_name.pop(table_name, None)
+      if future is not None:
+        df = future.result()
+      else:
+        LOGGER.debug('reading table: %s', table_name)
+        df = self._db[table_name].read_frame()
+      self._frame_by_table_name[table_name] = df
+    return df
+
+  def is_data_version_current(self):
+    """Whether the data version of the database still matches, once all reads completed.
+
+    The data version is retrieved before reading the tables. Data changed while reading
+    (e.g. by a concurrent import) may be partially included in the snapshot, which therefore
+    shouldn't be saved with its data version.
+    """
+
+    for table_name in list(self._future_by_table_name.keys()):
+      self.read_frame(table_name)
+    current_data_version = _get_data_version(self._db, _get_latest_change_log_timestamp(self._db))
+    return current_data_version == self.data_version
+
+  def read_docvecs(self, column_name):
+    # returns the version ids and the docvecs matrix (one row per version id)
+    docvecs = self._docvecs_by_column_name.get(column_name)
+    if docvecs is None:
+      LOGGER.debug('reading docvecs: %s', column_name)
+      docvecs = query_docvecs(self._db, column_name)
+      self._docvecs_by_column_name[column_name] = docvecs
+    return docvecs
+
+  def __getitem__(self, table_name):
+    return _SnapshotTable(self, table_name, self._db[table_name].table)
+
+  def __getattr__(self, table_name):
+    if table_name.startswith('_'):
+      raise AttributeError(table_name)
+    return self[table_name]
+
+  def refreshed(self, db):
+    """Returns a new snapshot of the database, reusing the data of this snapshot where possible.
+
+    Only the rows of the manuscript versions logged as changed are re-read for the incremental
+    tables. All other tables will be read in full (on first use).
+    """
+
+    change_log_timestamp = _get_latest_change_log_timestamp(db)
+    data_version = _get_data_version(db, change_log_timestamp)
+    if (
+      self.change_log_timestamp is None or change_log_timestamp is None or
+      change_log_timestamp < self.change_log_timestamp):
+
+      LOGGER.info(
+        'change log not usable (timestamp: %s, previous: %s), not reusing any tables',
+        change_log_timestamp, self.change_log_timestamp
+      )
+      return DatabaseSnapshot(
+        db, change_log_timestamp=change_log_timestamp, data_version=data_version
+      )
+
+    changed_version_ids = _get_changed_version_ids_since(db, self.change_log_timestamp)
+    LOGGER.info(
+      'changed manuscript versions since %s: %d', self.change_log_timestamp,
+      len(changed_version_ids)
+    )
+    frame_by_table_name = {}
+    for table_name in INCREMENTAL_TABLE_NAMES:
+      df = self._frame_by_table_name.get(table_name)
+      if df is None:
+        continue
+      if changed_version_ids:
+        df = _replace_rows(
+          df,
+          db[table_name].read_frame_where_in(VERSION_ID, changed_version_ids),
+          VERSION_ID, changed_version_ids
+        )
+      row_count = db[table_name].count()
+      if len(df) != row_count:
+        LOGGER.warning(
+          'unexpected number of rows in %s (%d instead of %d), will read table in full',
+          table_name, len(df), row_count
+        )
+        continue
+      frame_by_table_name[table_name] = df
+    LOGGER.info('reusing tables: %s', sorted(frame_by_table_name.keys()))
+    return DatabaseSnapshot(
+      db, frame_by_table_name, change_log_timestamp=change_log_timestamp,
+      data_version=data_version
+    )
@@ -0,0 +1,232 @@
+import datetime
+
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+import sqlalchemy
+
+from ...shared.database import (
+  Database,
+  insert_dataset,
+  populated_in_memory_database,
+  log_changed_manuscript_versions
+)
+from ...shared.database_schema import Person
+
+from .test_data import (
+  PERSON1,
+  MANUSCRIPT_VERSION1,
+  MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2,
+  MANUSCRIPT_ID_FIELDS1, MANUSCRIPT_ID_FIELDS2
+)
+
+from .database_snapshot import DatabaseSnapshot
+
+KEYWORD1 = 'keyword1'
+KEYWORD2 = 'keyword2'
+KEYWORD3 = 'keyword3'
+
+TIMESTAMP1 = datetime.datetime(2017, 1, 1)
+TIMESTAMP2 = datetime.datetime(2017, 1, 2)
+
+DATASET = {
+  'manuscript_version': [MANUSCRIPT_VERSION1, {**MANUSCRIPT_VERSION1, **MANUSCRIPT_ID_FIELDS2}],
+  'manuscript_keyword': [
+    {**MANUSCRIPT_ID_FIELDS1, 'keyword': KEYWORD1},
+    {**MANUSCRIPT_ID_FIELDS2, 'keyword': KEYWORD2}
+  ],
+  'manuscript_version_change_log': [
+    {**MANUSCRIPT_ID_FIELDS1, 'changed_timestamp': TIMESTAMP1},
+    {**MANUSCRIPT_ID_FIELDS2, 'changed_timestamp': TIMESTAMP1}
+  ],
+  'ml_manuscript_data': [
+    {**MANUSCRIPT_ID_FIELDS1, 'lda_docvec': [0.1, 0.9]},
+    {**MANUSCRIPT_ID_FIELDS2, 'lda_docvec': [0.8, 0.2]}
+  ]
+}
+
+@contextmanager
+def _populated_file_database(path, dataset):
+  db = Database(sqlalchemy.create_engine('sqlite:///' + path, echo=False))
+  db.update_schema()
+  insert_dataset(db, dataset)
+  yield db
+  db.close()
+
+def _keywords_by_version_id(df):
+  return {
+    version_id: sorted(df[df['version_id'] == version_id]['keyword'])
+    for version_id in set(df['version_id'])
+  }
+
+def _replace_keywords(db, version_id, keywords):
+  db.manuscript_keyword.delete_where(db.manuscript_keyword.table.version_id == version_id)
+  db.manuscript_keyword.create_list([
+    {'version_id': version_id, 'keyword': keyword} for keyword in keywords
+  ])
+
+@pytest.mark.slow
+class TestDatabaseSnapshot:
+  def test_should_read_same_frame_as_database(self):
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      assert snapshot.manuscript_keyword.read_frame().equals(db.manuscript_keyword.read_frame())
+      assert snapshot['manuscript_version'].read_frame().equals(
+        db.manuscript_version.read_frame()
+      )
+
+  def test_should_only_read_each_table_once(self):
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      assert snapshot.manuscript_keyword.read_frame() is snapshot.manuscript_keyword.read_frame()
+
+  def test_should_re_read_rows_of_changed_manuscript_versions(self):
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.manuscript_keyword.read_frame()
+      _replace_keywords(db, MANUSCRIPT_VERSION_ID1, [KEYWORD2, KEYWORD3])
+      log_changed_manuscript_versions(db, [MANUSCRIPT_VERSION_ID1], changed_timestamp=TIMESTAMP2)
+      db.commit()
+
+      refreshed_snapshot = snapshot.refreshed(db)
+      assert refreshed_snapshot.change_log_timestamp == TIMESTAMP2
+      assert _keywords_by_version_id(refreshed_snapshot.manuscript_keyword.read_frame()) == {
+        MANUSCRIPT_VERSION_ID1: [KEYWORD2, KEYWORD3],
+        MANUSCRIPT_VERSION_ID2: [KEYWORD2]
+      }
+      assert _keywords_by_version_id(snapshot.manuscript_keyword.read_frame()) == {
+        MANUSCRIPT_VERSION_ID1: [KEYWORD1],
+        MANUSCRIPT_VERSION_ID2: [KEYWORD2]
+      }
+
+  def test_should_reuse_unchanged_tables(self):
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      df = snapshot.manuscript_keyword.read_frame()
+      assert snapshot.refreshed(db).manuscript_keyword.read_frame() is df
+
+  def test_should_read_table_in_full_if_row_count_changed_without_change_log(self):
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.manuscript_keyword.read_frame()
+      _replace_keywords(db, MANUSCRIPT_VERSION_ID1, [KEYWORD2, KEYWORD3])
+      db.commit()
+
+      assert _keywords_by_version_id(
+        snapshot.refreshed(db).manuscript_keyword.read_frame()
+      )[MANUSCRIPT_VERSION_ID1] == [KEYWORD2, KEYWORD3]
+
+  def test_should_not_reuse_tables_without_change_log(self):
+    dataset = {**DATASET, 'manuscript_version_change_log': []}
+    with populated_in_memory_database(dataset) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      df = snapshot.manuscript_keyword.read_frame()
+      assert snapshot.refreshed(db).manuscript_keyword.read_frame() is not df
+
+  def test_should_read_docvecs_matrix(self):
+    with populated_in_memory_database(DATASET) as db:
+      version_ids, docvecs = DatabaseSnapshot.from_database(db).read_docvecs('lda_docvec')
+      assert list(version_ids) == [MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2]
+      assert docvecs.tolist() == [[0.1, 0.9], [0.8, 0.2]]
+
+  def test_should_read_prefetched_tables_concurrently(self, tmpdir):
+    with _populated_file_database(str(tmpdir.join('test.db')), DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.prefetch(['manuscript_keyword', 'manuscript_version'], max_workers=2)
+      assert snapshot.manuscript_keyword.read_frame().equals(db.manuscript_keyword.read_frame())
+      assert snapshot.manuscript_version.read_frame().equals(db.manuscript_version.read_frame())
+
+  def test_should_report_data_version_as_current_if_data_did_not_change(self, tmpdir):
+    with _populated_file_database(str(tmpdir.join('test.db')), DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.prefetch(['manuscript_keyword', 'manuscript_version'], max_workers=2)
+      assert snapshot.is_data_version_current()
+
+  def test_should_not_report_data_version_as_current_if_data_changed_while_reading(
+    self, tmpdir):
+
+    with _populated_file_database(str(tmpdir.join('test.db')), DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.prefetch(['manuscript_keyword', 'manuscript_version'], max_workers=2)
+      _replace_keywords(db, MANUSCRIPT_VERSION_ID1, [KEYWORD3])
+      db.commit()
+      assert not snapshot.is_data_version_current()
+
+  def test_should_read_tables_when_not_able_to_prefetch(self):
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.prefetch(['manuscript_keyword'])
+      assert snapshot.manuscript_keyword.read_frame().equals(db.manuscript_keyword.read_frame())
+
+@pytest.mark.slow
+class TestSavedDatabaseSnapshot:
+  def test_should_return_none_if_there_is_no_saved_snapshot(self, tmpdir):
+    with populated_in_memory_database(DATASET) as db:
+      assert DatabaseSnapshot.load(db, str(tmpdir.join('snapshot'))) is None
+
+  def test_should_load_saved_frames_and_docvecs(self, tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.manuscript_keyword.read_frame()
+      snapshot.manuscript_version.read_frame()
+      snapshot.read_docvecs('lda_docvec')
+      snapshot.save(path)
+
+      loaded_snapshot = DatabaseSnapshot.load(db, path)
+      assert loaded_snapshot.is_saved
+      assert loaded_snapshot.data_version == snapshot.data_version
+      assert loaded_snapshot.change_log_timestamp == TIMESTAMP1
+      for table_name in ['manuscript_keyword', 'manuscript_version']:
+        assert loaded_snapshot[table_name].read_frame().equals(db[table_name].read_frame())
+      version_ids, docvecs = loaded_snapshot.read_docvecs('lda_docvec')
+      assert list(version_ids) == [MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2]
+      assert isinstance(docvecs, np.memmap)
+      assert docvecs.tolist() == [[0.1, 0.9], [0.8, 0.2]]
+
+  def test_should_replace_previously_saved_snapshot(self, tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    with populated_in_memory_database(DATASET) as db:
+      DatabaseSnapshot.from_database(db).save(path)
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.manuscript_keyword.read_frame()
+      snapshot.save(path)
+      assert DatabaseSnapshot.load(db, path).manuscript_keyword.read_frame().equals(
+        db.manuscript_keyword.read_frame()
+      )
+
+  def test_should_use_saved_snapshot_if_data_version_matches(self, tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    with populated_in_memory_database(DATASET) as db:
+      DatabaseSnapshot.from_database(db).save(path)
+      assert DatabaseSnapshot.load_current_or_from_database(db, path).is_saved
+
+  def test_should_not_use_saved_snapshot_if_data_changed(self, tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    with populated_in_memory_database(DATASET) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.manuscript_keyword.read_frame()
+      snapshot.save(path)
+      _replace_keywords(db, MANUSCRIPT_VERSION_ID1, [KEYWORD2, KEYWORD3])
+      db.commit()
+
+      current_snapshot = DatabaseSnapshot.load_current_or_from_database(db, path)
+      assert not current_snapshot.is_saved
+      assert _keywords_by_version_id(
+        current_snapshot.manuscript_keyword.read_frame()
+      )[MANUSCRIPT_VERSION_ID1] == [KEYWORD2, KEYWORD3]
+
+  def test_should_not_use_saved_snapshot_if_data_was_updated_in_place(self, tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    with populated_in_memory_database({**DATASET, 'person': [PERSON1]}) as db:
+      snapshot = DatabaseSnapshot.from_database(db)
+      snapshot.person.read_frame()
+      snapshot.save(path)
+      # neither changing the row counts nor logging changed manuscript versions
+      db.person.update({**PERSON1, 'status': Person.Status.INACTIVE})
+      db.commit()
+
+      current_snapshot = DatabaseSnapshot.load_current_or_from_database(db, path)
+      assert not current_snapshot.is_saved
+      assert list(current_snapshot.person.read_frame()['status']) == [Person.Status.INACTIVE]
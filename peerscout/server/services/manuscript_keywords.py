@@ -1,67 +1,79 @@
 import logging
-from collections import Counter
 
-import sqlalchemy
+import numpy as np
 
 from peerscout.utils.collection import (
-  iter_flatten,
-  groupby_to_dict
+  groupby_columns_to_dict
 )
 
-from ...shared.database_schema import Person
-
 LOGGER = logging.getLogger(__name__)
 
+VERSION_ID = 'version_id'
+KEYWORD = 'keyword'
+
 def get_person_ids_of_person_keywords_scores(person_keyword_scores):
   return person_keyword_scores.keys()
 
+def _version_ids_by_lower_keyword(df):
+  # Note: we keep one entry per row (rather than unique version ids),
+  #   so that keywords only differing in case are counted the same way
+  #   as the previous database query did
+  return {
+    keyword: np.asarray(version_ids)
+    for keyword, version_ids in groupby_columns_to_dict(
+      [keyword.lower() for keyword in df[KEYWORD].values],
+      df[VERSION_ID].values
+    ).items()
+  }
+
 class ManuscriptKeywordService:
-  def __init__(self, db, valid_version_ids=None):
-    self._db = db
-    self._valid_version_ids = valid_version_ids
+  def __init__(self, df, valid_version_ids=None):
+    self._keywords_by_id_map = {
+      version_id: set(keywords)
+      for version_id, keywords in groupby_columns_to_dict(
+        df[VERSION_ID].values, df[KEYWORD].values
+      ).items()
+    }
+    if valid_version_ids is not None:
+      df = df[df[VERSION_ID].isin(valid_version_ids)]
+    self._all_keywords = set(df[KEYWORD].values)
+    self._version_ids_by_keyword_map = _version_ids_by_lower_keyword(df)
+    LOGGER.debug(
+      'indexed %d distinct keywords for %d manuscript versions',
+      len(self._version_ids_by_keyword_map), len(self._keywords_by_id_map)
+    )
 
   @staticmethod
   def from_database(db, valid_version_ids=None):
-    return ManuscriptKeywordService(db, valid_version_ids=valid_version_ids)
-
-  def _query(self, columns):
-    db = self._db
-    query = db.session.query(*columns)
-    if self._valid_version_ids is not None:
-      query = query.filter(
-        db.manuscript_keyword.table.version_id.in_(self._valid_version_ids)
-      )
-    return query
+    return ManuscriptKeywordService(
+      db.manuscript_keyword.read_frame(),
+      valid_version_ids=valid_version_ids
+    )
 
   def get_all_keywords(self):
-    return set(
-      r[0] for r in
-      self._query([self._db.manuscript_keyword.table.keyword]).distinct()
-    )
+    return set(self._all_keywords)
 
   def get_keyword_scores(self, keyword_list):
     if not keyword_list:
       return {}
     num_keywords = len(keyword_list)
-    db = self._db
-    return dict((keyword, count / num_keywords) for keyword, count in self._query([
-      db.manuscript_keyword.table.version_id,
-      sqlalchemy.func.count(db.manuscript_keyword.table.version_id)
-    ]).filter(
-      sqlalchemy.func.lower(db.manuscript_keyword.table.keyword).in_(
-        [s.lower() for s in keyword_list]
-      )
-    ).group_by(db.manuscript_keyword.table.version_id).all())
+    matching_version_ids_list = [
+      self._version_ids_by_keyword_map[keyword]
+      for keyword in set(s.lower() for s in keyword_list)
+      if keyword in self._version_ids_by_keyword_map
+    ]
+    if not matching_version_ids_list:
+      return {}
+    version_ids, counts = np.unique(
+      np.concatenate(matching_version_ids_list), return_counts=True
+    )
+    return {
+      version_id: count / num_keywords
+      for version_id, count in zip(version_ids.tolist(), counts.tolist())
+    }
 
   def get_keywords_by_ids(self, manuscript_version_ids):
-    db = self._db
-    return set(
-      r[0] for r in
-      db.session.query(db.manuscript_keyword.table.keyword)
-      .filter(
-        sqlalchemy.func.lower(db.manuscript_keyword.table.version_id).in_(
-          manuscript_version_ids
-        )
-      )
-      .distinct()
-    )
+    return set().union(*(
+      self._keywords_by_id_map.get(version_id, set())
+      for version_id in manuscript_version_ids
+    ))
@@ -109,6 +109,18 @@ class TestManuscriptKeywordService:
           {MANUSCRIPT_VERSION_ID1: 1.0}
         )
 
+    def test_should_not_require_database_after_loading(self):
+      dataset = {
+        'manuscript_version': [MANUSCRIPT_VERSION1],
+        'manuscript_keyword': [{**MANUSCRIPT_ID_FIELDS1, 'keyword': KEYWORD1}]
+      }
+      with create_manuscript_keyword_service(dataset) as manuscript_keyword_service:
+        pass
+      assert (
+        manuscript_keyword_service.get_keyword_scores([KEYWORD1]) ==
+        {MANUSCRIPT_VERSION_ID1: 1.0}
+      )
+
   class TestGetAllKeywords:
     def test_should_return_keywords_in_original_case(self):
       dataset = {
@@ -1,11 +1,14 @@
 import logging
 
-import sqlalchemy
+import numpy as np
 
-from peerscout.utils.collection import groupby_to_dict, applymap_dict
+from peerscout.utils.collection import groupby_columns_to_dict, applymap_dict
 
 LOGGER = logging.getLogger(__name__)
 
+VERSION_ID = 'version_id'
+PERSON_ID = 'person_id'
+
 class RelationshipTypes:
   AUTHOR = 'author'
   EDITOR = 'editor'
@@ -29,33 +32,53 @@ def get_person_ids_of_person_keywords_scores(person_keyword_scores):
 def _get_relationship_entity(db, relationship_type):
   return db[TABLE_NAME_BY_RELATIONSHIP_TYPE[relationship_type]]
 
-def _get_relationship_table(db, relationship_type):
-  return _get_relationship_entity(db, relationship_type).table
+def _read_relationship_frame(db, relationship_type):
+  return _get_relationship_entity(db, relationship_type).read_frame()[[VERSION_ID, PERSON_ID]]
 
 class ManuscriptPersonRelationshipService:
-  def __init__(self, db):
-    self._db = db
+  def __init__(self, df_by_relationship_type):
+    # person ids are stored once, the adjacency lists only refer to their index
+    all_person_ids = [df[PERSON_ID].values for df in df_by_relationship_type.values()]
+    self._person_ids, person_indices = np.unique(
+      np.concatenate(all_person_ids) if all_person_ids else np.array([], dtype=object),
+      return_inverse=True
+    )
+    self._person_indices_by_version_id_map_by_relationship_type = {}
+    offset = 0
+    for relationship_type, df in df_by_relationship_type.items():
+      self._person_indices_by_version_id_map_by_relationship_type[relationship_type] = (
+        applymap_dict(groupby_columns_to_dict(
+          df[VERSION_ID].values,
+          person_indices[offset:offset + len(df)]
+        ), lambda indices: np.asarray(indices, dtype=np.int32))
+      )
+      offset += len(df)
+    LOGGER.debug(
+      'indexed relationships: %s',
+      applymap_dict(self._person_indices_by_version_id_map_by_relationship_type, len)
+    )
+
+  @staticmethod
+  def from_database(db):
+    return ManuscriptPersonRelationshipService({
+      relationship_type: _read_relationship_frame(db, relationship_type)
+      for relationship_type in TABLE_NAME_BY_RELATIONSHIP_TYPE.keys()
+    })
 
   def get_person_ids_by_version_id_for_relationship_types(self, version_ids, relationship_types):
     if not relationship_types or not version_ids:
       return {}
-    db = self._db
-    relationship_tables = [
-      _get_relationship_table(db, relationship_type)
+    person_indices_by_version_id_maps = [
+      self._person_indices_by_version_id_map_by_relationship_type[relationship_type]
       for relationship_type in relationship_types
     ]
-    queries = [
-      db.session.query(
-        relationship_table.version_id,
-        relationship_table.person_id
-      ).filter(
-        relationship_table.version_id.in_(version_ids)
-      )
-      for relationship_table in relationship_tables
-    ]
-    q = queries[0] if len(queries) == 1 else db.session.query(sqlalchemy.union(*queries))
-    return applymap_dict(groupby_to_dict(
-      q.all(),
-      lambda row: row[0],
-      lambda row: row[1]
-    ), set)
+    result = {}
+    for version_id in version_ids:
+      person_indices_list = [
+        m[version_id] for m in person_indices_by_version_id_maps if version_id in m
+      ]
+      if person_indices_list:
+        result[version_id] = set(
+          self._person_ids[np.concatenate(person_indices_list)].tolist()
+        )
+    return result
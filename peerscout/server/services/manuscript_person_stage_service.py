@@ -1,31 +1,41 @@
 import logging
 
-import sqlalchemy
-
 from peerscout.utils.collection import groupby_to_dict, applymap_dict
 
 LOGGER = logging.getLogger(__name__)
 
+VERSION_ID = 'version_id'
+PERSON_ID = 'person_id'
+STAGE_NAME = 'stage_name'
+
 class StageNames:
   REVIEW_RECEIVED = 'Review Received'
 
 class ManuscriptPersonStageService:
-  def __init__(self, db):
-    self._db = db
+  def __init__(self, df):
+    # df: manuscript stage frame (e.g. as already loaded by RecommendReviewers)
+    self._person_ids_by_stage_name_and_version_id_map = applymap_dict(groupby_to_dict(
+      zip(df[STAGE_NAME].values, df[VERSION_ID].values, df[PERSON_ID].values),
+      lambda row: (row[0], row[1]),
+      lambda row: row[2]
+    ), frozenset)
+    LOGGER.debug(
+      'indexed stages: %d', len(self._person_ids_by_stage_name_and_version_id_map)
+    )
+
+  @staticmethod
+  def from_database(db):
+    return ManuscriptPersonStageService(db.manuscript_stage.read_frame())
 
   def get_person_ids_by_version_id_for_stage_names(self, version_ids, stage_names):
-    db = self._db
-    stage_table = db.manuscript_stage.table
-    return applymap_dict(groupby_to_dict(
-      db.session.query(
-        stage_table.version_id,
-        stage_table.person_id
-      ).filter(
-        sqlalchemy.and_(
-          stage_table.version_id.in_(version_ids),
-          stage_table.stage_name.in_(stage_names)
+    result = {}
+    for version_id in version_ids:
+      person_ids = set().union(*(
+        self._person_ids_by_stage_name_and_version_id_map.get(
+          (stage_name, version_id), frozenset()
         )
-      ).all(),
-      lambda row: row[0],
-      lambda row: row[1]
-    ), set)
+        for stage_name in stage_names
+      ))
+      if person_ids:
+        result[version_id] = person_ids
+    return result
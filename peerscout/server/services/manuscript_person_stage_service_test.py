@@ -24,7 +24,7 @@ KEYWORD2 = 'keyword2'
 @contextmanager
 def create_manuscript_person_stage_service(dataset) -> ManuscriptPersonStageService:
   with populated_in_memory_database(dataset) as db:
-    yield ManuscriptPersonStageService(db)
+    yield ManuscriptPersonStageService.from_database(db)
 
 @pytest.mark.slow
 class TestManuscriptPersonStageService:
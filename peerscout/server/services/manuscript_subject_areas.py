@@ -1,6 +1,5 @@
 from peerscout.utils.collection import (
-  iter_flatten,
-  groupby_to_dict,
+  groupby_columns_to_dict,
   applymap_dict
 )
 
@@ -8,6 +7,10 @@ class ManuscriptSubjectAreaService:
   def __init__(self, df):
     self._df = df
     self._subject_areas_by_id_map = df.groupby('version_id')['subject_area'].apply(sorted).to_dict()
+    self._ids_by_lower_subject_area_map = applymap_dict(groupby_columns_to_dict(
+      [subject_area.lower() for subject_area in df['subject_area'].values],
+      df['version_id'].values
+    ), frozenset)
 
   @staticmethod
   def from_database(db, valid_version_ids=None):
@@ -17,10 +20,14 @@ class ManuscriptSubjectAreaService:
     return ManuscriptSubjectAreaService(df)
 
   def get_ids_by_subject_areas(self, subject_areas):
-    df = self._df[self._df['subject_area'].str.lower().isin(
-      [s.lower() for s in subject_areas]
-    )]
-    return set(df['version_id'])
+    # the returned sets are shared and must not be modified by the caller
+    ids_list = [
+      self._ids_by_lower_subject_area_map.get(s.lower(), frozenset())
+      for s in set(subject_areas)
+    ]
+    if len(ids_list) == 1:
+      return ids_list[0]
+    return frozenset().union(*ids_list)
 
   def get_subject_areas_by_id(self, manuscript_version_id):
     return self._subject_areas_by_id_map.get(manuscript_version_id, [])
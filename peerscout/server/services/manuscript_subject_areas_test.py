@@ -6,8 +6,8 @@ from ...shared.database import populated_in_memory_database
 
 from .test_data import (
   MANUSCRIPT_VERSION1,
-  MANUSCRIPT_VERSION_ID1,
-  MANUSCRIPT_ID_FIELDS1
+  MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2,
+  MANUSCRIPT_ID_FIELDS1, MANUSCRIPT_ID_FIELDS2
 )
 
 from .manuscript_subject_areas import (
@@ -83,6 +83,21 @@ class TestManuscriptSubjectAreaService:
           manuscript_subject_area_service.get_ids_by_subject_areas([SUBJECT_AREA1]) ==
           set()
         )
+
+    def test_should_match_any_of_multiple_subject_areas(self):
+      dataset = {
+        'manuscript_version': [MANUSCRIPT_VERSION1],
+        'manuscript_subject_area': [
+          {**MANUSCRIPT_ID_FIELDS1, 'subject_area': SUBJECT_AREA1},
+          {**MANUSCRIPT_ID_FIELDS2, 'subject_area': SUBJECT_AREA2}
+        ]
+      }
+      with create_manuscript_subject_area_service(dataset) as manuscript_subject_area_service:
+        assert (
+          manuscript_subject_area_service.get_ids_by_subject_areas(
+            [SUBJECT_AREA1, SUBJECT_AREA2.upper()]
+          ) == {MANUSCRIPT_VERSION_ID1, MANUSCRIPT_VERSION_ID2}
+        )
   class TestGetSubjectAreasById:
     def test_should_return_single_subject_area_of_matching_id(self):
       dataset = {
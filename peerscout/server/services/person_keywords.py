@@ -1,12 +1,9 @@
 import logging
 from collections import Counter
 
-import sqlalchemy
-
 from peerscout.utils.collection import (
   iter_flatten,
-  groupby_to_dict,
-  applymap_dict
+  groupby_to_dict
 )
 
 from ...shared.database_schema import Person
@@ -16,40 +13,47 @@ LOGGER = logging.getLogger(__name__)
 def get_person_ids_of_person_keywords_scores(person_keyword_scores):
   return person_keyword_scores.keys()
 
+def _read_active_person_keywords(db):
+  person_df = db.person.read_frame()
+  active_person_ids = set(person_df.index[person_df['status'] == Person.Status.ACTIVE])
+  person_keyword_df = db.person_keyword.read_frame()
+  return [
+    (person_id, keyword)
+    for person_id, keyword in zip(
+      person_keyword_df['person_id'].values, person_keyword_df['keyword'].values
+    )
+    if person_id in active_person_ids
+  ]
+
 class PersonKeywordService:
-  def __init__(self, db):
-    self._db = db
+  def __init__(self, person_keywords):
+    # person_keywords: list of (person_id, keyword) of active persons
+    self._all_keywords = set(keyword for _, keyword in person_keywords)
+    self._person_ids_by_keyword_map = groupby_to_dict(
+      person_keywords,
+      lambda row: row[1].lower(),
+      lambda row: row[0]
+    )
+    LOGGER.debug(
+      'indexed %d distinct person keywords', len(self._person_ids_by_keyword_map)
+    )
 
   @staticmethod
   def from_database(db):
-    return PersonKeywordService(db)
-
-  def _query(self, columns):
-    db = self._db
-    return db.session.query(*columns).join(
-      db.person.table,
-      sqlalchemy.and_(
-        db.person.table.person_id == db.person_keyword.table.person_id,
-        db.person.table.status == Person.Status.ACTIVE
-      )
-    )
+    return PersonKeywordService(_read_active_person_keywords(db))
 
   def get_all_keywords(self):
-    return set(
-      r[0] for r in
-      self._query([self._db.person_keyword.table.keyword]).distinct().all()
-    )
+    return set(self._all_keywords)
 
   def get_keyword_scores(self, keyword_list):
     if not keyword_list:
       return {}
     num_keywords = len(keyword_list)
-    db = self._db
-    return dict((keyword, count / num_keywords) for keyword, count in self._query([
-      db.person_keyword.table.person_id,
-      sqlalchemy.func.count(db.person_keyword.table.person_id)
-    ]).filter(
-      sqlalchemy.func.lower(db.person_keyword.table.keyword).in_(
-        [s.lower() for s in keyword_list]
-      )
-    ).group_by(db.person_keyword.table.person_id).all())
+    counts = Counter(iter_flatten(
+      self._person_ids_by_keyword_map.get(keyword, [])
+      for keyword in set(s.lower() for s in keyword_list)
+    ))
+    return {
+      person_id: count / num_keywords
+      for person_id, count in counts.items()
+    }
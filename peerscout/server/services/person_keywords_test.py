@@ -96,6 +96,18 @@ class TestPersonKeywordService:
           {PERSON_ID1: 1.0}
         )
 
+    def test_should_not_require_database_after_loading(self):
+      dataset = {
+        'person': [PERSON1],
+        'person_keyword': [{PERSON_ID: PERSON_ID1, 'keyword': KEYWORD1}]
+      }
+      with create_person_keyword_service(dataset) as person_keyword_service:
+        pass
+      assert (
+        person_keyword_service.get_keyword_scores([KEYWORD1]) ==
+        {PERSON_ID1: 1.0}
+      )
+
   class TestGetAllKeywords:
     def test_should_return_keywords_in_original_case(self):
       dataset = {
@@ -1,82 +1,75 @@
 import logging
-from collections import Counter
-
-import sqlalchemy
 
 from peerscout.utils.collection import (
   iter_flatten,
-  groupby_to_dict
+  groupby_to_dict,
+  applymap_dict
 )
 
 from ...shared.database_schema import Person
 
 LOGGER = logging.getLogger(__name__)
 
+def _read_active_person_roles(db):
+  person_df = db.person.read_frame()
+  active_person_df = person_df[person_df['status'] == Person.Status.ACTIVE]
+  email_by_person_id = {
+    person_id: email if isinstance(email, str) else None
+    for person_id, email in zip(active_person_df.index, active_person_df['email'].values)
+  }
+  person_role_df = db.person_role.read_frame()
+  return [
+    (person_id, email_by_person_id[person_id], role)
+    for person_id, role in zip(person_role_df['person_id'].values, person_role_df['role'].values)
+    if person_id in email_by_person_id
+  ]
+
 class PersonRoleService:
-  def __init__(self, db):
-    self._db = db
+  def __init__(self, person_roles):
+    # person_roles: list of (person_id, email, role) of active persons
+    self._person_ids_by_role_map = applymap_dict(groupby_to_dict(
+      person_roles,
+      lambda row: row[2],
+      lambda row: row[0]
+    ), frozenset)
+    self._roles_by_person_id_map = applymap_dict(groupby_to_dict(
+      person_roles,
+      lambda row: row[0],
+      lambda row: row[2]
+    ), frozenset)
+    self._person_ids_by_email_map = applymap_dict(groupby_to_dict(
+      [row for row in person_roles if row[1] is not None],
+      lambda row: row[1],
+      lambda row: row[0]
+    ), frozenset)
+    LOGGER.debug(
+      'indexed roles: %s', applymap_dict(self._person_ids_by_role_map, len)
+    )
 
   @staticmethod
   def from_database(db):
-    return PersonRoleService(db)
+    return PersonRoleService(_read_active_person_roles(db))
 
   def filter_person_ids_by_role(self, person_ids, role):
     if not role:
       return person_ids
-    db = self._db
-    raw_result = db.session.query(
-      db.person_role.table.person_id
-    ).join(
-      db.person.table,
-      sqlalchemy.and_(
-        db.person.table.person_id == db.person_role.table.person_id,
-        db.person.table.status == Person.Status.ACTIVE
-      )
-    ).filter(
-      sqlalchemy.and_(
-        db.person_role.table.person_id.in_(person_ids),
-        db.person_role.table.role == role
-      )
-    ).all()
-    result = set(r[0] for r in raw_result)
+    result = set(person_ids) & self._person_ids_by_role_map.get(role, frozenset())
     LOGGER.debug('filtered person ids by role: %d -> %d (role=%s)', len(person_ids), len(result), role)
     return result
 
   def user_has_role_by_email(self, email, role):
     if not role:
       return False
-    db = self._db
-    result = db.session.query(
-      sqlalchemy.func.count(db.person.table.person_id)
-    ).filter(
-      sqlalchemy.and_(
-        db.person.table.person_id == db.person_role.table.person_id,
-        db.person.table.status == Person.Status.ACTIVE,
-        db.person.table.email == email
-      )
-    ).join(
-      db.person_role.table,
-      sqlalchemy.and_(
-        db.person_role.table.person_id == db.person.table.person_id,
-        db.person_role.table.role == role,
-      )
-    ).scalar() > 0
+    result = not self._person_ids_by_email_map.get(email, frozenset()).isdisjoint(
+      self._person_ids_by_role_map.get(role, frozenset())
+    )
     LOGGER.debug('user_has_role_by_email: email=%s, role=%s -> %s', email, role, result)
     return result
 
   def get_user_roles_by_email(self, email):
-    db = self._db
-    roles = set(x[0] for x in db.session.query(
-      db.person_role.table.role
-    ).select_from(db.person.table).filter(
-      sqlalchemy.and_(
-        db.person.table.person_id == db.person_role.table.person_id,
-        db.person.table.status == Person.Status.ACTIVE,
-        db.person.table.email == email
-      )
-    ).join(
-      db.person_role.table,
-      db.person_role.table.person_id == db.person.table.person_id
-    ).all())
+    roles = set(iter_flatten(
+      self._roles_by_person_id_map.get(person_id, frozenset())
+      for person_id in self._person_ids_by_email_map.get(email, frozenset())
+    ))
     LOGGER.debug('get_user_roles_by_email: email=%s, roles=%s', email, roles)
     return roles
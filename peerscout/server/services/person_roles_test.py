@@ -127,3 +127,12 @@ class TestPersonRoleService:
       }
       with create_person_role_service(dataset) as person_role_service:
         assert person_role_service.get_user_roles_by_email(email=EMAIL_2) == set()
+
+    def test_should_not_return_roles_of_inactive_user(self):
+      dataset = {
+        'person': [{**PERSON1, 'email': EMAIL_1, 'status': Person.Status.INACTIVE}],
+        'person_role': [{PERSON_ID: PERSON_ID1, 'role': ROLE_1}]
+      }
+      with create_person_role_service(dataset) as person_role_service:
+        assert person_role_service.get_user_roles_by_email(email=EMAIL_1) == set()
+        assert person_role_service.user_has_role_by_email(email=EMAIL_1, role=ROLE_1) is False
@@ -0,0 +1,132 @@
+import logging
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+LOGGER = logging.getLogger(__name__)
+
+SIMILARITY_WEIGHT = 0.5
+
+def calculate_combined_scores(keyword_scores, similarity_scores):
+  # array version of RecommendReviewers.calculate_combined_score
+  return np.minimum(1.0, keyword_scores + np.nan_to_num(similarity_scores) * SIMILARITY_WEIGHT)
+
+def _nan_to_none(values):
+  return [None if np.isnan(x) else x for x in values.tolist()]
+
+class ReviewerScoringEngine:
+  def __init__(self, version_ids):
+    self._version_index_by_id = {
+      version_id: i for i, version_id in enumerate(version_ids)
+    }
+    self._version_count = len(self._version_index_by_id)
+
+  def _manuscript_score_arrays(self, keyword_score_by_version_id, similarity_by_version_id):
+    # manuscripts without a score are marked with nan combined score
+    keyword_scores = np.zeros(self._version_count)
+    similarity_scores = np.full(self._version_count, np.nan)
+    has_score = np.zeros(self._version_count, dtype=bool)
+    for scores, score_by_version_id in [
+      (keyword_scores, keyword_score_by_version_id),
+      (similarity_scores, similarity_by_version_id)]:
+
+      indices_and_values = [
+        (self._version_index_by_id[version_id], value)
+        for version_id, value in score_by_version_id.items()
+        if version_id in self._version_index_by_id
+      ]
+      if indices_and_values:
+        indices, values = zip(*indices_and_values)
+        indices = np.asarray(indices)
+        scores[indices] = np.asarray(
+          [np.nan if value is None else value for value in values], dtype=float
+        )
+        has_score[indices] = True
+    combined_scores = np.where(
+      has_score, calculate_combined_scores(keyword_scores, similarity_scores), np.nan
+    )
+    return combined_scores, keyword_scores, similarity_scores
+
+  def _manuscript_ranks(self, combined_scores, keyword_scores, similarity_scores):
+    # rank 1..n by (combined, keyword, similarity), 0 for manuscripts without score
+    # (a missing similarity ranks lowest)
+    scored_indices = np.flatnonzero(~np.isnan(combined_scores))
+    scored_similarity_scores = similarity_scores[scored_indices]
+    order = scored_indices[np.lexsort((
+      np.where(np.isnan(scored_similarity_scores), -np.inf, scored_similarity_scores),
+      keyword_scores[scored_indices],
+      combined_scores[scored_indices]
+    ))]
+    ranks = np.zeros(self._version_count, dtype=np.int64)
+    ranks[order] = np.arange(1, len(order) + 1)
+    return ranks, order
+
+  def _incidence_matrix(self, person_ids, person_ids_by_version_id, values_by_version_index):
+    person_index_by_id = {person_id: i for i, person_id in enumerate(person_ids)}
+    rows = []
+    columns = []
+    for version_id, version_person_ids in person_ids_by_version_id.items():
+      version_index = self._version_index_by_id.get(version_id)
+      if version_index is None:
+        continue
+      for person_id in version_person_ids:
+        person_index = person_index_by_id.get(person_id)
+        if person_index is not None:
+          rows.append(person_index)
+          columns.append(version_index)
+    rows = np.asarray(rows, dtype=np.int64)
+    columns = np.asarray(columns, dtype=np.int64)
+    return csr_matrix(
+      (values_by_version_index[columns], (rows, columns)),
+      shape=(len(person_ids), self._version_count)
+    )
+
+  def score_reviewers(
+    self, person_ids, person_ids_by_version_id,
+    keyword_score_by_person_id, keyword_score_by_version_id, similarity_by_version_id):
+    """Returns the reviewer scores (keyword, similarity, combined) for each of the person ids.
+
+    The scores of a person are based on the person keyword score and the
+    best scoring manuscript the person is related to (via person_ids_by_version_id).
+    """
+
+    person_ids = list(person_ids)
+    if not person_ids:
+      return []
+    combined_scores, keyword_scores, similarity_scores = self._manuscript_score_arrays(
+      keyword_score_by_version_id, similarity_by_version_id
+    )
+    ranks, order = self._manuscript_ranks(combined_scores, keyword_scores, similarity_scores)
+
+    if len(order) > 0:
+      best_ranks = self._incidence_matrix(
+        person_ids, person_ids_by_version_id, ranks
+      ).max(axis=1).toarray().ravel()
+    else:
+      best_ranks = np.zeros(len(person_ids), dtype=np.int64)
+    has_best = best_ranks > 0
+    best_indices = order[best_ranks[has_best] - 1]
+    best_keyword_scores = np.zeros(len(person_ids))
+    best_keyword_scores[has_best] = keyword_scores[best_indices]
+    best_similarity_scores = np.full(len(person_ids), np.nan)
+    best_similarity_scores[has_best] = similarity_scores[best_indices]
+    person_keyword_scores = np.asarray([
+      keyword_score_by_person_id.get(person_id) or 0 for person_id in person_ids
+    ], dtype=float)
+
+    reviewer_keyword_scores = np.maximum(person_keyword_scores, best_keyword_scores)
+    reviewer_combined_scores = calculate_combined_scores(
+      reviewer_keyword_scores, best_similarity_scores
+    )
+    return [
+      {
+        'keyword': keyword,
+        'similarity': similarity,
+        'combined': combined
+      }
+      for keyword, similarity, combined in zip(
+        reviewer_keyword_scores.tolist(),
+        _nan_to_none(best_similarity_scores),
+        reviewer_combined_scores.tolist()
+      )
+    ]
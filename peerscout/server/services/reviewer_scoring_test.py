@@ -0,0 +1,90 @@
+import random
+
+from .RecommendReviewers import (
+  get_reviewer_score,
+  score_by_manuscript,
+  sorted_manuscript_scores_descending
+)
+
+from .reviewer_scoring import ReviewerScoringEngine
+
+VERSION_ID = 'version_id'
+
+VERSION_ID1 = 'version1'
+VERSION_ID2 = 'version2'
+
+PERSON_ID1 = 'person1'
+PERSON_ID2 = 'person2'
+
+def _reference_reviewer_scores(
+  person_ids, person_ids_by_version_id,
+  keyword_score_by_person_id, keyword_score_by_version_id, similarity_by_version_id):
+
+  result = []
+  for person_id in person_ids:
+    manuscript_scores = [
+      score_by_manuscript(
+        {VERSION_ID: version_id},
+        keyword=keyword_score_by_version_id.get(version_id, 0),
+        similarity=similarity_by_version_id.get(version_id)
+      )
+      for version_id, version_person_ids in person_ids_by_version_id.items()
+      if person_id in version_person_ids and (
+        version_id in keyword_score_by_version_id or version_id in similarity_by_version_id
+      )
+    ]
+    best_score = (sorted_manuscript_scores_descending(manuscript_scores) or [{}])[0]
+    result.append(get_reviewer_score(keyword_score_by_person_id.get(person_id), best_score))
+  return result
+
+class TestReviewerScoringEngine:
+  def test_should_return_empty_list_without_person_ids(self):
+    engine = ReviewerScoringEngine([VERSION_ID1])
+    assert engine.score_reviewers([], {}, {}, {}, {}) == []
+
+  def test_should_use_person_keyword_score_without_manuscripts(self):
+    engine = ReviewerScoringEngine([])
+    assert engine.score_reviewers([PERSON_ID1], {}, {PERSON_ID1: 0.5}, {}, {}) == [{
+      'keyword': 0.5, 'similarity': None, 'combined': 0.5
+    }]
+
+  def test_should_use_best_manuscript_score(self):
+    engine = ReviewerScoringEngine([VERSION_ID1, VERSION_ID2])
+    assert engine.score_reviewers(
+      [PERSON_ID1, PERSON_ID2],
+      {VERSION_ID1: {PERSON_ID1}, VERSION_ID2: {PERSON_ID1, PERSON_ID2}},
+      {},
+      {VERSION_ID1: 0.5},
+      {VERSION_ID2: 0.8}
+    ) == [{
+      'keyword': 0.5, 'similarity': None, 'combined': 0.5
+    }, {
+      'keyword': 0.0, 'similarity': 0.8, 'combined': 0.4
+    }]
+
+  def test_should_match_reference_implementation(self):
+    rnd = random.Random(123)
+    version_ids = ['version%d' % i for i in range(50)]
+    person_ids = ['person%d' % i for i in range(30)]
+    person_ids_by_version_id = {
+      version_id: set(rnd.sample(person_ids, rnd.randint(0, 5)))
+      for version_id in version_ids
+    }
+    keyword_score_by_person_id = {
+      person_id: rnd.choice([0.5, 1.0])
+      for person_id in rnd.sample(person_ids, 10)
+    }
+    keyword_score_by_version_id = {
+      version_id: rnd.choice([0.5, 1.0])
+      for version_id in rnd.sample(version_ids, 20)
+    }
+    similarity_by_version_id = {
+      version_id: rnd.choice([0.1, 0.5, 0.9])
+      for version_id in rnd.sample(version_ids, 30)
+    }
+    engine = ReviewerScoringEngine(version_ids)
+    args = (
+      person_ids, person_ids_by_version_id,
+      keyword_score_by_person_id, keyword_score_by_version_id, similarity_by_version_id
+    )
+    assert engine.score_reviewers(*args) == _reference_reviewer_scores(*args)
@@ -11,6 +11,7 @@ from sqlalchemy.orm import load_only
 
 from .database_schema import (
   Base,
+  DataGeneration,
   SCHEMA_VERSION,
   TABLES
 )
@@ -48,6 +49,35 @@ def db_connect(user, password, db, host='localhost', port=5432):
   )
 
 DEFAULT_SCHEMA_VERSION_ID = 'default'
+DEFAULT_DATA_GENERATION_ID = 'default'
+
+DATA_CHANGED_SESSION_INFO_KEY = 'data_changed'
+
+def _increment_data_generation(session):
+  updated_count = session.query(DataGeneration).filter(
+    DataGeneration.data_generation_id == DEFAULT_DATA_GENERATION_ID
+  ).update({DataGeneration.generation: DataGeneration.generation + 1}, synchronize_session=False)
+  if not updated_count:
+    session.add(DataGeneration(data_generation_id=DEFAULT_DATA_GENERATION_ID, generation=1))
+    session.flush()
+
+def _mark_data_changed(session):
+  # the data generation is incremented with the next commit (or right away in autocommit mode)
+  if session.autocommit:
+    _increment_data_generation(session)
+  else:
+    session.info[DATA_CHANGED_SESSION_INFO_KEY] = True
+
+def _commit_session(session):
+  if session.info.pop(DATA_CHANGED_SESSION_INFO_KEY, False):
+    _increment_data_generation(session)
+  session.commit()
+
+def get_data_generation(db):
+  # changes whenever modified data was committed (via the database tables)
+  return db.session.query(DataGeneration.generation).filter(
+    DataGeneration.data_generation_id == DEFAULT_DATA_GENERATION_ID
+  ).scalar() or 0
 
 class Entity(object):
   def __init__(self, session, table):
@@ -63,7 +93,7 @@ class Entity(object):
 
   def _auto_commit_if_enabled(self):
     if self.auto_commit:
-      self.session.commit()
+      _commit_session(self.session)
 
   def _assert_single_primary_key(self):
     if len(self.primary_key) != 1:
@@ -80,10 +110,12 @@ class Entity(object):
 
   def delete_all(self):
     self.session.query(self.table).delete()
+    _mark_data_changed(self.session)
     self._auto_commit_if_enabled()
 
   def delete_where(self, *conditions):
     self.session.query(self.table).filter(*conditions).delete(synchronize_session=False)
+    _mark_data_changed(self.session)
     self._auto_commit_if_enabled()
 
   def _get_instance(self, *args, **kwargs):
@@ -103,11 +135,13 @@ class Entity(object):
   def create(self, *args, **kwargs):
     instance = self._get_instance(*args, **kwargs)
     self.session.add(instance)
+    _mark_data_changed(self.session)
     self._auto_commit_if_enabled()
 
   def update(self, *args, **kwargs):
     instance = self._get_instance(*args, **kwargs)
     self.session.merge(instance)
+    _mark_data_changed(self.session)
     self._auto_commit_if_enabled()
 
   def update_or_create(self, *args, **kwargs):
@@ -117,12 +151,15 @@ class Entity(object):
       self.session.merge(instance)
     else:
       self.session.add(instance)
+    _mark_data_changed(self.session)
 
   def create_list(self, objs):
     self.session.bulk_insert_mappings(self.table, objs)
+    _mark_data_changed(self.session)
 
   def update_list(self, objs):
     self.session.bulk_update_mappings(self.table, objs)
+    _mark_data_changed(self.session)
 
   def update_or_create_list(self, objs):
     if len(self.primary_key) != 1:
@@ -162,14 +199,33 @@ class Entity(object):
       id_field.in_(ids)
     ).all()])
 
-  def read_frame(self):
+  def read_frame(self, connection=None):
     primary_key = self.primary_key
     return pd.read_sql_table(
       self.table.__tablename__,
-      self.session.get_bind(),
+      connection if connection is not None else self.session.get_bind(),
       index_col=primary_key[0].name if len(primary_key) == 1 else None
     )
 
+  def read_frame_where_in(self, column_name, values, chunk_size=1000):
+    # same shape as read_frame, but only the rows with the column matching any of the values
+    primary_key = self.primary_key
+    column = getattr(self.table, column_name)
+    values = sorted(set(values))
+    columns = [c.name for c in sqlalchemy.inspection.inspect(self.table).columns]
+    df = pd.concat([
+      pd.read_sql(
+        self.session.query(self.table.__table__).filter(
+          column.in_(values[start:start + chunk_size])
+        ).statement,
+        self.session.get_bind()
+      )
+      for start in range(0, len(values), chunk_size)
+    ] or [pd.DataFrame(columns=columns)], ignore_index=True)
+    if len(primary_key) == 1:
+      df = df.set_index(primary_key[0].name)
+    return df
+
   def write_frame(self, df, **kwargs):
     df.to_sql(
       self.table.__tablename__,
@@ -177,6 +233,7 @@ class Entity(object):
       if_exists='append',
       **kwargs
     )
+    _mark_data_changed(self.session)
 
   def count(self):
     return self.session.query(self.table).count()
@@ -256,9 +313,10 @@ class Database(object):
 
   def add(self, entity):
     self.session.add(entity)
+    _mark_data_changed(self.session)
 
   def commit(self):
-    self.session.commit()
+    _commit_session(self.session)
 
   def is_auto_commit(self):
     return self.session.autocommit
@@ -275,8 +333,9 @@ class Database(object):
     else:
       try:
         yield self.session
-        self.session.commit()
+        _commit_session(self.session)
       except:
+        self.session.info.pop(DATA_CHANGED_SESSION_INFO_KEY, None)
         self.session.rollback()
         raise
 
@@ -327,6 +386,17 @@ def empty_in_memory_database(autocommit=False):
   yield db
   db.close()
 
+def log_changed_manuscript_versions(db, version_ids, changed_timestamp=None):
+  version_ids = sorted(set(version_ids))
+  if not version_ids:
+    return
+  if changed_timestamp is None:
+    changed_timestamp = datetime.datetime.now()
+  db.manuscript_version_change_log.update_or_create_list([
+    {'version_id': version_id, 'changed_timestamp': changed_timestamp}
+    for version_id in version_ids
+  ])
+
 def insert_dataset(db, dataset):
   sorted_table_names = db.sorted_table_names()
   unknown_table_names = set(dataset.keys()) - set(sorted_table_names)
@@ -30,6 +30,20 @@ class ImportProcessed(Base):
   version = Column(Integer)
   when = Column(TIMESTAMP)
 
+# incremented whenever data is modified (used to detect any changes, e.g. for saved snapshots)
+class DataGeneration(Base):
+  __tablename__ = "data_generation"
+
+  data_generation_id = Column(String, primary_key=True)
+  generation = Column(Integer, nullable=False)
+
+# manuscript versions that were created or updated (used for incremental reloads)
+class ManuscriptVersionChangeLog(Base):
+  __tablename__ = "manuscript_version_change_log"
+
+  version_id = Column(String, primary_key=True)
+  changed_timestamp = Column(TIMESTAMP, nullable=False)
+
 class Person(Base):
   __tablename__ = "person"
 
@@ -221,13 +235,16 @@ class ML_ModelData(Base):
 
   LDA_MODEL_ID = 'lda'
   DOC2VEC_MODEL_ID = 'doc2vec'
+  SIMILARITY_INDEX_MODEL_ID = 'similarity_index'
 
   model_id = Column(String, primary_key=True)
   data = Column(LargeBinary)
 
 TABLES = [
   SchemaVersion,
+  DataGeneration,
   ImportProcessed,
+  ManuscriptVersionChangeLog,
   Person,
   PersonDatesNotAvailable,
   PersonKeyword,
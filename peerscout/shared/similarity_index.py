@@ -0,0 +1,124 @@
+import logging
+import pickle
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_N_ITERATIONS = 10
+ASSIGNMENT_BATCH_SIZE = 10000
+
+def normalize_vectors(vectors):
+  vectors = np.asarray(vectors, dtype=np.float32)
+  if vectors.ndim == 1:
+    vectors = vectors.reshape(1, -1)
+  norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+  norms[norms == 0] = 1
+  return np.ascontiguousarray(vectors / norms)
+
+def combine_docvecs(lda_docvecs, doc2vec_docvecs):
+  # the dot product of combined vectors is the mean cosine similarity of both docvecs
+  return np.hstack([
+    normalize_vectors(lda_docvecs), normalize_vectors(doc2vec_docvecs)
+  ]) / np.float32(np.sqrt(2))
+
+def _nearest_centroids(vectors, centroids):
+  return np.concatenate([
+    np.argmax(vectors[start:start + ASSIGNMENT_BATCH_SIZE].dot(centroids.T), axis=1)
+    for start in range(0, len(vectors), ASSIGNMENT_BATCH_SIZE)
+  ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+class SimilarityIndex:
+  """Inverted file (IVF) index, grouping vectors into lists by their most similar centroid.
+
+  Searches only need to consider the vectors of the lists with the centroids most similar
+  to the query. Probing more lists increases the recall, at the cost of latency.
+  """
+
+  def __init__(self, keys, centroids, list_offsets):
+    # keys are ordered by list, the keys of list i are keys[list_offsets[i]:list_offsets[i + 1]]
+    self.keys = keys
+    self.centroids = centroids
+    self.list_offsets = list_offsets
+
+  @property
+  def list_count(self):
+    return len(self.centroids)
+
+  @staticmethod
+  def build(keys, vectors, n_lists=None, n_iterations=DEFAULT_N_ITERATIONS, random_state=0):
+    # spherical k-means, vectors are expected to be normalised
+    keys = np.asarray(keys, dtype=object)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if n_lists is None:
+      n_lists = int(np.sqrt(len(vectors)))
+    n_lists = max(1, min(n_lists, len(vectors)))
+    random = np.random.RandomState(random_state)
+    centroids = (
+      vectors[random.choice(len(vectors), n_lists, replace=False)] if len(vectors)
+      else np.zeros((1, vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32)
+    )
+    for _ in range(n_iterations):
+      assignments = _nearest_centroids(vectors, centroids)
+      sums = np.zeros_like(centroids)
+      np.add.at(sums, assignments, vectors)
+      # lists without any vectors keep their previous centroid
+      is_empty = np.bincount(assignments, minlength=len(centroids)) == 0
+      sums[is_empty] = centroids[is_empty]
+      centroids = normalize_vectors(sums)
+    assignments = _nearest_centroids(vectors, centroids)
+    order = np.argsort(assignments, kind='mergesort')
+    list_offsets = np.concatenate([
+      [0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))
+    ])
+    LOGGER.info('built similarity index, vectors: %d, lists: %d', len(vectors), len(centroids))
+    return SimilarityIndex(keys[order], centroids, list_offsets)
+
+  def probe(self, query_vector, n_probe):
+    """Returns the indices of the n_probe lists with centroids most similar to the query."""
+
+    similarities = self.centroids.dot(np.asarray(query_vector, dtype=np.float32))
+    if n_probe >= len(similarities):
+      return np.arange(len(similarities))
+    return np.argpartition(-similarities, n_probe - 1)[:n_probe]
+
+  def to_binary(self):
+    return pickle.dumps(self)
+
+  @staticmethod
+  def from_binary(data):
+    return pickle.loads(data)
+
+def query_combined_docvecs(db):
+  ml_manuscript_data_table = db['ml_manuscript_data'].table
+  rows = db.session.query(
+    ml_manuscript_data_table.version_id,
+    ml_manuscript_data_table.lda_docvec,
+    ml_manuscript_data_table.doc2vec_docvec
+  ).filter(
+    ml_manuscript_data_table.lda_docvec != None, # noqa: E711
+    ml_manuscript_data_table.doc2vec_docvec != None # noqa: E711
+  ).all()
+  if not rows:
+    return [], None
+  return [row[0] for row in rows], combine_docvecs(
+    [row[1] for row in rows], [row[2] for row in rows]
+  )
+
+def update_similarity_index(db, n_lists=None):
+  """Builds the similarity index over the combined docvecs and stores it with the models.
+
+  The index needs to be built again whenever the docvecs change.
+  """
+
+  version_ids, combined_docvecs = query_combined_docvecs(db)
+  if combined_docvecs is None:
+    LOGGER.info('no complete docvecs, not building similarity index')
+    return
+  ml_model_data_table = db['ml_model_data']
+  similarity_index = SimilarityIndex.build(version_ids, combined_docvecs, n_lists=n_lists)
+  ml_model_data_table.update_or_create(
+    model_id=ml_model_data_table.table.SIMILARITY_INDEX_MODEL_ID,
+    data=similarity_index.to_binary()
+  )
+  db.commit()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from .database import populated_in_memory_database
+from .database_schema import ML_ModelData
+
+from .similarity_index import (
+  SimilarityIndex,
+  combine_docvecs,
+  normalize_vectors,
+  update_similarity_index
+)
+
+VERSION_ID1 = 'version1'
+VERSION_ID2 = 'version2'
+VERSION_ID3 = 'version3'
+VERSION_ID4 = 'version4'
+
+KEYS = [VERSION_ID1, VERSION_ID2, VERSION_ID3, VERSION_ID4]
+
+# two clearly separated groups of vectors
+VECTORS = normalize_vectors([[1.0, 0.1], [1.0, 0.0], [0.0, 1.0], [0.1, 1.0]])
+
+def _keys_of_lists(similarity_index, list_indices):
+  offsets = similarity_index.list_offsets
+  return {
+    key
+    for i in list_indices
+    for key in similarity_index.keys[offsets[i]:offsets[i + 1]]
+  }
+
+class TestCombineDocvecs:
+  def test_should_calculate_mean_cosine_similarity_using_dot_product(self):
+    lda_docvecs = np.array([[1.0, 0.0], [1.0, 1.0]])
+    doc2vec_docvecs = np.array([[0.0, 3.0, 0.0], [0.0, 1.0, 0.0]])
+    combined = combine_docvecs(lda_docvecs, doc2vec_docvecs)
+    assert float(combined[0].dot(combined[1])) == pytest.approx(
+      (np.sqrt(0.5) + 1.0) / 2, abs=1e-6
+    )
+
+class TestSimilarityIndex:
+  def test_should_group_similar_vectors_into_lists(self):
+    similarity_index = SimilarityIndex.build(KEYS, VECTORS, n_lists=2)
+    assert similarity_index.list_count == 2
+    assert _keys_of_lists(
+      similarity_index, similarity_index.probe(VECTORS[0], n_probe=1)
+    ) == {VERSION_ID1, VERSION_ID2}
+    assert _keys_of_lists(
+      similarity_index, similarity_index.probe(VECTORS[3], n_probe=1)
+    ) == {VERSION_ID3, VERSION_ID4}
+
+  def test_should_probe_all_lists_if_n_probe_is_not_less_than_list_count(self):
+    similarity_index = SimilarityIndex.build(KEYS, VECTORS, n_lists=2)
+    assert _keys_of_lists(
+      similarity_index, similarity_index.probe(VECTORS[0], n_probe=2)
+    ) == set(KEYS)
+
+  def test_should_not_create_more_lists_than_vectors(self):
+    assert SimilarityIndex.build(KEYS[:1], VECTORS[:1], n_lists=10).list_count == 1
+
+  def test_should_restore_index_from_binary(self):
+    similarity_index = SimilarityIndex.from_binary(
+      SimilarityIndex.build(KEYS, VECTORS, n_lists=2).to_binary()
+    )
+    assert list(similarity_index.list_offsets) == [0, 2, 4]
+
+@pytest.mark.slow
+class TestUpdateSimilarityIndex:
+  def test_should_store_index_of_versions_with_both_docvecs(self):
+    dataset = {
+      'manuscript_version': [
+        {'version_id': version_id} for version_id in [VERSION_ID1, VERSION_ID2, VERSION_ID3]
+      ],
+      'ml_manuscript_data': [
+        {'version_id': VERSION_ID1, 'lda_docvec': [1.0, 0.0], 'doc2vec_docvec': [1.0]},
+        {'version_id': VERSION_ID2, 'lda_docvec': [0.0, 1.0], 'doc2vec_docvec': [1.0]},
+        {'version_id': VERSION_ID3, 'lda_docvec': [0.0, 1.0], 'doc2vec_docvec': None}
+      ]
+    }
+    with populated_in_memory_database(dataset) as db:
+      update_similarity_index(db, n_lists=1)
+      model_data = db['ml_model_data'].read_frame()
+      similarity_index = SimilarityIndex.from_binary(
+        model_data.loc[ML_ModelData.SIMILARITY_INDEX_MODEL_ID]['data']
+      )
+      assert set(similarity_index.keys) == {VERSION_ID1, VERSION_ID2}
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LruCache:
+  """Thread-safe least recently used cache bounded by the total size of its values.
+
+  Entries may optionally expire after ttl seconds.
+  Values larger than max_size are not cached at all.
+  """
+
+  def __init__(self, max_size, ttl=None, get_size=len, get_time=time.monotonic):
+    self.max_size = max_size
+    self.ttl = ttl
+    self._get_size = get_size
+    self._get_time = get_time
+    self._entries = OrderedDict()
+    self._size = 0
+    self._lock = threading.Lock()
+
+  def _remove(self, key):
+    _, size, _ = self._entries.pop(key)
+    self._size -= size
+
+  def get(self, key, default_value=None):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return default_value
+      value, _, expires_at = entry
+      if expires_at is not None and expires_at <= self._get_time():
+        self._remove(key)
+        return default_value
+      self._entries.move_to_end(key)
+      return value
+
+  def put(self, key, value):
+    size = self._get_size(value)
+    expires_at = self._get_time() + self.ttl if self.ttl else None
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+      if size > self.max_size:
+        return
+      self._entries[key] = (value, size, expires_at)
+      self._size += size
+      while self._size > self.max_size:
+        self._remove(next(iter(self._entries)))
+
+  def keys(self):
+    # most recently used first
+    with self._lock:
+      return list(reversed(self._entries.keys()))
+
+  def remove_if(self, predicate):
+    with self._lock:
+      for key in [key for key in self._entries.keys() if predicate(key)]:
+        self._remove(key)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._size = 0
+
+  @property
+  def size(self):
+    return self._size
+
+  def __len__(self):
+    return len(self._entries)
@@ -0,0 +1,81 @@
+from .cache import LruCache
+
+KEY_1 = 'key1'
+KEY_2 = 'key2'
+KEY_3 = 'key3'
+
+class _FakeTime:
+  def __init__(self):
+    self.value = 0
+
+  def __call__(self):
+    return self.value
+
+class TestLruCache:
+  def test_should_return_default_value_if_not_cached(self):
+    cache = LruCache(max_size=10)
+    assert cache.get(KEY_1) is None
+    assert cache.get(KEY_1, 'default') == 'default'
+
+  def test_should_return_cached_value(self):
+    cache = LruCache(max_size=10)
+    cache.put(KEY_1, b'abc')
+    assert cache.get(KEY_1) == b'abc'
+    assert cache.size == 3
+
+  def test_should_evict_least_recently_used_value_when_exceeding_max_size(self):
+    cache = LruCache(max_size=6)
+    cache.put(KEY_1, b'abc')
+    cache.put(KEY_2, b'def')
+    cache.get(KEY_1)
+    cache.put(KEY_3, b'ghi')
+    assert cache.get(KEY_1) == b'abc'
+    assert cache.get(KEY_2) is None
+    assert cache.get(KEY_3) == b'ghi'
+    assert cache.size == 6
+
+  def test_should_not_cache_value_larger_than_max_size(self):
+    cache = LruCache(max_size=2)
+    cache.put(KEY_1, b'abc')
+    assert cache.get(KEY_1) is None
+    assert cache.size == 0
+
+  def test_should_replace_existing_value(self):
+    cache = LruCache(max_size=10)
+    cache.put(KEY_1, b'abc')
+    cache.put(KEY_1, b'de')
+    assert cache.get(KEY_1) == b'de'
+    assert cache.size == 2
+
+  def test_should_expire_values_after_ttl(self):
+    fake_time = _FakeTime()
+    cache = LruCache(max_size=10, ttl=5, get_time=fake_time)
+    cache.put(KEY_1, b'abc')
+    fake_time.value = 4
+    assert cache.get(KEY_1) == b'abc'
+    fake_time.value = 5
+    assert cache.get(KEY_1) is None
+    assert cache.size == 0
+
+  def test_should_return_keys_most_recently_used_first(self):
+    cache = LruCache(max_size=10)
+    cache.put(KEY_1, b'abc')
+    cache.put(KEY_2, b'def')
+    cache.get(KEY_1)
+    assert cache.keys() == [KEY_1, KEY_2]
+
+  def test_should_remove_matching_keys(self):
+    cache = LruCache(max_size=10)
+    cache.put(KEY_1, b'abc')
+    cache.put(KEY_2, b'def')
+    cache.remove_if(lambda key: key == KEY_1)
+    assert cache.keys() == [KEY_2]
+    assert cache.size == 3
+
+  def test_should_clear_all_values(self):
+    cache = LruCache(max_size=10)
+    cache.put(KEY_1, b'abc')
+    cache.clear()
+    assert cache.get(KEY_1) is None
+    assert len(cache) == 0
+    assert cache.size == 0
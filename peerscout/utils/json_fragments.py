@@ -0,0 +1,50 @@
+import json
+import re
+import uuid
+
+# the placeholders contain a (json escaped) control character and a random token,
+# ensuring they won't clash with regular string values
+_PLACEHOLDER_PREFIX = '\u0000cached-json-%s:' % uuid.uuid4().hex
+_PLACEHOLDER_PATTERN = re.compile(
+  re.escape(json.dumps(_PLACEHOLDER_PREFIX)[:-1]) + r'(\d+)"'
+)
+
+class CachedJsonDict(dict):
+  """A dict caching its JSON serialisation when serialised via dumps_with_cached_json.
+
+  The dict must not be modified once it has been serialised.
+  """
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self._cached_json = None
+
+  def get_json(self, dumps=json.dumps):
+    cached_json = self._cached_json
+    if cached_json is None or cached_json[0] is not dumps:
+      cached_json = (dumps, dumps_with_cached_json(dict(self), dumps=dumps))
+      self._cached_json = cached_json
+    return cached_json[1]
+
+def _replace_cached_json_dicts(obj, json_fragments, dumps):
+  if isinstance(obj, CachedJsonDict):
+    json_fragments.append(obj.get_json(dumps))
+    return _PLACEHOLDER_PREFIX + str(len(json_fragments) - 1)
+  if isinstance(obj, dict):
+    return {
+      key: _replace_cached_json_dicts(value, json_fragments, dumps)
+      for key, value in obj.items()
+    }
+  if isinstance(obj, (list, tuple)):
+    return [_replace_cached_json_dicts(value, json_fragments, dumps) for value in obj]
+  return obj
+
+def dumps_with_cached_json(obj, dumps=json.dumps):
+  """Serialises obj using dumps, inserting the cached JSON of any CachedJsonDict it contains."""
+
+  json_fragments = []
+  obj = _replace_cached_json_dicts(obj, json_fragments, dumps)
+  json_str = dumps(obj)
+  if not json_fragments:
+    return json_str
+  return _PLACEHOLDER_PATTERN.sub(lambda m: json_fragments[int(m.group(1))], json_str)
@@ -0,0 +1,35 @@
+import json
+from functools import partial
+
+from .json_fragments import CachedJsonDict, dumps_with_cached_json
+
+class TestDumpsWithCachedJson:
+  def test_should_serialise_like_json_dumps(self):
+    obj = {'a': [1, 'x', None, {'b': True}], 'c': 'text with "quotes"'}
+    assert dumps_with_cached_json(obj) == json.dumps(obj)
+
+  def test_should_serialise_nested_cached_json_dicts(self):
+    obj = {
+      'items': [
+        CachedJsonDict({'a': 1, 'nested': CachedJsonDict({'b': 'x'})}),
+        {'c': CachedJsonDict({'d': [1, 2]})}
+      ]
+    }
+    assert json.loads(dumps_with_cached_json(obj)) == json.loads(json.dumps(obj))
+
+  def test_should_reuse_cached_json(self):
+    cached_json_dict = CachedJsonDict({'a': 1})
+    dumps_with_cached_json([cached_json_dict])
+    # the dict must not be modified, demonstrates that the json isn't serialised again
+    cached_json_dict['a'] = 2
+    assert json.loads(dumps_with_cached_json([cached_json_dict])) == [{'a': 1}]
+
+  def test_should_not_reuse_json_cached_for_other_dumps_function(self):
+    cached_json_dict = CachedJsonDict({'b': 1, 'a': 2})
+    dumps_with_cached_json(cached_json_dict)
+    sorted_dumps = partial(json.dumps, sort_keys=True)
+    assert dumps_with_cached_json([cached_json_dict], dumps=sorted_dumps) == '[{"a": 2, "b": 1}]'
+
+  def test_should_not_replace_regular_strings_resembling_placeholders(self):
+    obj = [CachedJsonDict({'a': 1}), '\u0000cached-json:0']
+    assert json.loads(dumps_with_cached_json(obj)) == [{'a': 1}, '\u0000cached-json:0']